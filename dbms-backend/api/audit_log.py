@@ -0,0 +1,145 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from api.database import session_local
+from api.models import Logs
+
+logger = logging.getLogger(__name__)
+
+# Rows per INSERT and the longest an event waits in the buffer
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL_SECONDS = float(os.getenv("AUDIT_FLUSH_INTERVAL_SECONDS", "1"))
+# Events held in memory; beyond this callers write their own event inline
+AUDIT_BUFFER_SIZE = int(os.getenv("AUDIT_BUFFER_SIZE", "10000"))
+AUDIT_WRITE_ATTEMPTS = 3
+
+
+class AuditLogWriter:
+    """
+    Collects Logs rows in a bounded in-memory queue and inserts them from a
+    background thread, one multi-row INSERT per batch. A batch is written
+    when it reaches `batch_size` or `flush_interval` seconds after its first
+    event, whichever comes first.
+
+    Queued events are written after the request's own commit and are lost
+    if the process is killed before a flush. Events that must commit or roll
+    back with the business write pass `db=` to record() instead.
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float, max_buffer: int):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue[dict] = queue.Queue(maxsize=max_buffer)
+        self._thread: threading.Thread | None = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        user_id: int,
+        action: str,
+        description: str,
+        db: Session | None = None,
+    ) -> None:
+        row = {
+            "user_id": user_id,
+            "action": action,
+            "description": description,
+            "created_at": datetime.now(),
+        }
+        if db is not None:
+            # Synchronous mode: part of the caller's transaction
+            db.add(Logs(**row))
+            return
+
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            # Apply backpressure rather than drop the event
+            self._write([row])
+
+    def flush(self) -> None:
+        """
+        Write everything queued so far from the calling thread
+        """
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._write(batch)
+
+    def stop(self) -> None:
+        self._stopping.set()
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+        self._stopping.clear()
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="audit-log-writer", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            batch = self._next_batch()
+            if batch:
+                self._write(batch)
+
+    def _next_batch(self) -> list[dict]:
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and not self._stopping.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, rows: list[dict]) -> None:
+        for attempt in range(AUDIT_WRITE_ATTEMPTS):
+            try:
+                with session_local() as db:
+                    db.execute(insert(Logs), rows)
+                    db.commit()
+                return
+            except Exception as e:
+                logger.warning(f"Audit log write failed (attempt {attempt + 1}): {e}")
+                time.sleep(0.1 * 2**attempt)
+        logger.error(f"Dropped {len(rows)} audit log event(s)")
+
+
+audit_log = AuditLogWriter(
+    AUDIT_BATCH_SIZE, AUDIT_FLUSH_INTERVAL_SECONDS, AUDIT_BUFFER_SIZE
+)
+
+# Scripts never run the app lifespan; don't lose their queued events
+atexit.register(audit_log.stop)
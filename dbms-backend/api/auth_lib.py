@@ -5,11 +5,12 @@ from dotenv import load_dotenv
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from sqlalchemy.orm import Session
 
 from api.database import get_db
 from api.models import UserRole, Users, UserStatus
+from api.password_pool import password_pool
+from api.principal_cache import principal_cache
 
 load_dotenv()
 
@@ -18,16 +19,15 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_pool.verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return password_pool.hash(password)
 
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
@@ -49,6 +49,14 @@ def get_current_user(
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+    # Cached principals are re-attached to this session without a query
+    cached = principal_cache.get(token)
+    if cached is not None:
+        if principal_cache.is_revoked(cached.principal.user_id):
+            raise credentials_exception
+        return db.merge(cached.snapshot, load=False)
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -58,8 +66,13 @@ def get_current_user(
         raise credentials_exception from je
 
     user = db.query(Users).filter(Users.email == email).first()
-    if user is None:
+    if user is None or principal_cache.is_revoked(user.user_id):
         raise credentials_exception
+    if user.status == UserStatus.blocked:
+        principal_cache.revoke_user(user.user_id)
+        raise credentials_exception
+
+    principal_cache.put(token, user, payload.get("exp"))
     return user
 
 
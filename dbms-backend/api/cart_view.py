@@ -0,0 +1,161 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from api.models import Cart, CartItem, Product
+
+
+@dataclass(frozen=True, slots=True)
+class CartLine:
+    cart_item_id: int
+    cart_id: int
+    product_id: int
+    quantity: int
+    created_at: datetime
+    updated_at: datetime
+    name: str
+    price: Decimal
+    stock: int
+    image_url: str
+    category: str
+
+    @property
+    def subtotal(self) -> Decimal:
+        return self.quantity * self.price
+
+
+@dataclass(frozen=True, slots=True)
+class CartView:
+    cart_id: int
+    user_id: int
+    created_at: datetime | None
+    updated_at: datetime | None
+    lines: list[CartLine] = field(default_factory=list)
+
+    @property
+    def total_amount(self) -> Decimal:
+        return sum((line.subtotal for line in self.lines), Decimal(0))
+
+    def line(self, product_id: int) -> CartLine | None:
+        for line in self.lines:
+            if line.product_id == product_id:
+                return line
+        return None
+
+    def to_response(self) -> dict:
+        """
+        Build the payload shared by every cart endpoint
+        """
+        return {
+            "cart_id": self.cart_id,
+            "user_id": self.user_id,
+            "items": [
+                {
+                    "cart_item_id": line.cart_item_id,
+                    "cart_id": line.cart_id,
+                    "product_id": line.product_id,
+                    "quantity": line.quantity,
+                    "user_id": self.user_id,
+                    "created_at": line.created_at,
+                    "updated_at": line.updated_at,
+                    "name": line.name,
+                    "price": line.price,
+                    "image_url": line.image_url,
+                    "category": line.category,
+                }
+                for line in self.lines
+            ],
+            "total_amount": self.total_amount,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+    @classmethod
+    def empty(cls, user_id: int) -> "CartView":
+        return cls(cart_id=0, user_id=user_id, created_at=None, updated_at=None)
+
+
+def cart_view_statement(user_id: int):
+    """
+    Cart, its items and their products as one outer-joined SELECT
+    """
+    return (
+        select(
+            Cart.cart_id,
+            Cart.created_at,
+            Cart.updated_at,
+            CartItem.cart_item_id,
+            CartItem.product_id,
+            CartItem.quantity,
+            CartItem.created_at,
+            CartItem.updated_at,
+            Product.name,
+            Product.price,
+            Product.stock,
+            Product.image_url,
+            Product.business_category,
+        )
+        .outerjoin(CartItem, CartItem.cart_id == Cart.cart_id)
+        .outerjoin(Product, Product.product_id == CartItem.product_id)
+        .where(Cart.user_id == user_id)
+        .order_by(Cart.cart_id, CartItem.cart_item_id)
+    )
+
+
+def build_cart_view(user_id: int, rows) -> CartView | None:
+    """
+    Fold the joined rows into a CartView, or None if the user has no cart
+    """
+    rows = list(rows)
+    if not rows:
+        return None
+
+    # A user should only have one cart; if there are more, use the first one
+    cart_id, cart_created_at, cart_updated_at = rows[0][:3]
+    lines = []
+    for row in rows:
+        if row[0] != cart_id:
+            break
+        # Skip the empty-cart row and items whose product no longer exists
+        if row[3] is None or row[8] is None:
+            continue
+        lines.append(
+            CartLine(
+                cart_item_id=row[3],
+                cart_id=cart_id,
+                product_id=row[4],
+                quantity=row[5],
+                created_at=row[6],
+                updated_at=row[7],
+                name=row[8],
+                price=row[9],
+                stock=row[10],
+                image_url=row[11],
+                category=row[12],
+            )
+        )
+
+    return CartView(
+        cart_id=cart_id,
+        user_id=user_id,
+        created_at=cart_created_at,
+        updated_at=cart_updated_at,
+        lines=lines,
+    )
+
+
+def load_cart_view(db: Session, user_id: int) -> CartView | None:
+    """
+    Load the user's cart with item and product details in a single query
+    """
+    rows = db.execute(cart_view_statement(user_id)).all()
+    return build_cart_view(user_id, rows)
+
+
+async def load_cart_view_async(db: AsyncSession, user_id: int) -> CartView | None:
+    rows = (await db.execute(cart_view_statement(user_id))).all()
+    return build_cart_view(user_id, rows)
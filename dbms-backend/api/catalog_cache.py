@@ -0,0 +1,222 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable, Iterable
+from dataclasses import dataclass
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.database import async_session_local
+from api.models import Product, ProductStatus
+from api.pagination import (
+    Page,
+    PageParams,
+    build_page,
+    keyset_paginate,
+)
+from api.schemas import ProductResponse
+
+logger = logging.getLogger(__name__)
+
+CATALOG_CACHE_TTL_SECONDS = int(os.getenv("CATALOG_CACHE_TTL_SECONDS", "300"))
+# How long past its TTL an entry may still be served while it is refreshed
+CATALOG_CACHE_STALE_SECONDS = int(os.getenv("CATALOG_CACHE_STALE_SECONDS", "600"))
+CATALOG_CACHE_MAX_ENTRIES = int(os.getenv("CATALOG_CACHE_MAX_ENTRIES", "1024"))
+
+Loader = Callable[[AsyncSession], Awaitable]
+
+
+@dataclass(slots=True)
+class _Entry:
+    value: object
+    tags: frozenset[str]
+    fresh_until: float
+    stale_until: float
+
+
+class CatalogCache:
+    """
+    TTL + LRU cache for catalog listings with stale-while-revalidate.
+    Fresh entries are returned as is; stale ones are returned immediately
+    while a single background task reloads them; misses are loaded once
+    no matter how many requests are waiting. Entries carry tags so a
+    product write only drops the listings it can affect.
+
+    Loads run on their own session against the primary, so a listing
+    reloaded right after an invalidation never comes from a lagging replica.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int, stale_seconds: int):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.stale = stale_seconds
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self._generations: dict[str, int] = {}
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        # Invalidation happens on threadpool threads, lookups on the event loop
+        self._lock = threading.Lock()
+
+    async def get_or_load(self, key: Hashable, loader: Loader, tags: Iterable[str]):
+        tags = frozenset(tags)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        if entry is not None and now < entry.fresh_until:
+            return entry.value
+        if entry is not None and now < entry.stale_until:
+            self._task(key, loader, tags)
+            return entry.value
+        return await asyncio.shield(self._task(key, loader, tags))
+
+    def invalidate(self, *tags: str) -> None:
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+            stale = [
+                key for key, entry in self._entries.items() if entry.tags & set(tags)
+            ]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            for tag in self._generations:
+                self._generations[tag] += 1
+            self._entries.clear()
+
+    def _task(
+        self, key: Hashable, loader: Loader, tags: frozenset[str]
+    ) -> asyncio.Task:
+        task = self._inflight.get(key)
+        # Tasks from a loop that has since closed (tests, reloads) are dropped
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            return task
+
+        task = asyncio.create_task(self._load(key, loader, tags))
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._loaded(key, t))
+        return task
+
+    async def _load(self, key: Hashable, loader: Loader, tags: frozenset[str]):
+        with self._lock:
+            generations = {tag: self._generations.get(tag, 0) for tag in tags}
+
+        async with async_session_local() as db:
+            value = await loader(db)
+
+        now = time.monotonic()
+        with self._lock:
+            # A write landed while loading; don't cache what may predate it
+            if any(
+                self._generations.get(tag, 0) != gen for tag, gen in generations.items()
+            ):
+                return value
+            self._entries[key] = _Entry(
+                value=value,
+                tags=tags,
+                fresh_until=now + self.ttl,
+                stale_until=now + self.ttl + self.stale,
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def _loaded(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Catalog cache load failed for {key}: {task.exception()}")
+
+
+catalog_cache = CatalogCache(
+    CATALOG_CACHE_MAX_ENTRIES, CATALOG_CACHE_TTL_SECONDS, CATALOG_CACHE_STALE_SECONDS
+)
+
+
+def active_products_statement():
+    return select(Product).where(Product.status == ProductStatus.active)
+
+
+def _serialize(products) -> list[dict]:
+    return [ProductResponse.model_validate(p).model_dump() for p in products]
+
+
+async def featured_products() -> list[dict]:
+    async def load(db: AsyncSession):
+        stmt = (
+            active_products_statement()
+            .where(Product.price < Product.mrp, Product.stock > 0)
+            .order_by(Product.mrp - Product.price)
+            .limit(10)
+        )
+        return _serialize((await db.execute(stmt)).scalars())
+
+    return await catalog_cache.get_or_load(("featured",), load, tags=("featured",))
+
+
+async def category_products(category: str) -> list[dict]:
+    async def load(db: AsyncSession):
+        stmt = active_products_statement().where(Product.business_category == category)
+        return _serialize((await db.execute(stmt)).scalars())
+
+    return await catalog_cache.get_or_load(
+        ("category", category), load, tags=(f"category:{category}",)
+    )
+
+
+async def categories() -> list[str]:
+    async def load(db: AsyncSession):
+        stmt = select(Product.business_category).distinct()
+        return [category for category in (await db.execute(stmt)).scalars() if category]
+
+    return await catalog_cache.get_or_load(("categories",), load, tags=("categories",))
+
+
+async def product_page(page: PageParams) -> Page:
+    async def load(db: AsyncSession):
+        stmt = keyset_paginate(
+            active_products_statement(), Product.created_at, Product.product_id, page
+        )
+        result = build_page(
+            (await db.execute(stmt)).scalars(),
+            page,
+            key=lambda p: (p.created_at, p.product_id),
+        )
+        return Page(items=_serialize(result.items), next_cursor=result.next_cursor)
+
+    return await catalog_cache.get_or_load(
+        ("page", page.after, page.limit), load, tags=("listing",)
+    )
+
+
+def invalidate_products(*categories: str, categories_changed: bool = True) -> None:
+    """
+    Drop the listings a write to products in `categories` can affect.
+    Pass categories_changed=False when no product was added, removed or
+    moved between categories, so the category list survives.
+    """
+    tags = {"featured", "listing", *(f"category:{c}" for c in categories if c)}
+    if categories_changed:
+        tags.add("categories")
+    catalog_cache.invalidate(*tags)
+
+
+async def warm_catalog() -> None:
+    """
+    Fill the cache with the listings every visitor sees first
+    """
+    try:
+        await featured_products()
+        for category in await categories():
+            await category_products(category)
+        await product_page(PageParams(limit=None))
+    except Exception as e:
+        logger.warning(f"Catalog cache warm-up failed: {e}")
@@ -1,67 +1,474 @@
+import hashlib
+import logging
 import os
+import re
+import shutil
 import uuid
+from collections import Counter
+from collections.abc import Iterable
+from datetime import datetime, timedelta
+from typing import BinaryIO
 
 import aiofiles
-from fastapi import HTTPException, UploadFile
+import aiofiles.os
+from fastapi import HTTPException, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+
+from api.database import insert_ignore, session_local
+from api.models import Product, StoredFile, Users
+
+logger = logging.getLogger(__name__)
 
 UPLOAD_DIR = "uploads/products"
 PROFILE_UPLOAD_DIR = "uploads/profiles"
+# Content-addressed store: one file per distinct content, named by its SHA-256
+OBJECTS_DIR = "uploads/objects"
+# Resized copies of each uploaded image (see api/image_variants.py)
+VARIANTS_DIR = "uploads/variants"
+
+# Bytes read from the upload and written per step
+UPLOAD_CHUNK_SIZE = 64 * 1024
+MAX_PRODUCT_IMAGE_BYTES = int(
+    os.getenv("UPLOAD_MAX_PRODUCT_IMAGE_BYTES", str(5 * 1024 * 1024))
+)
+MAX_PROFILE_IMAGE_BYTES = int(
+    os.getenv("UPLOAD_MAX_PROFILE_IMAGE_BYTES", str(2 * 1024 * 1024))
+)
+# Multipart requests declaring a larger body are refused before it is read
+UPLOAD_MAX_REQUEST_BYTES = int(
+    os.getenv("UPLOAD_MAX_REQUEST_BYTES", str(512 * 1024 * 1024))
+)
+# none: leave flushing to the OS; file: fsync each file before it is
+# renamed into place; full: also fsync the directory after the rename
+UPLOAD_FSYNC = os.getenv("UPLOAD_FSYNC", "file")
+# Stored files nobody references are swept once they have been unreferenced
+# and not uploaded again for this long
+STORED_FILE_GRACE_SECONDS = int(os.getenv("STORED_FILE_GRACE_SECONDS", "86400"))
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=413, detail=f"File is larger than {max_bytes} bytes"
+    )
+
+
+def _fsync_directory(directory: str) -> None:
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        # Not supported on every platform
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _fsync_file(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
 
 
-def save_uploaded_file(file: UploadFile) -> str:
+def _place(temp_path: str, path: str) -> None:
     """
-    Save an uploaded file and return its relative path
+    Rename a complete temporary file into place, as durably as
+    UPLOAD_FSYNC asks
     """
+    if UPLOAD_FSYNC != "none":
+        _fsync_file(temp_path)
+    os.replace(temp_path, path)
+    if UPLOAD_FSYNC == "full":
+        _fsync_directory(os.path.dirname(path))
+
+
+def _remove_quietly(path: str) -> None:
     try:
-        # Create upload directory if it doesn't exist
-        os.makedirs(UPLOAD_DIR, exist_ok=True)
+        os.remove(path)
+    except OSError:
+        pass
 
-        # Generate unique filename
-        file_extension = os.path.splitext(file.filename)[1]
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = os.path.join(UPLOAD_DIR, unique_filename)
 
-        # Save the file
-        content = file.read()
-        with aiofiles.open(file_path, "wb") as out_file:
-            out_file.write(content)
+async def _receive(
+    file: UploadFile, directory: str, name: str, max_bytes: int
+) -> tuple[str, str, int]:
+    """
+    Stream an upload in chunks to a temporary file in `directory`, hashing
+    it on the way. Raises 413 as soon as the upload passes `max_bytes`.
+    Returns the temporary path, the SHA-256 hex digest and the size.
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise _too_large(max_bytes)
 
-        # Return the relative path that can be used in URLs
-        return f"/uploads/products/{unique_filename}"
+    await aiofiles.os.makedirs(directory, exist_ok=True)
+    temp_path = os.path.join(directory, f".{name}.{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(temp_path, "wb") as out_file:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise _too_large(max_bytes)
+                digest.update(chunk)
+                await out_file.write(chunk)
+    except BaseException:
+        await run_in_threadpool(_remove_quietly, temp_path)
+        raise
+    return temp_path, digest.hexdigest(), size
 
-    except Exception as e:
-        raise HTTPException(
-            status_code=500, detail=f"Error saving file: {str(e)}"
-        ) from e
 
+async def save_upload(
+    file: UploadFile, directory: str, filename: str, max_bytes: int
+) -> str:
+    """
+    Stream an upload to `directory/filename` in chunks through a temporary
+    file that is renamed into place once complete, so readers never see a
+    partial file. Raises 413 as soon as the upload passes `max_bytes`.
+    Returns the path written.
+    """
+    temp_path, _, _ = await _receive(file, directory, filename, max_bytes)
+    path = os.path.join(directory, filename)
+    try:
+        await run_in_threadpool(_place, temp_path, path)
+    except BaseException:
+        await run_in_threadpool(_remove_quietly, temp_path)
+        raise
+    return path
+
+
+STORED_FILE_PATTERN = re.compile(
+    rf"/{OBJECTS_DIR}/[0-9a-f]{{2}}/[0-9a-f]{{64}}(\.[a-z0-9]{{1,10}})?"
+)
+
+
+def stored_file_path(digest: str, extension: str) -> str:
+    extension = extension.lower()
+    # Client-chosen, so only a plain extension is kept
+    if not re.fullmatch(r"\.[a-z0-9]{1,10}", extension):
+        extension = ""
+    return f"/{OBJECTS_DIR}/{digest[:2]}/{digest}{extension}"
+
+
+def is_stored_file(path: str | None) -> bool:
+    return path is not None and STORED_FILE_PATTERN.fullmatch(path) is not None
+
+
+def _reuse_stored_file(digest: str) -> str | None:
+    """
+    Path of the stored file with this content, touched so the sweep leaves
+    it alone, or None if it has to be written
+    """
+    with session_local() as db:
+        touched = db.execute(
+            update(StoredFile)
+            .where(StoredFile.sha256 == digest)
+            .values(updated_at=datetime.now())
+        )
+        if touched.rowcount == 0:
+            return None
+        path = db.scalar(select(StoredFile.path).where(StoredFile.sha256 == digest))
+        if not os.path.exists(get_full_path(path)):
+            # Lost from disk; write it again
+            db.rollback()
+            return None
+        db.commit()
+        return path
 
-def save_profile_image(file: UploadFile, user_id: int) -> str:
+
+def _store_file(temp_path: str, digest: str, size: int, extension: str) -> str:
+    """
+    Move a received file into the store under its digest. The file is
+    renamed into place while its row is locked, so it never races the
+    sweep deleting the same content.
+    """
+    now = datetime.now()
+    path = stored_file_path(digest, extension)
+    with session_local() as db:
+        registered = insert_ignore(
+            db,
+            StoredFile,
+            {
+                "sha256": digest,
+                "path": path,
+                "size": size,
+                "ref_count": 0,
+                "created_at": now,
+                "updated_at": now,
+            },
+        )
+        if not registered:
+            # Stored concurrently, or its file went missing: keep the row's path
+            db.execute(
+                update(StoredFile)
+                .where(StoredFile.sha256 == digest)
+                .values(updated_at=now)
+            )
+            path = db.scalar(select(StoredFile.path).where(StoredFile.sha256 == digest))
+        full_path = get_full_path(path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        _place(temp_path, full_path)
+        db.commit()
+    return path
+
+
+async def store_upload(file: UploadFile, max_bytes: int) -> str:
     """
-    Save a user profile image and return its relative path
+    Stream an upload into the content-addressed store and return its path.
+    Content already stored is not written again: the upload is hashed on
+    the way to a temporary file that is dropped instead of synced and
+    renamed. The file has no references until a row using it adds one
+    with add_file_references.
     """
+    extension = os.path.splitext(file.filename or "")[1].lower()
+    temp_path, digest, size = await _receive(file, OBJECTS_DIR, "upload", max_bytes)
     try:
-        # Create upload directory if it doesn't exist
-        os.makedirs(PROFILE_UPLOAD_DIR, exist_ok=True)
+        path = await run_in_threadpool(_reuse_stored_file, digest)
+        if path is None:
+            path = await run_in_threadpool(
+                _store_file, temp_path, digest, size, extension
+            )
+    finally:
+        # Already gone when it was renamed into the store
+        await run_in_threadpool(_remove_quietly, temp_path)
+    return path
 
-        # Generate filename with user id
-        file_extension = os.path.splitext(file.filename)[1]
-        filename = f"profile_{user_id}_{uuid.uuid4()}{file_extension}"
-        file_path = os.path.join(PROFILE_UPLOAD_DIR, filename)
 
-        # Save the file
-        content = file.read()
-        with aiofiles.open(file_path, "wb") as out_file:
-            out_file.write(content)
+def store_file(source: BinaryIO, extension: str) -> str:
+    """
+    store_upload for a file-like object read in a worker thread
+    """
+    os.makedirs(OBJECTS_DIR, exist_ok=True)
+    temp_path = os.path.join(OBJECTS_DIR, f".upload.{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(temp_path, "wb") as target:
+            while chunk := source.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                digest.update(chunk)
+                target.write(chunk)
+        return _reuse_stored_file(digest.hexdigest()) or _store_file(
+            temp_path, digest.hexdigest(), size, extension
+        )
+    finally:
+        _remove_quietly(temp_path)
+
 
-        # Return the relative path that can be used in URLs
-        return f"/uploads/profiles/{filename}"
+def add_file_references(db: Session, paths: Iterable[str | None]) -> None:
+    """
+    Count a reference from each new row pointing at a stored file, in the
+    caller's transaction. Paths outside the store are ignored. Raises 409
+    if a file was swept before anything referenced it.
+    """
+    counts = Counter(path for path in paths if is_stored_file(path))
+    # Sorted so concurrent transactions lock the rows in the same order
+    for path, count in sorted(counts.items()):
+        result = db.execute(
+            update(StoredFile)
+            .where(StoredFile.path == path)
+            .values(ref_count=StoredFile.ref_count + count)
+        )
+        if result.rowcount == 0:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Uploaded file {path} has expired, please upload it again",
+            )
 
+
+def missing_stored_files(db: Session, paths: Iterable[str | None]) -> set[str]:
+    """
+    The paths to stored files that add_file_references would refuse
+    """
+    wanted = {path for path in paths if is_stored_file(path)}
+    if not wanted:
+        return set()
+    found = db.scalars(select(StoredFile.path).where(StoredFile.path.in_(wanted)))
+    return wanted - set(found)
+
+
+def release_file_references(db: Session, paths: Iterable[str | None]) -> list[str]:
+    """
+    Drop the references of rows no longer pointing at a stored file, in the
+    caller's transaction; files left unreferenced are removed later by
+    sweep_stored_files. Returns the paths outside the store, which the
+    caller deletes itself once committed.
+    """
+    counts: Counter[str] = Counter()
+    unstored = []
+    for path in paths:
+        if is_stored_file(path):
+            counts[path] += 1
+        elif path:
+            unstored.append(path)
+    now = datetime.now()
+    for path, count in sorted(counts.items()):
+        db.execute(
+            update(StoredFile)
+            .where(StoredFile.path == path, StoredFile.ref_count >= count)
+            .values(ref_count=StoredFile.ref_count - count, updated_at=now)
+        )
+    return unstored
+
+
+def sweep_stored_files(
+    db: Session,
+    now: datetime | None = None,
+    grace_seconds: int = STORED_FILE_GRACE_SECONDS,
+) -> int:
+    """
+    Delete stored files that have been unreferenced for `grace_seconds`.
+    Each file and its variants are removed while its deleted row is still
+    locked, so an upload of the same content either revives it first or
+    waits and writes it afresh. Commits per file; returns the number deleted.
+    """
+    cutoff = (now or datetime.now()) - timedelta(seconds=grace_seconds)
+    unreferenced = (StoredFile.ref_count == 0, StoredFile.updated_at < cutoff)
+    candidates = db.execute(
+        select(StoredFile.sha256, StoredFile.path).where(*unreferenced)
+    ).all()
+    db.rollback()
+
+    swept = 0
+    for digest, path in candidates:
+        deleted = db.execute(
+            delete(StoredFile).where(StoredFile.sha256 == digest, *unreferenced)
+        )
+        if deleted.rowcount == 0:
+            # Referenced or uploaded again since
+            db.rollback()
+            continue
+        try:
+            os.remove(get_full_path(path))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not delete stored file {path}: {e}")
+            db.rollback()
+            continue
+        _delete_variants(path)
+        db.commit()
+        swept += 1
+    return swept
+
+
+def rebuild_file_references(db: Session) -> int:
+    """
+    Recount the references to every stored file from the product images
+    and profile pictures pointing at it. Returns the number of counts
+    that were wrong.
+    """
+    counts: Counter[str] = Counter()
+    for column in (Product.image_url, Users.profile_image):
+        counts.update(
+            dict(
+                db.execute(
+                    select(column, func.count())
+                    .where(column.like(f"/{OBJECTS_DIR}/%"))
+                    .group_by(column)
+                ).all()
+            )
+        )
+    fixes = [
+        {"sha256": digest, "ref_count": counts[path]}
+        for digest, path, ref_count in db.execute(
+            select(StoredFile.sha256, StoredFile.path, StoredFile.ref_count)
+        )
+        if counts[path] != ref_count
+    ]
+    if fixes:
+        db.execute(update(StoredFile), fixes)
+    return len(fixes)
+
+
+async def save_uploaded_file(file: UploadFile) -> str:
+    """
+    Save an uploaded product image to the file store and return its relative path
+    """
+    try:
+        return await store_upload(file, MAX_PRODUCT_IMAGE_BYTES)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error saving file: {str(e)}"
+        ) from e
+
+
+async def save_profile_image(file: UploadFile) -> str:
+    """
+    Save a user profile image to the file store and return its relative path
+    """
+    try:
+        return await store_upload(file, MAX_PROFILE_IMAGE_BYTES)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error saving profile image: {str(e)}"
         ) from e
 
 
+async def upload_size_middleware(request: Request, call_next):
+    """
+    Refuse multipart requests whose declared size is over the limit before
+    their body is parsed and spooled to disk
+    """
+    content_type = request.headers.get("content-type", "")
+    content_length = request.headers.get("content-length")
+    if (
+        content_type.startswith("multipart/form-data")
+        and content_length is not None
+        and content_length.isdigit()
+        and int(content_length) > UPLOAD_MAX_REQUEST_BYTES
+    ):
+        return JSONResponse(
+            status_code=413,
+            content={
+                "detail": f"Request is larger than {UPLOAD_MAX_REQUEST_BYTES} bytes"
+            },
+        )
+    return await call_next(request)
+
+
+def variant_directory(image_url: str | None) -> str | None:
+    """
+    Path of the directory holding the variants of an uploaded image, or
+    None for images that aren't ours (external URLs, data URIs)
+    """
+    if (
+        not image_url
+        or not image_url.startswith("/uploads/")
+        or image_url.startswith(f"/{VARIANTS_DIR}/")
+    ):
+        return None
+    stem = os.path.splitext(image_url[len("/uploads/") :])[0]
+    return f"/{VARIANTS_DIR}/{stem}"
+
+
+def _inside(path: str, directory: str) -> bool:
+    """
+    Whether `path` resolves to somewhere strictly inside `directory`,
+    following symlinks and ".." the way the filesystem would
+    """
+    root = os.path.realpath(directory)
+    return os.path.realpath(path).startswith(root + os.sep)
+
+
+def _delete_variants(image_url: str) -> None:
+    directory = variant_directory(image_url)
+    if directory is None:
+        return
+    full_path = get_full_path(directory)
+    if _inside(full_path, VARIANTS_DIR):
+        shutil.rmtree(full_path, ignore_errors=True)
+
+
 def get_full_path(relative_path: str) -> str:
     """
     Get the full filesystem path for a given relative path
@@ -71,12 +478,17 @@ def get_full_path(relative_path: str) -> str:
 
 def delete_file(relative_path: str) -> bool:
     """
-    Delete a file given its relative path
+    Delete a file given its relative path. Paths outside uploads/ (product
+    image URLs are partly user supplied) are never touched.
     """
     try:
         full_path = get_full_path(relative_path)
+        if not _inside(full_path, "uploads"):
+            logger.warning(f"Refusing to delete {relative_path!r} outside uploads/")
+            return False
         if os.path.exists(full_path):
             os.remove(full_path)
+            _delete_variants(relative_path)
             return True
         return False
     except Exception:
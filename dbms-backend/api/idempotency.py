@@ -0,0 +1,224 @@
+import hashlib
+import logging
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from fastapi import Depends, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, event, select, update
+from sqlalchemy.orm import Session
+
+from api.database import get_db, insert_ignore, session_local
+from api.models import IdempotencyKey
+from api.read_routing import bearer_subject
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+# How long a stored response is replayed
+IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+# A claim whose request never committed is released after this long, in
+# case the process died while handling it
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+MAX_KEY_LENGTH = 255
+
+
+class AlreadyProcessedError(Exception):
+    """
+    Raised by the dependency when the key already has a stored response;
+    answered with that response by idempotent_replay_handler
+    """
+
+    def __init__(self, status_code: int, body: str):
+        self.status_code = status_code
+        self.body = body
+
+
+@dataclass
+class IdempotencyClaim:
+    scope: str
+    key: str
+    committed: bool = False
+
+    def _where(self):
+        return (IdempotencyKey.scope == self.scope, IdempotencyKey.key == self.key)
+
+    def stamp_committed(self, db: Session) -> None:
+        """
+        Write committed_at inside the transaction being committed, so it
+        is rolled back with the endpoint's writes if the commit fails
+        """
+        db.execute(
+            update(IdempotencyKey)
+            .where(*self._where())
+            .values(committed_at=datetime.now())
+        )
+
+    def mark_committed(self, _db: Session) -> None:
+        self.committed = True
+
+    def save(self, status_code: int, body: bytes) -> None:
+        with session_local() as db:
+            db.execute(
+                update(IdempotencyKey)
+                .where(*self._where())
+                .values(status_code=status_code, response_body=body.decode())
+            )
+            db.commit()
+
+    def release(self) -> None:
+        with session_local() as db:
+            db.execute(delete(IdempotencyKey).where(*self._where()))
+            db.commit()
+
+
+def _fingerprint(request: Request, body: bytes) -> str:
+    digest = hashlib.sha256()
+    for part in (request.method, request.url.path, request.url.query):
+        digest.update(part.encode() + b"\0")
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def claim_key(scope: str, key: str, fingerprint: str) -> IdempotencyClaim:
+    """
+    Look the key up and either raise with the outcome of the earlier request
+    or claim the key for this one. The claim is committed right away so
+    concurrent retries see it.
+    """
+    now = datetime.now()
+    with session_local() as db:
+        record = db.scalars(
+            select(IdempotencyKey).where(
+                IdempotencyKey.scope == scope, IdempotencyKey.key == key
+            )
+        ).first()
+
+        if record is not None and record.expires_at > now:
+            if record.fingerprint != fingerprint:
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"{IDEMPOTENCY_HEADER} was already used for a different request",
+                )
+            if record.status_code is not None:
+                raise AlreadyProcessedError(record.status_code, record.response_body)
+            if record.committed_at is not None:
+                raise HTTPException(
+                    status_code=409,
+                    detail="This request was already processed; its response is unavailable",
+                )
+            if record.created_at > now - timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS):
+                raise HTTPException(
+                    status_code=409,
+                    detail="A request with this Idempotency-Key is still in progress",
+                )
+
+        # Expired or abandoned claims are taken over
+        if record is not None:
+            db.delete(record)
+            db.flush()
+        claimed = insert_ignore(
+            db,
+            IdempotencyKey,
+            {
+                "scope": scope,
+                "key": key,
+                "fingerprint": fingerprint,
+                "created_at": now,
+                "expires_at": now + timedelta(hours=IDEMPOTENCY_TTL_HOURS),
+            },
+        )
+        db.commit()
+
+    if not claimed:
+        raise HTTPException(
+            status_code=409,
+            detail="A request with this Idempotency-Key is still in progress",
+        )
+    return IdempotencyClaim(scope=scope, key=key)
+
+
+async def idempotency_key(
+    request: Request, db: Session = Depends(get_db)
+) -> IdempotencyClaim | None:
+    """
+    FastAPI dependency for endpoints that move money. Without an
+    Idempotency-Key header it does nothing. With one, a retry gets the
+    stored response of the first request instead of running it again.
+    The key is marked as used in the same transaction as the endpoint's
+    writes; idempotency_middleware stores the response afterwards.
+    """
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if key is None:
+        return None
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{IDEMPOTENCY_HEADER} must be 1-{MAX_KEY_LENGTH} characters",
+        )
+
+    scope = bearer_subject(request) or "anonymous"
+    fingerprint = _fingerprint(request, await request.body())
+    claim = await run_in_threadpool(claim_key, scope, key, fingerprint)
+
+    event.listen(db, "before_commit", claim.stamp_committed)
+    # Only a commit that went through makes the response worth replaying
+    event.listen(db, "after_commit", claim.mark_committed)
+    request.state.idempotency = claim
+    return claim
+
+
+async def idempotency_middleware(request: Request, call_next):
+    """
+    Store the response of a request that claimed an idempotency key, or
+    release the key if the request's writes never committed
+    """
+    try:
+        response = await call_next(request)
+    except Exception:
+        claim = getattr(request.state, "idempotency", None)
+        if claim is not None and not claim.committed:
+            await run_in_threadpool(claim.release)
+        raise
+
+    claim = getattr(request.state, "idempotency", None)
+    if claim is None:
+        return response
+
+    if not claim.committed:
+        await run_in_threadpool(claim.release)
+        return response
+
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    try:
+        await run_in_threadpool(claim.save, response.status_code, body)
+    except Exception as e:
+        logger.warning(f"Could not store idempotent response: {e}")
+    return Response(
+        content=body,
+        status_code=response.status_code,
+        headers=dict(response.headers),
+        media_type=response.media_type,
+    )
+
+
+async def idempotent_replay_handler(_request: Request, exc: AlreadyProcessedError):
+    return Response(
+        content=exc.body,
+        status_code=exc.status_code,
+        media_type="application/json",
+        headers={REPLAYED_HEADER: "true"},
+    )
+
+
+def sweep_idempotency_keys(db: Session, now: datetime | None = None) -> int:
+    """
+    Delete expired keys. Returns the number removed; the caller commits.
+    """
+    now = now or datetime.now()
+    return db.execute(
+        delete(IdempotencyKey).where(IdempotencyKey.expires_at < now)
+    ).rowcount
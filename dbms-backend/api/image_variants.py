@@ -0,0 +1,145 @@
+import os
+import uuid
+
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from api.file_upload import get_full_path, save_uploaded_file, variant_directory
+from api.process_pool import ProcessPool
+
+# Longest edge in pixels of each variant, largest first; images are never
+# enlarged
+IMAGE_VARIANTS = {"full": 1600, "card": 480, "thumbnail": 160}
+# Format name -> (Pillow format, file extension)
+IMAGE_FORMATS = {"webp": ("WEBP", "webp"), "jpeg": ("JPEG", "jpg")}
+IMAGE_WEBP_QUALITY = int(os.getenv("IMAGE_WEBP_QUALITY", "80"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "82"))
+
+# 0 workers renders variants inline (scripts, single-process debugging)
+IMAGE_POOL_WORKERS = int(
+    os.getenv("IMAGE_POOL_WORKERS", str(min(2, os.cpu_count() or 1)))
+)
+# Images queued or rendering before new uploads are turned away with a 503
+IMAGE_POOL_MAX_PENDING = int(
+    os.getenv("IMAGE_POOL_MAX_PENDING", str(max(IMAGE_POOL_WORKERS, 1) * 4))
+)
+IMAGE_POOL_TIMEOUT_SECONDS = float(os.getenv("IMAGE_POOL_TIMEOUT_SECONDS", "30"))
+
+image_pool = ProcessPool(
+    "Image", IMAGE_POOL_WORKERS, IMAGE_POOL_MAX_PENDING, IMAGE_POOL_TIMEOUT_SECONDS
+)
+
+
+def variant_urls(image_url: str | None) -> dict[str, dict[str, str]] | None:
+    """
+    {variant: {format: url}} for an uploaded image
+    """
+    directory = variant_directory(image_url)
+    if directory is None:
+        return None
+    return {
+        variant: {
+            name: f"{directory}/{variant}.{extension}"
+            for name, (_, extension) in IMAGE_FORMATS.items()
+        }
+        for variant in IMAGE_VARIANTS
+    }
+
+
+def _save(image: Image.Image, path: str, image_format: str) -> None:
+    temp_path = f"{path}.{uuid.uuid4().hex}.part"
+    try:
+        if image_format == "JPEG":
+            image.save(
+                temp_path,
+                image_format,
+                quality=IMAGE_JPEG_QUALITY,
+                optimize=True,
+                progressive=True,
+            )
+        else:
+            image.save(temp_path, image_format, quality=IMAGE_WEBP_QUALITY, method=4)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def render_variants(source: str, directory: str, force: bool = False) -> bool:
+    """
+    Write every variant of the image at `source` into `directory`, each
+    one scaled down from the previous. Runs in a worker process. Returns
+    False without decoding anything if they all exist already; raises
+    ValueError if the file isn't an image Pillow can read.
+    """
+    paths = {
+        (variant, name): os.path.join(directory, f"{variant}.{extension}")
+        for variant in IMAGE_VARIANTS
+        for name, (_, extension) in IMAGE_FORMATS.items()
+    }
+    if not force and all(os.path.exists(path) for path in paths.values()):
+        return False
+
+    try:
+        with Image.open(source) as original:
+            # Let JPEG decode at a reduced scale when the original is huge
+            original.draft("RGB", (IMAGE_VARIANTS["full"],) * 2)
+            image = ImageOps.exif_transpose(original)
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+            image.load()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        raise ValueError(f"not a readable image: {e}") from None
+
+    # JPEG has no alpha channel: flatten onto white
+    if image.mode == "RGBA":
+        flat = Image.new("RGB", image.size, (255, 255, 255))
+        flat.paste(image, mask=image.getchannel("A"))
+    else:
+        flat = image
+
+    os.makedirs(directory, exist_ok=True)
+    for variant, edge in IMAGE_VARIANTS.items():
+        size = (edge, edge)
+        image.thumbnail(size, Image.Resampling.LANCZOS)
+        flat.thumbnail(size, Image.Resampling.LANCZOS)
+        for name, (image_format, _) in IMAGE_FORMATS.items():
+            _save(
+                flat if image_format == "JPEG" else image,
+                paths[(variant, name)],
+                image_format,
+            )
+    return True
+
+
+def generate_variants(image_url: str, force: bool = False) -> bool:
+    """
+    Render the variants of an uploaded image in the image pool, blocking
+    until they are written. Content seen before is not decoded again.
+    """
+    directory = variant_directory(image_url)
+    if directory is None:
+        return False
+    return image_pool.run(
+        render_variants, get_full_path(image_url), get_full_path(directory), force
+    )
+
+
+async def save_product_image(file: UploadFile) -> str:
+    """
+    Save an uploaded product image and its variants, returning the path of
+    the original. Raises 400 if the file isn't a readable image; the
+    stored original is then left unreferenced for the sweep.
+    """
+    image_url = await save_uploaded_file(file)
+    try:
+        await run_in_threadpool(generate_variants, image_url)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400, detail="File is not a readable image"
+        ) from e
+    return image_url
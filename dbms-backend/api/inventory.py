@@ -0,0 +1,127 @@
+import os
+from datetime import datetime
+from itertools import islice
+
+from sqlalchemy import case, select, update
+from sqlalchemy.orm import Session
+
+from api.merchant_stats import (
+    products_status_changed,
+    stock_status,
+    stock_status_expression,
+)
+from api.models import Product
+from api.schemas import ProductStockUpdate
+
+# Products updated per statement and transaction
+INVENTORY_CHUNK_SIZE = int(os.getenv("INVENTORY_CHUNK_SIZE", "1000"))
+# Largest list one bulk update request may carry
+INVENTORY_MAX_UPDATES = int(os.getenv("INVENTORY_MAX_UPDATES", "10000"))
+
+
+def _column_case(updates: list[ProductStockUpdate], field: str, column):
+    """
+    CASE product_id WHEN ... THEN <new value> ... ELSE <column> END for the
+    updates that set `field`, or None if none do
+    """
+    values = {
+        u.product_id: getattr(u, field)
+        for u in updates
+        if getattr(u, field) is not None
+    }
+    if not values:
+        return None
+    return case(values, value=Product.product_id, else_=column)
+
+
+def _apply_chunk(
+    db: Session, merchant_id: int, updates: list[ProductStockUpdate]
+) -> tuple[int, list[int], set[str]]:
+    ids = [u.product_id for u in updates]
+    # Lock in id order, as checkout does, so the two never deadlock
+    current = {
+        row.product_id: row
+        for row in db.execute(
+            select(Product.product_id, Product.status, Product.business_category)
+            .where(Product.product_id.in_(ids), Product.merchant_id == merchant_id)
+            .order_by(Product.product_id)
+            .with_for_update()
+        )
+    }
+    not_found = [product_id for product_id in ids if product_id not in current]
+    updates = [u for u in updates if u.product_id in current]
+    if not updates:
+        return 0, not_found, set()
+
+    assignments = []
+    new_stock = _column_case(updates, "stock", Product.stock)
+    if new_stock is not None:
+        restocked = [u.product_id for u in updates if u.stock is not None]
+        new_status = case(
+            (Product.product_id.in_(restocked), stock_status_expression(new_stock)),
+            else_=Product.status,
+        )
+        # status first: MySQL evaluates SET left to right
+        assignments.append((Product.status, new_status))
+        assignments.append((Product.stock, new_stock))
+    for field, column in (("price", Product.price), ("mrp", Product.mrp)):
+        new_value = _column_case(updates, field, column)
+        if new_value is not None:
+            assignments.append((column, new_value))
+    assignments.append((Product.updated_at, datetime.now()))
+
+    db.execute(
+        update(Product)
+        .where(
+            Product.product_id.in_([u.product_id for u in updates]),
+            Product.merchant_id == merchant_id,
+        )
+        .ordered_values(*assignments)
+        .execution_options(synchronize_session=False)
+    )
+    products_status_changed(
+        db,
+        merchant_id,
+        (
+            (
+                current[u.product_id].status,
+                stock_status(u.stock, current[u.product_id].status),
+            )
+            for u in updates
+            if u.stock is not None
+        ),
+    )
+    db.commit()
+    return (
+        len(updates),
+        not_found,
+        {current[u.product_id].business_category for u in updates},
+    )
+
+
+def apply_stock_updates(
+    db: Session,
+    merchant_id: int,
+    updates: list[ProductStockUpdate],
+    chunk_size: int = INVENTORY_CHUNK_SIZE,
+) -> tuple[int, list[int], set[str]]:
+    """
+    Set stock, price and mrp of many of a merchant's products with one
+    UPDATE per chunk, moving status with stock as the
+    update_product_status_trigger does. A product listed twice gets its
+    last values. Commits per chunk; returns the number of products updated,
+    the ids that aren't the merchant's and the categories touched.
+    """
+    latest = list({u.product_id: u for u in updates}.values())
+    updated = 0
+    not_found: list[int] = []
+    categories: set[str] = set()
+    remaining = iter(latest)
+    while chunk := list(islice(remaining, chunk_size)):
+        chunk_updated, chunk_missing, chunk_categories = _apply_chunk(
+            db, merchant_id, chunk
+        )
+        updated += chunk_updated
+        not_found += chunk_missing
+        categories |= chunk_categories
+    return updated, not_found, categories
@@ -0,0 +1,323 @@
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from fastapi import HTTPException
+from sqlalchemy import Engine, and_, func, insert, literal, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from api.database import session_local
+from api.models import Account, BalanceSnapshot, LedgerEntry, TransactionType
+from api.schemas import AccountResponse
+
+logger = logging.getLogger(__name__)
+
+# Entries younger than this are left for the next compaction, so an entry
+# whose transaction commits late is never skipped by a snapshot
+LEDGER_SETTLE_SECONDS = int(os.getenv("LEDGER_SETTLE_SECONDS", "60"))
+# New entries an account needs before the compactor snapshots it
+LEDGER_SNAPSHOT_MIN_ENTRIES = int(os.getenv("LEDGER_SNAPSHOT_MIN_ENTRIES", "20"))
+# Seconds between in-process compactions, 0 leaves it to scripts.compact_ledger
+LEDGER_COMPACT_INTERVAL_SECONDS = int(
+    os.getenv("LEDGER_COMPACT_INTERVAL_SECONDS", "60")
+)
+# Accounts snapshotted per transaction
+LEDGER_COMPACT_BATCH_SIZE = 500
+
+ZERO = Decimal("0.00")
+
+
+def _amount(amount: Decimal | float) -> Decimal:
+    return Decimal(str(amount)).quantize(Decimal("0.01"))
+
+
+def _latest_snapshots(account_ids: list[int], at: datetime | None = None):
+    latest = select(
+        BalanceSnapshot.account_id,
+        func.max(BalanceSnapshot.last_entry_id).label("last_entry_id"),
+    ).where(BalanceSnapshot.account_id.in_(account_ids))
+    if at is not None:
+        latest = latest.where(BalanceSnapshot.as_of <= at)
+    return latest.group_by(BalanceSnapshot.account_id).subquery()
+
+
+def account_balances(
+    db: Session, account_ids: list[int], at: datetime | None = None
+) -> dict[int, Decimal]:
+    """
+    Balances of the given accounts, now or as they stood at `at`: the latest
+    snapshot plus the entries after it
+    """
+    if not account_ids:
+        return {}
+    latest = _latest_snapshots(account_ids, at)
+    balances = dict.fromkeys(account_ids, ZERO)
+
+    bases = db.execute(
+        select(BalanceSnapshot.account_id, BalanceSnapshot.balance).join(
+            latest,
+            and_(
+                BalanceSnapshot.account_id == latest.c.account_id,
+                BalanceSnapshot.last_entry_id == latest.c.last_entry_id,
+            ),
+        )
+    )
+    for account_id, balance in bases:
+        balances[account_id] = Decimal(balance)
+
+    entries = (
+        select(LedgerEntry.account_id, func.sum(LedgerEntry.amount))
+        .outerjoin(latest, LedgerEntry.account_id == latest.c.account_id)
+        .where(
+            LedgerEntry.account_id.in_(account_ids),
+            LedgerEntry.entry_id > func.coalesce(latest.c.last_entry_id, 0),
+        )
+        .group_by(LedgerEntry.account_id)
+    )
+    if at is not None:
+        entries = entries.where(LedgerEntry.created_at <= at)
+    for account_id, total in db.execute(entries):
+        balances[account_id] += _amount(total)
+    return balances
+
+
+def account_balance(
+    db: Session, account_id: int, at: datetime | None = None
+) -> Decimal:
+    return account_balances(db, [account_id], at)[account_id]
+
+
+def account_responses(db: Session, accounts: list[Account]) -> list[AccountResponse]:
+    """
+    Accounts with their current ledger balances
+    """
+    balances = account_balances(db, [account.account_id for account in accounts])
+    return [
+        AccountResponse.model_validate(account).model_copy(
+            update={"balance": float(balances[account.account_id])}
+        )
+        for account in accounts
+    ]
+
+
+def credit(
+    db: Session,
+    account_id: int,
+    amount: Decimal | float,
+    entry_type: TransactionType,
+    transaction_id: int | None = None,
+) -> None:
+    """
+    Add money to an account. Only appends an entry, so concurrent credits
+    to the same account don't wait on each other.
+    """
+    db.execute(
+        insert(LedgerEntry).values(
+            account_id=account_id,
+            amount=_amount(amount),
+            entry_type=entry_type,
+            transaction_id=transaction_id,
+            created_at=datetime.now(),
+        )
+    )
+
+
+def debit(
+    db: Session,
+    account_id: int,
+    amount: Decimal | float,
+    entry_type: TransactionType,
+    transaction_id: int | None = None,
+) -> Decimal:
+    """
+    Take money from an account. Debits of one account are serialized on its
+    row lock so two of them can't both spend the same balance. Returns the
+    balance left.
+
+    Raises 400 if the balance is too low. Runs in the caller's transaction.
+    """
+    amount = _amount(amount)
+    db.execute(
+        select(Account.account_id)
+        .where(Account.account_id == account_id)
+        .with_for_update()
+    )
+    available = account_balance(db, account_id)
+    if available < amount:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Insufficient wallet balance. Available: ₹{available}",
+        )
+    db.execute(
+        insert(LedgerEntry).values(
+            account_id=account_id,
+            amount=-amount,
+            entry_type=entry_type,
+            transaction_id=transaction_id,
+            created_at=datetime.now(),
+        )
+    )
+    return available - amount
+
+
+def _settled_horizon(db: Session, now: datetime) -> int | None:
+    """
+    Lowest entry id that is still too young to snapshot, or None when every
+    entry has settled
+    """
+    cutoff = now - timedelta(seconds=LEDGER_SETTLE_SECONDS)
+    return db.scalar(
+        select(func.min(LedgerEntry.entry_id)).where(LedgerEntry.created_at >= cutoff)
+    )
+
+
+def compact_ledger(
+    db: Session,
+    now: datetime | None = None,
+    min_entries: int = LEDGER_SNAPSHOT_MIN_ENTRIES,
+) -> int:
+    """
+    Write a new snapshot for every account with at least `min_entries`
+    settled entries since its last one, and refresh Account.balance from it.
+    Commits once per batch of accounts; returns the number of snapshots.
+    """
+    now = now or datetime.now()
+    horizon = _settled_horizon(db, now)
+    latest = (
+        select(
+            BalanceSnapshot.account_id,
+            func.max(BalanceSnapshot.last_entry_id).label("last_entry_id"),
+        )
+        .group_by(BalanceSnapshot.account_id)
+        .subquery()
+    )
+    pending = (
+        select(
+            LedgerEntry.account_id,
+            BalanceSnapshot.balance,
+            func.sum(LedgerEntry.amount),
+            func.max(LedgerEntry.entry_id),
+            func.max(LedgerEntry.created_at),
+        )
+        .outerjoin(latest, LedgerEntry.account_id == latest.c.account_id)
+        .outerjoin(
+            BalanceSnapshot,
+            and_(
+                BalanceSnapshot.account_id == latest.c.account_id,
+                BalanceSnapshot.last_entry_id == latest.c.last_entry_id,
+            ),
+        )
+        .where(LedgerEntry.entry_id > func.coalesce(latest.c.last_entry_id, 0))
+        .group_by(LedgerEntry.account_id, BalanceSnapshot.balance)
+        .having(func.count() >= max(min_entries, 1))
+        .order_by(LedgerEntry.account_id)
+        .limit(LEDGER_COMPACT_BATCH_SIZE)
+    )
+    if horizon is not None:
+        pending = pending.where(LedgerEntry.entry_id < horizon)
+
+    written = 0
+    after = 0
+    while True:
+        rows = db.execute(pending.where(LedgerEntry.account_id > after)).all()
+        if not rows:
+            return written
+
+        snapshots = [
+            {
+                "account_id": account_id,
+                "last_entry_id": last_entry_id,
+                "balance": Decimal(base or ZERO) + _amount(total),
+                "as_of": as_of,
+                "created_at": now,
+            }
+            for account_id, base, total, last_entry_id, as_of in rows
+        ]
+        try:
+            db.execute(insert(BalanceSnapshot), snapshots)
+            db.execute(
+                update(Account),
+                [
+                    {"account_id": s["account_id"], "balance": s["balance"]}
+                    for s in snapshots
+                ],
+            )
+            db.commit()
+        except IntegrityError:
+            # Another compactor got there first; it covers these accounts
+            db.rollback()
+            logger.info("Ledger compaction raced another compactor; stopping")
+            return written
+
+        written += len(snapshots)
+        after = rows[-1][0]
+
+
+def ensure_opening_snapshots(engine: Engine) -> None:
+    """
+    Carry balances kept on the account row before the ledger existed into
+    an opening snapshot, for accounts that have none
+    """
+    now = datetime.now()
+    has_snapshot = select(BalanceSnapshot.account_id).where(
+        BalanceSnapshot.account_id == Account.account_id
+    )
+    opening = select(
+        Account.account_id,
+        literal(0).label("last_entry_id"),
+        Account.balance,
+        literal(now, BalanceSnapshot.as_of.type).label("as_of"),
+        literal(now, BalanceSnapshot.created_at.type).label("created_at"),
+    ).where(Account.balance != 0, ~has_snapshot.exists())
+    try:
+        with engine.begin() as conn:
+            conn.execute(
+                insert(BalanceSnapshot).from_select(
+                    ["account_id", "last_entry_id", "balance", "as_of", "created_at"],
+                    opening,
+                )
+            )
+    except Exception as e:
+        logger.warning(f"Could not write the opening balance snapshots: {e}")
+
+
+class LedgerCompactor:
+    """
+    Runs compact_ledger every `interval` seconds on a background thread
+    """
+
+    def __init__(self, interval: int):
+        self.interval = interval
+        self._thread: threading.Thread | None = None
+        self._stopping = threading.Event()
+
+    def start(self) -> None:
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="ledger-compactor", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=10)
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.interval):
+            try:
+                with session_local() as db:
+                    written = compact_ledger(db)
+                if written:
+                    logger.info(f"Wrote {written} balance snapshot(s)")
+            except Exception as e:
+                logger.warning(f"Ledger compaction failed: {e}")
+
+
+ledger_compactor = LedgerCompactor(LEDGER_COMPACT_INTERVAL_SECONDS)
@@ -0,0 +1,469 @@
+import gzip
+import json
+import logging
+import os
+import re
+from collections.abc import Iterator
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import (
+    TIMESTAMP,
+    Integer,
+    String,
+    column,
+    delete,
+    select,
+    table,
+    text,
+    union_all,
+)
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from api.models import Logs, Users
+from api.pagination import Page, PageParams, build_page, keyset_paginate
+
+logger = logging.getLogger(__name__)
+
+# SQLite: closed months older than this are moved out of the main logs table
+LOGS_HOT_MONTHS = int(os.getenv("LOGS_HOT_MONTHS", "3"))
+# Months kept in the database; older ones are archived to LOGS_ARCHIVE_DIR
+LOGS_RETENTION_MONTHS = int(os.getenv("LOGS_RETENTION_MONTHS", "12"))
+# Postgres: monthly partitions created ahead of time
+LOGS_PARTITIONS_AHEAD = int(os.getenv("LOGS_PARTITIONS_AHEAD", "2"))
+LOGS_ARCHIVE_DIR = Path(os.getenv("LOGS_ARCHIVE_DIR", "archives/logs"))
+
+LOG_COLUMNS = ("log_id", "user_id", "action", "description", "created_at")
+PARTITION_NAME = re.compile(r"^logs_(\d{4})_(\d{2})$")
+ARCHIVE_NAME = re.compile(r"^logs_(\d{4})_(\d{2})\.jsonl\.gz$")
+
+# Postgres: same DDL as sql_implementation/09_logs_partitioning.sql
+POSTGRES_CONVERT_DDL = [
+    "DROP INDEX IF EXISTS idx_logs_created_at",
+    "ALTER TABLE logs RENAME TO logs_unpartitioned",
+    "ALTER TABLE logs_unpartitioned RENAME CONSTRAINT logs_pkey TO logs_unpartitioned_pkey",
+    """
+    CREATE TABLE logs (
+        log_id INTEGER NOT NULL DEFAULT nextval('logs_log_id_seq'),
+        user_id INTEGER NOT NULL REFERENCES users(user_id),
+        action VARCHAR NOT NULL,
+        description VARCHAR NOT NULL,
+        created_at TIMESTAMP NOT NULL,
+        PRIMARY KEY (log_id, created_at)
+    ) PARTITION BY RANGE (created_at)
+    """,
+    "ALTER SEQUENCE logs_log_id_seq OWNED BY logs.log_id",
+    "CREATE TABLE logs_default PARTITION OF logs DEFAULT",
+]
+
+
+def month_start(at: datetime) -> datetime:
+    return at.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"logs_{month.year:04d}_{month.month:02d}"
+
+
+def _month_of(name: str, pattern: re.Pattern) -> datetime | None:
+    match = pattern.match(name)
+    return datetime(int(match[1]), int(match[2]), 1) if match else None
+
+
+def log_table(name: str):
+    """
+    Lightweight table construct for `logs` or one of its monthly tables
+    """
+    return table(
+        name,
+        column("log_id", Integer),
+        column("user_id", Integer),
+        column("action", String),
+        column("description", String),
+        column("created_at", TIMESTAMP),
+    )
+
+
+def _is_partitioned(conn: Connection) -> bool:
+    return (
+        conn.execute(
+            text(
+                "SELECT 1 FROM pg_partitioned_table "
+                "WHERE partrelid = to_regclass('logs')"
+            )
+        ).first()
+        is not None
+    )
+
+
+def live_partitions(conn: Connection) -> list[datetime]:
+    """
+    Months stored in their own table: rotated tables on SQLite, native
+    partitions on Postgres. Newest first.
+    """
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        names = conn.execute(
+            text("SELECT name FROM sqlite_master WHERE type = 'table'")
+        ).scalars()
+    elif dialect == "postgresql":
+        names = conn.execute(
+            text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = to_regclass('logs')"
+            )
+        ).scalars()
+    else:
+        return []
+    months = [_month_of(name, PARTITION_NAME) for name in names]
+    return sorted((m for m in months if m is not None), reverse=True)
+
+
+def _create_partition(conn: Connection, month: datetime) -> None:
+    name = partition_name(month)
+    if conn.dialect.name == "postgresql":
+        conn.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF logs "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d}') "
+                f"TO ('{add_months(month, 1):%Y-%m-%d}')"
+            )
+        )
+    else:
+        conn.execute(
+            text(f"CREATE TABLE IF NOT EXISTS {name} AS SELECT * FROM logs WHERE 0")
+        )
+        conn.execute(
+            text(
+                f"CREATE INDEX IF NOT EXISTS idx_{name}_created_at "
+                f"ON {name} (created_at, log_id)"
+            )
+        )
+
+
+def ensure_log_partitions(engine: Engine, now: datetime | None = None) -> None:
+    """
+    Index logs by time and, on a partitioned Postgres table, create the
+    partitions for the coming months
+    """
+    now = now or datetime.now()
+    try:
+        with engine.begin() as conn:
+            conn.execute(
+                text(
+                    "CREATE INDEX IF NOT EXISTS idx_logs_created_at "
+                    "ON logs (created_at, log_id)"
+                )
+            )
+            if conn.dialect.name == "postgresql" and _is_partitioned(conn):
+                for ahead in range(LOGS_PARTITIONS_AHEAD + 1):
+                    _create_partition(conn, add_months(month_start(now), ahead))
+    except Exception as e:
+        logger.warning(f"Could not prepare the logs partitions: {e}")
+
+
+def partition_postgres_logs(conn: Connection, now: datetime | None = None) -> bool:
+    """
+    Turn an existing Postgres logs table into a partitioned one, keeping its
+    rows and ids. Returns False when it already is.
+    """
+    if _is_partitioned(conn):
+        return False
+
+    oldest = conn.execute(text("SELECT min(created_at) FROM logs")).scalar()
+    for ddl in POSTGRES_CONVERT_DDL:
+        conn.execute(text(ddl))
+
+    month = month_start(oldest or now or datetime.now())
+    last = add_months(month_start(now or datetime.now()), LOGS_PARTITIONS_AHEAD)
+    while month <= last:
+        _create_partition(conn, month)
+        month = add_months(month, 1)
+
+    conn.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS idx_logs_created_at "
+            "ON logs (created_at, log_id)"
+        )
+    )
+    conn.execute(
+        text(
+            "INSERT INTO logs (log_id, user_id, action, description, created_at) "
+            "SELECT log_id, user_id, action, description, created_at "
+            "FROM logs_unpartitioned"
+        )
+    )
+    conn.execute(text("DROP TABLE logs_unpartitioned"))
+    return True
+
+
+def rotate_logs(conn: Connection, now: datetime | None = None) -> int:
+    """
+    Move closed months older than LOGS_HOT_MONTHS out of the main logs table
+    (SQLite) or create the upcoming partitions (Postgres). Returns the
+    number of months rotated or partitions created.
+    """
+    now = now or datetime.now()
+    dialect = conn.dialect.name
+
+    if dialect == "postgresql":
+        if not _is_partitioned(conn):
+            return 0
+        existing = set(live_partitions(conn))
+        upcoming = [
+            add_months(month_start(now), ahead)
+            for ahead in range(LOGS_PARTITIONS_AHEAD + 1)
+        ]
+        for month in upcoming:
+            _create_partition(conn, month)
+        return len(set(upcoming) - existing)
+    if dialect != "sqlite":
+        return 0
+
+    logs = log_table("logs")
+    cutoff = add_months(month_start(now), -LOGS_HOT_MONTHS)
+    oldest = conn.execute(
+        select(logs.c.created_at)
+        .where(logs.c.created_at < cutoff)
+        .order_by(logs.c.created_at)
+        .limit(1)
+    ).scalar()
+
+    rotated = 0
+    month = month_start(oldest) if oldest else cutoff
+    while month < cutoff:
+        end = add_months(month, 1)
+        in_month = (logs.c.created_at >= month, logs.c.created_at < end)
+        rows = select(*logs.c).where(*in_month)
+        if conn.execute(rows.limit(1)).first() is not None:
+            _create_partition(conn, month)
+            conn.execute(
+                log_table(partition_name(month)).insert().from_select(LOG_COLUMNS, rows)
+            )
+            conn.execute(delete(logs).where(*in_month))
+            rotated += 1
+        month = end
+    return rotated
+
+
+def _archive_path(month: datetime, archive_dir: Path) -> Path:
+    return archive_dir / f"{partition_name(month)}.jsonl.gz"
+
+
+def _write_archive(rows, path: Path) -> int:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_suffix(".partial")
+    written = 0
+    with gzip.open(partial, "wt", encoding="utf-8") as out:
+        for row in rows:
+            record = dict(row._mapping)
+            record["created_at"] = record["created_at"].isoformat()
+            out.write(json.dumps(record) + "\n")
+            written += 1
+    os.replace(partial, path)
+    return written
+
+
+def archive_logs(
+    conn: Connection,
+    now: datetime | None = None,
+    archive_dir: Path = LOGS_ARCHIVE_DIR,
+) -> list[Path]:
+    """
+    Write every month older than LOGS_RETENTION_MONTHS to a gzipped JSONL
+    file and remove it from the database. Returns the files written.
+    """
+    now = now or datetime.now()
+    cutoff = add_months(month_start(now), -LOGS_RETENTION_MONTHS)
+    logs = log_table("logs")
+    partitions = set(live_partitions(conn))
+    partitioned = conn.dialect.name == "postgresql" and bool(partitions)
+
+    # Rows never rotated into a monthly table are archived from logs itself
+    months = {m for m in partitions if m < cutoff}
+    if not partitioned:
+        oldest = conn.execute(
+            select(logs.c.created_at)
+            .where(logs.c.created_at < cutoff)
+            .order_by(logs.c.created_at)
+            .limit(1)
+        ).scalar()
+        month = month_start(oldest) if oldest else cutoff
+        while month < cutoff:
+            months.add(month)
+            month = add_months(month, 1)
+
+    archived = []
+    for month in sorted(months):
+        end = add_months(month, 1)
+        in_month = (logs.c.created_at >= month, logs.c.created_at < end)
+        sources = [select(*logs.c).where(*in_month)] if not partitioned else []
+        if month in partitions:
+            sources.append(select(*log_table(partition_name(month)).c))
+        rows = conn.execute(
+            union_all(*sources).order_by("created_at", "log_id")
+            if len(sources) > 1
+            else sources[0].order_by("created_at", "log_id")
+        )
+
+        path = _archive_path(month, archive_dir)
+        if _write_archive(rows, path) == 0:
+            path.unlink()
+        else:
+            archived.append(path)
+
+        if month in partitions:
+            if partitioned:
+                conn.execute(
+                    text(f"ALTER TABLE logs DETACH PARTITION {partition_name(month)}")
+                )
+            conn.execute(text(f"DROP TABLE {partition_name(month)}"))
+        if not partitioned:
+            conn.execute(delete(logs).where(*in_month))
+    return archived
+
+
+def archived_months(archive_dir: Path = LOGS_ARCHIVE_DIR) -> list[datetime]:
+    """
+    Months available in the archive, newest first
+    """
+    if not archive_dir.is_dir():
+        return []
+    months = [_month_of(path.name, ARCHIVE_NAME) for path in archive_dir.iterdir()]
+    return sorted((m for m in months if m is not None), reverse=True)
+
+
+def read_archive(
+    month: datetime, archive_dir: Path = LOGS_ARCHIVE_DIR
+) -> Iterator[dict]:
+    with gzip.open(_archive_path(month, archive_dir), "rt", encoding="utf-8") as src:
+        for line in src:
+            record = json.loads(line)
+            record["created_at"] = datetime.fromisoformat(record["created_at"])
+            yield record
+
+
+def live_logs(db: Session):
+    """
+    Every log row still in the database as one selectable, for reports that
+    scan history
+    """
+    months = live_partitions(db.connection())
+    if db.get_bind().dialect.name != "sqlite" or not months:
+        return Logs.__table__
+    tables = [log_table("logs")] + [log_table(partition_name(m)) for m in months]
+    return union_all(*(select(*t.c) for t in tables)).subquery("all_logs")
+
+
+def _sort_key(row: dict) -> tuple[datetime, int]:
+    return row["created_at"], row["log_id"]
+
+
+def _matches(
+    row: dict,
+    action: str | None,
+    start: datetime | None,
+    end: datetime | None,
+    after: tuple[datetime, int] | None,
+) -> bool:
+    return (
+        (action is None or row["action"] == action)
+        and (start is None or row["created_at"] >= start)
+        and (end is None or row["created_at"] < end)
+        and (after is None or _sort_key(row) < after)
+    )
+
+
+def _sources(db: Session, archive_dir: Path):
+    """
+    (upper bound, month, kind) for every place logs live, newest first.
+    The main table has no upper bound; a month holds nothing at or after
+    its end.
+    """
+    yield None, None, "table"
+    if db.get_bind().dialect.name == "sqlite":
+        for month in live_partitions(db.connection()):
+            yield add_months(month, 1), month, "partition"
+    for month in archived_months(archive_dir):
+        yield add_months(month, 1), month, "archive"
+
+
+def query_logs(
+    db: Session,
+    page: PageParams,
+    action: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    archive_dir: Path = LOGS_ARCHIVE_DIR,
+) -> Page:
+    """
+    A page of logs, newest first, with the user's name, email and role.
+    The main table is read first; older monthly tables and archive files
+    are only opened while the page is short and the requested range
+    reaches back into them. Clients that don't page get every row of the
+    main table, and older months only when they ask for a date range.
+    """
+    # None: every row, for clients that don't page
+    wanted = page.limit + 1 if page.limit is not None else None
+    hot_only = wanted is None and start is None and end is None
+    rows: list[dict] = []
+
+    for upper, month, kind in _sources(db, archive_dir):
+        if upper is not None:
+            if hot_only:
+                break
+            if start is not None and upper <= start:
+                break
+            if (
+                wanted is not None
+                and len(rows) >= wanted
+                and rows[-1]["created_at"] >= upper
+            ):
+                break
+            if (end is not None and month >= end) or (
+                page.after is not None and month > page.after[0]
+            ):
+                continue
+
+        if kind == "archive":
+            found = [
+                row
+                for row in read_archive(month, archive_dir)
+                if _matches(row, action, start, end, page.after)
+            ]
+        else:
+            logs = log_table("logs" if kind == "table" else partition_name(month))
+            stmt = select(*logs.c)
+            if action:
+                stmt = stmt.where(logs.c.action == action)
+            if start is not None:
+                stmt = stmt.where(logs.c.created_at >= start)
+            if end is not None:
+                stmt = stmt.where(logs.c.created_at < end)
+            stmt = keyset_paginate(stmt, logs.c.created_at, logs.c.log_id, page)
+            found = [dict(row) for row in db.execute(stmt).mappings()]
+
+        rows = sorted(rows + found, key=_sort_key, reverse=True)[:wanted]
+
+    users = {
+        row.user_id: row
+        for row in db.execute(
+            select(Users.user_id, Users.full_name, Users.email, Users.role).where(
+                Users.user_id.in_({row["user_id"] for row in rows})
+            )
+        )
+    }
+    for row in rows:
+        user = users.get(row["user_id"])
+        row["user_name"] = user.full_name if user else None
+        row["user_email"] = user.email if user else None
+        row["user_role"] = user.role.value if user and user.role else None
+
+    return build_page(rows, page, key=_sort_key)
@@ -1,14 +1,32 @@
 import logging
 import os
+from contextlib import asynccontextmanager
 
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
+from api.audit_log import audit_log
+from api.catalog_cache import warm_catalog
 from api.database import engine
+from api.file_upload import upload_size_middleware
+from api.idempotency import (
+    REPLAYED_HEADER,
+    AlreadyProcessedError,
+    idempotency_middleware,
+    idempotent_replay_handler,
+)
+from api.image_variants import image_pool
+from api.ledger import ensure_opening_snapshots, ledger_compactor
+from api.log_partitions import ensure_log_partitions
 from api.models import Base
+from api.pagination import NEXT_CURSOR_HEADER
+from api.password_pool import password_pool
+from api.read_routing import WRITE_TOKEN_HEADER, read_your_writes_middleware
+from api.rewards import ensure_reward_balances
 from api.routers import all_routers
+from api.search_index import ensure_search_index
 from config.logging_config import setup_logging
 
 # Load environment variables
@@ -20,12 +38,33 @@ logger = logging.getLogger(__name__)
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
+ensure_search_index(engine)
+ensure_log_partitions(engine)
+ensure_opening_snapshots(engine)
+ensure_reward_balances(engine)
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    await warm_catalog()
+    ledger_compactor.start()
+    yield
+    ledger_compactor.stop()
+    audit_log.stop()
+    password_pool.shutdown()
+    image_pool.shutdown()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 for router in all_routers:
     app.include_router(router)
 
+app.middleware("http")(read_your_writes_middleware)
+app.middleware("http")(idempotency_middleware)
+app.middleware("http")(upload_size_middleware)
+app.add_exception_handler(AlreadyProcessedError, idempotent_replay_handler)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -33,6 +72,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, WRITE_TOKEN_HEADER, REPLAYED_HEADER],
 )
 
 # Create uploads directory if it doesn't exist
@@ -0,0 +1,351 @@
+import os
+import random
+from collections import defaultdict
+from collections.abc import Iterable
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import case, delete, distinct, func, insert, literal, select
+from sqlalchemy.orm import Session
+
+from api.database import upsert_increment
+from api.models import (
+    Merchants,
+    MerchantStats,
+    MerchantStatsShard,
+    Order,
+    OrderItem,
+    OrderStatus,
+    Product,
+    ProductStatus,
+)
+
+STAT_FIELDS = (
+    "total_products",
+    "active_listings",
+    "units_sold",
+    "order_count",
+    "revenue",
+)
+# Bumped by every order, so these are the counters that get sharded
+SALES_FIELDS = ("units_sold", "order_count", "revenue")
+
+# Rows a merchant's sales counters are spread over. With 1 every order of a
+# merchant updates its one merchant_stats row, which serializes the
+# merchant's checkouts on that row lock until they commit.
+MERCHANT_STATS_SHARDS = int(os.getenv("MERCHANT_STATS_SHARDS", "1"))
+# Shards of a merchant without sales for this long are merged back
+MERCHANT_STATS_MERGE_IDLE_SECONDS = int(
+    os.getenv("MERCHANT_STATS_MERGE_IDLE_SECONDS", "300")
+)
+
+
+def stock_status(stock: int, status: ProductStatus) -> ProductStatus:
+    """
+    Product status after a stock change, mirroring the
+    update_product_status_trigger from sql_implementation/06_triggers.sql
+    """
+    if stock <= 0:
+        return ProductStatus.out_of_stock
+    if status == ProductStatus.out_of_stock:
+        return ProductStatus.active
+    return status
+
+
+def stock_status_expression(new_stock):
+    """
+    SQL counterpart of stock_status() for an UPDATE setting stock to
+    `new_stock`, evaluated against the row's current status
+    """
+    status_type = Product.status.type
+    return case(
+        (new_stock <= 0, literal(ProductStatus.out_of_stock, status_type)),
+        (
+            Product.status == ProductStatus.out_of_stock,
+            literal(ProductStatus.active, status_type),
+        ),
+        else_=Product.status,
+    )
+
+
+def _bump(db: Session, merchant_id: int, **deltas) -> None:
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if deltas:
+        upsert_increment(
+            db,
+            MerchantStats,
+            keys={"merchant_id": merchant_id},
+            deltas=deltas,
+            values={"updated_at": datetime.now()},
+        )
+
+
+def add_sales(
+    db: Session,
+    merchant_id: int,
+    shards: int = MERCHANT_STATS_SHARDS,
+    **deltas,
+) -> None:
+    """
+    Add to a merchant's sales counters on one of `shards` rows picked at
+    random; shard 0 is the merchant_stats row itself
+    """
+    shard = random.randrange(shards) if shards > 1 else 0
+    if shard == 0:
+        _bump(db, merchant_id, **deltas)
+        return
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if deltas:
+        upsert_increment(
+            db,
+            MerchantStatsShard,
+            keys={"merchant_id": merchant_id, "shard": shard},
+            deltas=deltas,
+            values={"updated_at": datetime.now()},
+        )
+
+
+def _active(status: ProductStatus | None) -> int:
+    return int(status == ProductStatus.active)
+
+
+def product_created(db: Session, product: Product) -> None:
+    _bump(
+        db,
+        product.merchant_id,
+        total_products=1,
+        active_listings=_active(product.status or ProductStatus.active),
+    )
+
+
+def products_imported(
+    db: Session, merchant_id: int, statuses: list[ProductStatus]
+) -> None:
+    """
+    Count a batch of new products of one merchant with a single bump
+    """
+    _bump(
+        db,
+        merchant_id,
+        total_products=len(statuses),
+        active_listings=sum(_active(status) for status in statuses),
+    )
+
+
+def product_status_changed(
+    db: Session, merchant_id: int, old: ProductStatus, new: ProductStatus
+) -> None:
+    _bump(db, merchant_id, active_listings=_active(new) - _active(old))
+
+
+def products_status_changed(
+    db: Session,
+    merchant_id: int,
+    changes: Iterable[tuple[ProductStatus, ProductStatus]],
+) -> None:
+    """
+    product_status_changed for many (old, new) pairs with a single bump
+    """
+    _bump(
+        db,
+        merchant_id,
+        active_listings=sum(_active(new) - _active(old) for old, new in changes),
+    )
+
+
+def product_deleted(db: Session, product: Product) -> None:
+    _bump(
+        db,
+        product.merchant_id,
+        total_products=-1,
+        active_listings=-_active(product.status),
+    )
+
+
+def _record_sales(
+    db: Session, lines: Iterable[tuple[int, int, Decimal]], sign: int
+) -> None:
+    units = defaultdict(int)
+    revenue = defaultdict(Decimal)
+    for merchant_id, quantity, amount in lines:
+        units[merchant_id] += quantity
+        revenue[merchant_id] += Decimal(str(amount))
+
+    for merchant_id in units:
+        add_sales(
+            db,
+            merchant_id,
+            units_sold=sign * units[merchant_id],
+            order_count=sign,
+            revenue=sign * revenue[merchant_id],
+        )
+
+
+def order_placed(db: Session, lines: Iterable[tuple[int, int, Decimal]]) -> None:
+    """
+    Count a new order. `lines` are (merchant_id, quantity, amount) per item.
+    """
+    _record_sales(db, lines, 1)
+
+
+def order_cancelled(db: Session, order: Order) -> None:
+    _record_sales(
+        db,
+        (
+            (
+                item.product.merchant_id,
+                item.quantity,
+                item.quantity * item.price_at_time,
+            )
+            for item in order.items
+            if item.product is not None
+        ),
+        -1,
+    )
+
+
+def rebuild_merchant_stats(db: Session, merchant_id: int | None = None) -> int:
+    """
+    Recompute the counters from products and orders, replacing the stored
+    rows. Returns the number of merchants rebuilt; the caller commits.
+    """
+    products = select(
+        Product.merchant_id,
+        func.count(Product.product_id).label("total_products"),
+        func.sum(case((Product.status == ProductStatus.active, 1), else_=0)).label(
+            "active_listings"
+        ),
+    ).group_by(Product.merchant_id)
+    sales = (
+        select(
+            Product.merchant_id,
+            func.sum(OrderItem.quantity).label("units_sold"),
+            func.count(distinct(OrderItem.order_id)).label("order_count"),
+            func.sum(OrderItem.quantity * OrderItem.price_at_time).label("revenue"),
+        )
+        .join(Product, Product.product_id == OrderItem.product_id)
+        .join(Order, Order.order_id == OrderItem.order_id)
+        .where(Order.status != OrderStatus.cancelled)
+        .group_by(Product.merchant_id)
+    )
+    merchants = select(Merchants.merchant_id).distinct()
+    if merchant_id is not None:
+        products = products.where(Product.merchant_id == merchant_id)
+        sales = sales.where(Product.merchant_id == merchant_id)
+        merchants = merchants.where(Merchants.merchant_id == merchant_id)
+
+    stats = {
+        row.merchant_id: dict.fromkeys(STAT_FIELDS, 0) for row in db.execute(merchants)
+    }
+    for row in db.execute(products):
+        stats.setdefault(row.merchant_id, dict.fromkeys(STAT_FIELDS, 0)).update(
+            total_products=row.total_products, active_listings=row.active_listings
+        )
+    for row in db.execute(sales):
+        stats.setdefault(row.merchant_id, dict.fromkeys(STAT_FIELDS, 0)).update(
+            units_sold=row.units_sold,
+            order_count=row.order_count,
+            revenue=row.revenue or 0,
+        )
+
+    clear = delete(MerchantStats)
+    clear_shards = delete(MerchantStatsShard)
+    if merchant_id is not None:
+        clear = clear.where(MerchantStats.merchant_id == merchant_id)
+        clear_shards = clear_shards.where(MerchantStatsShard.merchant_id == merchant_id)
+    db.execute(clear_shards)
+    db.execute(clear)
+
+    now = datetime.now()
+    if stats:
+        db.execute(
+            insert(MerchantStats),
+            [
+                {"merchant_id": key, **values, "updated_at": now}
+                for key, values in stats.items()
+            ],
+        )
+    return len(stats)
+
+
+def merge_merchant_stats_shards(
+    db: Session, now: datetime | None = None, idle_seconds: int | None = None
+) -> int:
+    """
+    Fold the shard rows of merchants without sales for `idle_seconds` back
+    into their merchant_stats row (all shards when `idle_seconds` is 0).
+    Commits per merchant; returns the number of merchants merged.
+    """
+    now = now or datetime.now()
+    if idle_seconds is None:
+        idle_seconds = MERCHANT_STATS_MERGE_IDLE_SECONDS
+    candidates = select(MerchantStatsShard.merchant_id).group_by(
+        MerchantStatsShard.merchant_id
+    )
+    if idle_seconds:
+        candidates = candidates.having(
+            func.max(MerchantStatsShard.updated_at)
+            < now - timedelta(seconds=idle_seconds)
+        )
+
+    merged = 0
+    for merchant_id in db.scalars(candidates).all():
+        # Locked so an order landing on a shard now waits, then starts a new row
+        shards = db.scalars(
+            select(MerchantStatsShard)
+            .where(MerchantStatsShard.merchant_id == merchant_id)
+            .with_for_update()
+        ).all()
+        _bump(
+            db,
+            merchant_id,
+            **{name: sum(getattr(s, name) for s in shards) for name in SALES_FIELDS},
+        )
+        db.execute(
+            delete(MerchantStatsShard).where(
+                MerchantStatsShard.merchant_id == merchant_id,
+                MerchantStatsShard.shard.in_([s.shard for s in shards]),
+            )
+        )
+        db.commit()
+        merged += 1
+    return merged
+
+
+def load_merchant_stats(db: Session, user_id: int) -> dict | None:
+    """
+    Counters for the merchant owned by `user_id` in one query, summed over
+    its shards, or None if the user has no merchant profile
+    """
+    shards = (
+        select(
+            MerchantStatsShard.merchant_id,
+            *(
+                func.sum(getattr(MerchantStatsShard, name)).label(name)
+                for name in SALES_FIELDS
+            ),
+        )
+        .group_by(MerchantStatsShard.merchant_id)
+        .subquery()
+    )
+    row = db.execute(
+        select(
+            Merchants.merchant_id,
+            MerchantStats,
+            *(shards.c[name] for name in SALES_FIELDS),
+        )
+        .outerjoin(MerchantStats, MerchantStats.merchant_id == Merchants.merchant_id)
+        .outerjoin(shards, shards.c.merchant_id == Merchants.merchant_id)
+        .where(Merchants.user_id == user_id)
+        .limit(1)
+    ).first()
+    if row is None:
+        return None
+
+    stats = row.MerchantStats
+    counters = dict.fromkeys(STAT_FIELDS, 0)
+    if stats is not None:
+        counters.update({name: getattr(stats, name) for name in STAT_FIELDS})
+    for name in SALES_FIELDS:
+        counters[name] += getattr(row, name) or 0
+    return {**counters, "revenue": float(counters["revenue"])}
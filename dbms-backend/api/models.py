@@ -5,11 +5,19 @@ from sqlalchemy import (
     TIMESTAMP,
     Enum,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
+    and_,
+)
+from sqlalchemy.orm import (
+    DeclarativeBase,
+    Mapped,
+    foreign,
+    mapped_column,
+    relationship,
 )
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 
 class Base(DeclarativeBase):
@@ -99,6 +107,7 @@ class Account(Base):
     )
     user_id: Mapped[int] = mapped_column(ForeignKey("users.user_id"), nullable=False)
     account_type: Mapped[AccountType] = mapped_column(Enum(AccountType), nullable=False)
+    # As of the latest ledger snapshot; api/ledger.py has the current balance
     balance: Mapped[float] = mapped_column(DECIMAL(10, 2), nullable=False)
     created_at: Mapped[str] = mapped_column(TIMESTAMP, nullable=False)
 
@@ -122,6 +131,46 @@ class Transactions(Base):
     created_at: Mapped[str] = mapped_column(TIMESTAMP, nullable=False)
 
 
+# Append-only wallet movements; a balance is the latest snapshot plus the
+# entries after it (see api/ledger.py)
+class LedgerEntry(Base):
+    __tablename__ = "ledger_entries"
+    __table_args__ = (
+        Index("idx_ledger_entries_account", "account_id", "entry_id"),
+        Index("idx_ledger_entries_created_at", "created_at"),
+    )
+
+    entry_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    account_id: Mapped[int] = mapped_column(
+        ForeignKey("account.account_id"), nullable=False
+    )
+    # Positive for credits, negative for debits
+    amount: Mapped[float] = mapped_column(DECIMAL(10, 2), nullable=False)
+    entry_type: Mapped[TransactionType] = mapped_column(
+        Enum(TransactionType), nullable=False
+    )
+    transaction_id: Mapped[int | None] = mapped_column(
+        ForeignKey("transactions.transaction_id")
+    )
+    created_at: Mapped[str] = mapped_column(TIMESTAMP, nullable=False)
+
+
+# Balance of an account including every entry up to last_entry_id. Older
+# snapshots are kept for balance-at-time queries.
+class BalanceSnapshot(Base):
+    __tablename__ = "balance_snapshots"
+    __table_args__ = (Index("idx_balance_snapshots_as_of", "account_id", "as_of"),)
+
+    account_id: Mapped[int] = mapped_column(
+        ForeignKey("account.account_id"), primary_key=True
+    )
+    last_entry_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    balance: Mapped[float] = mapped_column(DECIMAL(10, 2), nullable=False)
+    # Time of the newest entry included
+    as_of: Mapped[str] = mapped_column(TIMESTAMP, nullable=False)
+    created_at: Mapped[str] = mapped_column(TIMESTAMP, nullable=False)
+
+
 class Refunds(Base):
     __tablename__ = "refunds"
 
@@ -147,8 +196,12 @@ class Logs(Base):
     created_at: Mapped[str] = mapped_column(TIMESTAMP, nullable=False)
 
 
+# Reward lots; unredeemed points are consumed oldest lot first
 class RewardPoints(Base):
     __tablename__ = "reward_points"
+    __table_args__ = (
+        Index("idx_reward_points_fifo", "user_id", "status", "reward_id"),
+    )
 
     reward_id: Mapped[int] = mapped_column(
         Integer, primary_key=True, autoincrement=True
@@ -162,6 +215,16 @@ class RewardPoints(Base):
     created_at: Mapped[str] = mapped_column(TIMESTAMP, nullable=False)
 
 
+# Unredeemed reward points per user, kept equal to the sum of the user's
+# earned lots by api/rewards.py
+class RewardBalance(Base):
+    __tablename__ = "reward_balances"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.user_id"), primary_key=True)
+    points: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    updated_at: Mapped[str] = mapped_column(TIMESTAMP, nullable=False)
+
+
 class Merchants(Base):
     __tablename__ = "merchants"
 
@@ -201,6 +264,37 @@ class Product(Base):
     updated_at: Mapped[str] = mapped_column(TIMESTAMP, nullable=False)
 
 
+# Per-merchant dashboard counters, maintained by the product and checkout
+# write paths in the same transaction (see api/merchant_stats.py)
+class MerchantStats(Base):
+    __tablename__ = "merchant_stats"
+
+    merchant_id: Mapped[int] = mapped_column(
+        ForeignKey("merchants.merchant_id"), primary_key=True
+    )
+    total_products: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    active_listings: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    units_sold: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    order_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    revenue: Mapped[float] = mapped_column(DECIMAL(12, 2), nullable=False, default=0)
+    updated_at: Mapped[str] = mapped_column(TIMESTAMP, nullable=False)
+
+
+# More rows for the sales counters of a merchant when MERCHANT_STATS_SHARDS > 1;
+# the merchant's totals are its merchant_stats row plus these
+class MerchantStatsShard(Base):
+    __tablename__ = "merchant_stats_shards"
+
+    merchant_id: Mapped[int] = mapped_column(
+        ForeignKey("merchants.merchant_id"), primary_key=True
+    )
+    shard: Mapped[int] = mapped_column(Integer, primary_key=True)
+    units_sold: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    order_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    revenue: Mapped[float] = mapped_column(DECIMAL(12, 2), nullable=False, default=0)
+    updated_at: Mapped[str] = mapped_column(TIMESTAMP, nullable=False)
+
+
 class Cart(Base):
     __tablename__ = "cart"
 
@@ -243,6 +337,19 @@ class Order(Base):
     created_at: Mapped[str] = mapped_column(TIMESTAMP, nullable=False)
     updated_at: Mapped[str] = mapped_column(TIMESTAMP, nullable=False)
 
+    items: Mapped[list["OrderItem"]] = relationship(
+        back_populates="order", order_by="OrderItem.order_item_id"
+    )
+    # Reward points are recorded against the order id (see order.create_order)
+    reward_points: Mapped[list["RewardPoints"]] = relationship(
+        primaryjoin=lambda: and_(
+            foreign(RewardPoints.transaction_id) == Order.order_id,
+            RewardPoints.user_id == Order.user_id,
+        ),
+        viewonly=True,
+        order_by="RewardPoints.reward_id",
+    )
+
 
 class OrderItem(Base):
     __tablename__ = "order_items"
@@ -257,3 +364,77 @@ class OrderItem(Base):
     quantity: Mapped[int] = mapped_column(Integer, nullable=False)
     price_at_time: Mapped[float] = mapped_column(DECIMAL(10, 2), nullable=False)
     created_at: Mapped[str] = mapped_column(TIMESTAMP, nullable=False)
+
+    order: Mapped[Order] = relationship(back_populates="items")
+    product: Mapped[Product] = relationship()
+
+
+# Admin dashboard rollups, one row per time bucket (see api/rollups.py)
+class StatsRollup(Base):
+    __abstract__ = True
+
+    bucket_start: Mapped[str] = mapped_column(TIMESTAMP, primary_key=True)
+    signups: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    logins: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    orders: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    gmv: Mapped[float] = mapped_column(DECIMAL(14, 2), nullable=False, default=0)
+    top_ups: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    top_up_amount: Mapped[float] = mapped_column(
+        DECIMAL(14, 2), nullable=False, default=0
+    )
+    refunds: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    refund_amount: Mapped[float] = mapped_column(
+        DECIMAL(14, 2), nullable=False, default=0
+    )
+    active_users: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class HourlyStats(StatsRollup):
+    __tablename__ = "stats_hourly"
+
+
+class DailyStats(StatsRollup):
+    __tablename__ = "stats_daily"
+
+
+# Users already counted as active in a bucket, so each is counted once
+class ActiveUserMark(Base):
+    __tablename__ = "stats_active_users"
+
+    period: Mapped[str] = mapped_column(String(8), primary_key=True)
+    bucket_start: Mapped[str] = mapped_column(TIMESTAMP, primary_key=True)
+    user_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+
+# Responses of money-moving requests, replayed on retries (see api/idempotency.py)
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (Index("idx_idempotency_keys_expires_at", "expires_at"),)
+
+    scope: Mapped[str] = mapped_column(String(255), primary_key=True)
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    fingerprint: Mapped[str] = mapped_column(String(64), nullable=False)
+    status_code: Mapped[int | None] = mapped_column(Integer)
+    response_body: Mapped[str | None] = mapped_column(Text)
+    created_at: Mapped[str] = mapped_column(TIMESTAMP, nullable=False)
+    # Set in the same transaction as the request's own writes
+    committed_at: Mapped[str | None] = mapped_column(TIMESTAMP)
+    expires_at: Mapped[str] = mapped_column(TIMESTAMP, nullable=False)
+
+
+# Uploaded files, stored once per content under uploads/objects (see
+# api/file_upload.py); ref_count is the number of rows whose image points here
+class StoredFile(Base):
+    __tablename__ = "stored_files"
+    __table_args__ = (
+        Index("idx_stored_files_unreferenced", "ref_count", "updated_at"),
+    )
+
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    path: Mapped[str] = mapped_column(String(255), nullable=False, unique=True)
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+    ref_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    created_at: Mapped[str] = mapped_column(TIMESTAMP, nullable=False)
+    # Bumped by every upload of the content, so a fresh one isn't swept
+    # before the row that will reference it is committed
+    updated_at: Mapped[str] = mapped_column(TIMESTAMP, nullable=False)
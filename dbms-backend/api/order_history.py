@@ -0,0 +1,172 @@
+from datetime import timedelta
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+
+from api.models import (
+    Order,
+    OrderItem,
+    RewardPoints,
+    RewardStatus,
+    Transactions,
+    TransactionType,
+)
+from api.pagination import Page, PageParams, build_page, keyset_paginate
+
+# Window used to pair an order with the purchase transaction created alongside it
+PURCHASE_MATCH_WINDOW = timedelta(seconds=10)
+
+
+def order_history_statement(user_id: int):
+    """
+    Orders for a user, newest first, with items, products and reward points
+    loaded in batches rather than per order
+    """
+    return (
+        select(Order)
+        .where(Order.user_id == user_id)
+        .order_by(Order.created_at.desc(), Order.order_id.desc())
+        .options(
+            selectinload(Order.items).joinedload(OrderItem.product),
+            selectinload(Order.reward_points),
+        )
+    )
+
+
+def load_order_history(db: Session, user_id: int, page: PageParams | None = None):
+    """
+    Load the user's orders in a constant number of queries. With `page`,
+    only that keyset page is loaded and a Page is returned.
+    """
+    stmt = order_history_statement(user_id)
+    if page is None:
+        return list(db.execute(stmt).scalars().unique())
+
+    stmt = keyset_paginate(stmt, Order.created_at, Order.order_id, page)
+    orders = db.execute(stmt).scalars().unique()
+    return build_page(orders, page, key=_order_key)
+
+
+async def load_order_history_async(
+    db: AsyncSession, user_id: int, page: PageParams
+) -> Page:
+    stmt = keyset_paginate(
+        order_history_statement(user_id), Order.created_at, Order.order_id, page
+    )
+    orders = (await db.execute(stmt)).scalars().unique()
+    return build_page(orders, page, key=_order_key)
+
+
+def _order_key(order: Order):
+    return order.created_at, order.order_id
+
+
+def load_order(db: Session, order_id: int, user_id: int) -> Order | None:
+    """
+    Load a single order with the same eager options as the history listing
+    """
+    stmt = order_history_statement(user_id).where(Order.order_id == order_id)
+    return db.execute(stmt).scalars().unique().first()
+
+
+def load_purchase_rewards(db: Session, orders: list[Order]) -> dict[int, int]:
+    """
+    Map order_id -> earned points via the purchase transaction recorded at
+    checkout time, using one query for transactions and one for rewards
+    """
+    if not orders:
+        return {}
+
+    account_ids = {order.account_id for order in orders}
+    start = min(order.created_at for order in orders) - PURCHASE_MATCH_WINDOW
+    end = max(order.created_at for order in orders) + PURCHASE_MATCH_WINDOW
+
+    transactions = db.execute(
+        select(
+            Transactions.transaction_id,
+            Transactions.account_id,
+            Transactions.created_at,
+        )
+        .where(
+            Transactions.account_id.in_(account_ids),
+            Transactions.transaction_type == TransactionType.purchase,
+            Transactions.created_at.between(start, end),
+        )
+        .order_by(Transactions.transaction_id)
+    ).all()
+
+    by_account = {}
+    for transaction_id, account_id, created_at in transactions:
+        by_account.setdefault(account_id, []).append((transaction_id, created_at))
+
+    # Pick the first purchase transaction inside each order's window
+    order_transaction = {}
+    for order in orders:
+        for transaction_id, created_at in by_account.get(order.account_id, []):
+            if abs(created_at - order.created_at) <= PURCHASE_MATCH_WINDOW:
+                order_transaction[order.order_id] = transaction_id
+                break
+
+    if not order_transaction:
+        return {}
+
+    user_ids = {order.user_id for order in orders}
+    rewards = db.execute(
+        select(RewardPoints.transaction_id, RewardPoints.points)
+        .where(
+            RewardPoints.transaction_id.in_(set(order_transaction.values())),
+            RewardPoints.user_id.in_(user_ids),
+            RewardPoints.status == RewardStatus.earned,
+        )
+        .order_by(RewardPoints.reward_id)
+    ).all()
+
+    points_by_transaction = {}
+    for transaction_id, points in rewards:
+        points_by_transaction.setdefault(transaction_id, points)
+
+    return {
+        order_id: points_by_transaction.get(transaction_id, 0)
+        for order_id, transaction_id in order_transaction.items()
+    }
+
+
+def order_items_response(order: Order) -> list[dict]:
+    return [
+        {
+            "order_item_id": item.order_item_id,
+            "order_id": item.order_id,
+            "product_id": item.product_id,
+            "quantity": item.quantity,
+            "price_at_time": float(item.price_at_time),
+            "created_at": item.created_at,
+            "name": item.product.name,
+            "image_url": item.product.image_url,
+        }
+        for item in order.items
+        if item.product is not None
+    ]
+
+
+def order_response(order: Order) -> dict:
+    """
+    Build the OrderResponse payload from an eagerly loaded order
+    """
+    reward_points_earned = order.reward_points[0].points if order.reward_points else 0
+    return {
+        "order_id": order.order_id,
+        "user_id": order.user_id,
+        "account_id": order.account_id,
+        "status": order.status,
+        "total_amount": float(order.total_amount),
+        "created_at": order.created_at,
+        "updated_at": order.updated_at,
+        "items": order_items_response(order),
+        "reward_points_earned": reward_points_earned,
+        "payment_method": order.payment_method,
+        "wallet_amount": float(order.wallet_amount) if order.wallet_amount else 0.0,
+        "reward_discount": float(order.reward_discount)
+        if order.reward_discount
+        else 0.0,
+    }
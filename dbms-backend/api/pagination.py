@@ -0,0 +1,98 @@
+import base64
+import json
+import os
+from dataclasses import dataclass
+from datetime import datetime
+
+from fastapi import HTTPException, Query, Response
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = int(os.getenv("PAGE_SIZE_DEFAULT", "200"))
+MAX_PAGE_SIZE = int(os.getenv("PAGE_SIZE_MAX", "1000"))
+
+# Response header carrying the cursor for the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+@dataclass(frozen=True, slots=True)
+class PageParams:
+    # None: the client didn't ask for pages, return every row
+    limit: int | None
+    after: tuple[datetime, int] | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class Page:
+    items: list
+    next_cursor: str | None
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """
+    Encode a (created_at, id) sort key as an opaque, URL-safe cursor
+    """
+    raw = json.dumps({"c": created_at.isoformat(), "i": row_id}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(data["c"]), int(data["i"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from e
+
+
+def page_params(
+    cursor: str | None = Query(None, description="Cursor from X-Next-Cursor"),
+    limit: int | None = Query(None, ge=1, description="Page size"),
+) -> PageParams:
+    """
+    FastAPI dependency reading the cursor and page size from the query string.
+    Requests with neither get every row, newest first, as before pagination
+    existed; a cursor without a limit gets DEFAULT_PAGE_SIZE rows.
+    """
+    if cursor is None and limit is None:
+        return PageParams(limit=None)
+    size = min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    after = decode_cursor(cursor) if cursor else None
+    return PageParams(limit=size, after=after)
+
+
+def keyset_paginate(query, created_col, id_col, params: PageParams):
+    """
+    Apply a stable (created_at DESC, id DESC) ordering, the cursor predicate
+    and the page limit to a Query or Select. One extra row is fetched to
+    know whether another page exists. Unpaged requests are only ordered.
+    """
+    if params.after is not None:
+        created_at, row_id = params.after
+        query = query.filter(
+            or_(
+                created_col < created_at,
+                and_(created_col == created_at, id_col < row_id),
+            )
+        )
+    query = query.order_by(None).order_by(created_col.desc(), id_col.desc())
+    if params.limit is None:
+        return query
+    return query.limit(params.limit + 1)
+
+
+def build_page(rows, params: PageParams, key) -> Page:
+    """
+    Trim the look-ahead row and compute the next cursor.
+    `key` maps a row to its (created_at, id) sort key.
+    """
+    rows = list(rows)
+    if params.limit is None or len(rows) <= params.limit:
+        return Page(items=rows, next_cursor=None)
+
+    items = rows[: params.limit]
+    return Page(items=items, next_cursor=encode_cursor(*key(items[-1])))
+
+
+def set_next_cursor(response: Response, page: Page) -> None:
+    if page.next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = page.next_cursor
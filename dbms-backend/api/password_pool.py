@@ -0,0 +1,45 @@
+import os
+
+from passlib.context import CryptContext
+
+from api.process_pool import ProcessPool
+
+# 0 workers runs password work inline (scripts, single-process debugging)
+PASSWORD_POOL_WORKERS = int(
+    os.getenv("PASSWORD_POOL_WORKERS", str(min(4, os.cpu_count() or 1)))
+)
+# Hashes queued or running before new requests are turned away with a 503
+PASSWORD_POOL_MAX_PENDING = int(
+    os.getenv("PASSWORD_POOL_MAX_PENDING", str(max(PASSWORD_POOL_WORKERS, 1) * 8))
+)
+PASSWORD_POOL_TIMEOUT_SECONDS = float(os.getenv("PASSWORD_POOL_TIMEOUT_SECONDS", "5"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def check_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+class PasswordPool(ProcessPool):
+    """
+    Runs bcrypt in worker processes so logins don't hold the GIL
+    """
+
+    def __init__(self, workers: int, max_pending: int, timeout: float):
+        super().__init__("Password", workers, max_pending, timeout)
+
+    def hash(self, password: str) -> str:
+        return self.run(hash_password, password)
+
+    def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return self.run(check_password, plain_password, hashed_password)
+
+
+password_pool = PasswordPool(
+    PASSWORD_POOL_WORKERS, PASSWORD_POOL_MAX_PENDING, PASSWORD_POOL_TIMEOUT_SECONDS
+)
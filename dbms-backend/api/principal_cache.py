@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from sqlalchemy.orm import make_transient_to_detached
+
+from api.models import UserRole, Users, UserStatus
+
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", "10000"))
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    user_id: int
+    email: str
+    role: UserRole
+    status: UserStatus
+
+
+@dataclass(frozen=True, slots=True)
+class CachedPrincipal:
+    principal: Principal
+    # Detached copy of the user row, re-attached per request without a SELECT
+    snapshot: Users
+    expires_at: float
+
+
+def detached_copy(user: Users) -> Users:
+    """
+    Copy the loaded column values of `user` into a new detached instance
+    """
+    values = {
+        column.key: getattr(user, column.key)
+        for column in Users.__mapper__.column_attrs
+    }
+    snapshot = Users(**values)
+    make_transient_to_detached(snapshot)
+    return snapshot
+
+
+class PrincipalCache:
+    """
+    Bounded LRU of bearer token -> authenticated user, with a TTL capped by
+    the token's own expiry. Entries are dropped whenever the user's profile,
+    role or status changes; revoked users are refused even on a cache hit.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._entries: OrderedDict[str, CachedPrincipal] = OrderedDict()
+        self._tokens_by_user: dict[int, set[str]] = {}
+        self._revoked: set[int] = set()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> CachedPrincipal | None:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.time():
+                self._drop(token)
+                return None
+            self._entries.move_to_end(token)
+            return entry
+
+    def put(self, token: str, user: Users, token_expires_at: float | None) -> None:
+        expires_at = time.time() + self.ttl
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+        entry = CachedPrincipal(
+            principal=Principal(
+                user_id=user.user_id,
+                email=user.email,
+                role=user.role,
+                status=user.status,
+            ),
+            snapshot=detached_copy(user),
+            expires_at=expires_at,
+        )
+        with self._lock:
+            if user.user_id in self._revoked:
+                return
+            self._drop(token)
+            self._entries[token] = entry
+            self._tokens_by_user.setdefault(user.user_id, set()).add(token)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._drop(token)
+
+    def revoke_user(self, user_id: int) -> None:
+        with self._lock:
+            self._revoked.add(user_id)
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._drop(token)
+
+    def restore_user(self, user_id: int) -> None:
+        with self._lock:
+            self._revoked.discard(user_id)
+
+    def is_revoked(self, user_id: int) -> bool:
+        return user_id in self._revoked
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def _drop(self, token: str) -> None:
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        tokens = self._tokens_by_user.get(entry.principal.user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[entry.principal.user_id]
+
+
+principal_cache = PrincipalCache(
+    PRINCIPAL_CACHE_MAX_ENTRIES, PRINCIPAL_CACHE_TTL_SECONDS
+)
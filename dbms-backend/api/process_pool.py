@@ -0,0 +1,135 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from fastapi import HTTPException
+
+
+class ProcessPool:
+    """
+    Runs CPU-bound work in worker processes so it neither holds the GIL nor
+    piles up in Starlette's threadpool. At most `max_pending` jobs are
+    queued or running; beyond that callers get a 503 straight away instead
+    of waiting, and each caller waits at most `timeout` seconds. `name` is
+    used in the 503 when the workers have died.
+    """
+
+    def __init__(self, name: str, workers: int, max_pending: int, timeout: float):
+        self.name = name
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor: ProcessPoolExecutor | None = None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._counters = {
+            "submitted": 0,
+            "completed": 0,
+            "rejected": 0,
+            "timed_out": 0,
+            "failed": 0,
+        }
+        self._busy_seconds = 0.0
+
+    def run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+
+        if not self._slots.acquire(blocking=False):
+            self._count("rejected")
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy, please try again",
+                headers={"Retry-After": "1"},
+            )
+
+        started = time.perf_counter()
+        try:
+            future = self._pool().submit(fn, *args)
+        except BrokenProcessPool as e:
+            self._slots.release()
+            self._reset()
+            self._count("failed")
+            raise HTTPException(
+                status_code=503, detail=f"{self.name} service unavailable"
+            ) from e
+
+        with self._lock:
+            self._pending += 1
+            self._counters["submitted"] += 1
+        # The slot is held until the job really finishes, even if the caller
+        # gave up waiting, so abandoned jobs still count against the limit
+        future.add_done_callback(lambda f: self._finished(f, started))
+
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError as e:
+            future.cancel()
+            self._count("timed_out")
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy, please try again",
+                headers={"Retry-After": "1"},
+            ) from e
+        except BrokenProcessPool as e:
+            self._reset()
+            raise HTTPException(
+                status_code=503, detail=f"{self.name} service unavailable"
+            ) from e
+
+    def stats(self) -> dict:
+        with self._lock:
+            completed = self._counters["completed"]
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "timeout_seconds": self.timeout,
+                "pending": self._pending,
+                **self._counters,
+                "avg_ms": round(self._busy_seconds / completed * 1000, 2)
+                if completed
+                else None,
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a process that already runs threads and
+                # holds database connections is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def _reset(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _finished(self, future: Future, started: float) -> None:
+        self._slots.release()
+        with self._lock:
+            self._pending -= 1
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                self._counters["failed"] += 1
+            else:
+                self._counters["completed"] += 1
+                self._busy_seconds += time.perf_counter() - started
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
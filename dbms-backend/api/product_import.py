@@ -0,0 +1,279 @@
+import csv
+import enum
+import io
+import json
+import logging
+import os
+import zipfile
+from collections.abc import Iterator
+from datetime import datetime
+from itertools import islice
+from typing import BinaryIO
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from api.file_upload import add_file_references, missing_stored_files, store_file
+from api.image_variants import generate_variants
+from api.merchant_stats import products_imported, stock_status
+from api.models import Product, ProductStatus
+from api.schemas import ProductImportError, ProductImportResponse, ProductImportRow
+
+logger = logging.getLogger(__name__)
+
+# Rows validated and inserted per statement and transaction
+PRODUCT_IMPORT_CHUNK_SIZE = int(os.getenv("PRODUCT_IMPORT_CHUNK_SIZE", "1000"))
+# Row errors listed in the response; the rest are only counted
+PRODUCT_IMPORT_MAX_ERRORS = int(os.getenv("PRODUCT_IMPORT_MAX_ERRORS", "1000"))
+PRODUCT_IMPORT_MAX_IMAGE_BYTES = int(
+    os.getenv("PRODUCT_IMPORT_MAX_IMAGE_BYTES", str(10 * 1024 * 1024))
+)
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+
+
+class ImportFormat(str, enum.Enum):
+    csv = "csv"
+    jsonl = "jsonl"
+
+
+def detect_format(filename: str | None) -> ImportFormat:
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension == ".csv":
+        return ImportFormat.csv
+    if extension in (".jsonl", ".ndjson"):
+        return ImportFormat.jsonl
+    raise HTTPException(
+        status_code=400,
+        detail="Can't tell the file format; upload a .csv or .jsonl file or pass format",
+    )
+
+
+# (row number, raw row or None, parse error or None)
+RawRow = tuple[int, dict | None, str | None]
+
+
+def read_rows(file: BinaryIO, fmt: ImportFormat) -> Iterator[RawRow]:
+    """
+    Rows of an uploaded file, one at a time. CSV rows are numbered by the
+    line they end on, JSONL rows by their line.
+    """
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        if fmt == ImportFormat.csv:
+            reader = csv.DictReader(text)
+            for row in reader:
+                yield reader.line_num, row, None
+            return
+
+        for line_num, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_num, None, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(row, dict):
+                yield line_num, None, "Expected a JSON object"
+            else:
+                yield line_num, row, None
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise HTTPException(
+            status_code=400, detail=f"Could not read the file: {e}"
+        ) from e
+    finally:
+        # Leave the upload's own file open for FastAPI to close
+        text.detach()
+
+
+def _clean(row: dict) -> dict:
+    cleaned = {}
+    for key, value in row.items():
+        if key is None or value is None:
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+            if not value:
+                continue
+        cleaned[key.strip()] = value
+    return cleaned
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}"
+        if e["loc"]
+        else e["msg"]
+        for e in error.errors()
+    )
+
+
+class ImageArchive:
+    """
+    Copies images out of an uploaded zip file into the file store as rows
+    ask for them, one entry at a time
+    """
+
+    def __init__(self, file: BinaryIO):
+        try:
+            self._zip = zipfile.ZipFile(file)
+        except zipfile.BadZipFile as e:
+            raise HTTPException(
+                status_code=400, detail="The image archive is not a zip file"
+            ) from e
+        self._saved: dict[str, str] = {}
+
+    def save(self, name: str) -> str:
+        if name in self._saved:
+            return self._saved[name]
+        try:
+            entry = self._zip.getinfo(name)
+        except KeyError as e:
+            raise ValueError(f"image {name!r} is not in the archive") from e
+        extension = os.path.splitext(name)[1].lower()
+        if extension not in IMAGE_EXTENSIONS:
+            raise ValueError(f"image {name!r} is not a supported image type")
+        if entry.file_size > PRODUCT_IMPORT_MAX_IMAGE_BYTES:
+            raise ValueError(f"image {name!r} is too large")
+
+        # Images already in the store, from this archive or earlier
+        # uploads, are not written again
+        with self._zip.open(entry) as source:
+            url = store_file(source, extension)
+        try:
+            generate_variants(url)
+        except ValueError as e:
+            raise ValueError(f"image {name!r} is not a readable image") from e
+        except HTTPException as e:
+            # The image pool is full or timed out: fail this row, not the
+            # import, so the rows already committed are still reported
+            raise ValueError(
+                f"image {name!r} could not be processed ({e.detail}), "
+                "please import this row again"
+            ) from e
+        self._saved[name] = url
+        return url
+
+    def close(self) -> None:
+        self._zip.close()
+
+
+class ImportReport:
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.errors: list[ProductImportError] = []
+        self.categories: set[str] = set()
+
+    def fail(self, row: int, error: str) -> None:
+        self.failed += 1
+        if len(self.errors) < PRODUCT_IMPORT_MAX_ERRORS:
+            self.errors.append(ProductImportError(row=row, error=error))
+
+    def response(self) -> ProductImportResponse:
+        return ProductImportResponse(
+            imported=self.imported,
+            failed=self.failed,
+            errors=self.errors,
+            errors_truncated=self.failed > len(self.errors),
+        )
+
+
+def _product_values(
+    row: ProductImportRow, merchant_id: int, image_url: str, now: datetime
+) -> dict:
+    return {
+        "merchant_id": merchant_id,
+        "name": row.name,
+        "description": row.description,
+        "price": row.price,
+        "mrp": row.mrp,
+        "stock": row.stock,
+        "business_category": row.business_category,
+        "image_url": image_url,
+        "status": stock_status(row.stock, ProductStatus.active),
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def _import_chunk(
+    db: Session,
+    merchant_id: int,
+    chunk: list[RawRow],
+    images: ImageArchive | None,
+    report: ImportReport,
+) -> None:
+    now = datetime.now()
+    values = []
+    rows = []
+    for row_num, raw, error in chunk:
+        if error is None:
+            try:
+                row = ProductImportRow.model_validate(_clean(raw))
+                image_url = row.image_url
+                if row.image:
+                    if images is None:
+                        raise ValueError("image given but no image archive uploaded")
+                    image_url = images.save(row.image)
+            except ValidationError as e:
+                error = _validation_message(e)
+            except ValueError as e:
+                error = str(e)
+        if error is not None:
+            report.fail(row_num, error)
+            continue
+        values.append(_product_values(row, merchant_id, image_url, now))
+        rows.append(row_num)
+
+    # A stored image that is gone fails its own rows, not the whole chunk
+    missing = missing_stored_files(db, [v["image_url"] for v in values])
+    if missing:
+        kept_values, kept_rows = [], []
+        for row_num, value in zip(rows, values, strict=True):
+            if value["image_url"] in missing:
+                report.fail(
+                    row_num, f"image_url {value['image_url']} is not an uploaded image"
+                )
+            else:
+                kept_values.append(value)
+                kept_rows.append(row_num)
+        values, rows = kept_values, kept_rows
+
+    if not values:
+        return
+    try:
+        db.execute(insert(Product).values(values))
+        products_imported(db, merchant_id, [v["status"] for v in values])
+        add_file_references(db, [v["image_url"] for v in values])
+        db.commit()
+    except Exception as e:
+        # Images only this chunk used are left unreferenced and swept later
+        db.rollback()
+        logger.warning(f"Product import chunk failed: {e}")
+        for row_num in rows:
+            report.fail(row_num, "Could not save this row's chunk")
+        return
+
+    report.imported += len(values)
+    report.categories.update(v["business_category"] for v in values)
+
+
+def import_products(
+    db: Session,
+    merchant_id: int,
+    rows: Iterator[RawRow],
+    images: ImageArchive | None = None,
+    chunk_size: int = PRODUCT_IMPORT_CHUNK_SIZE,
+) -> ImportReport:
+    """
+    Validate and insert products chunk by chunk, one multi-row INSERT and
+    commit per chunk, so memory stays bounded by the chunk size however
+    long the file is. Rows that fail are reported and skipped.
+    """
+    report = ImportReport()
+    while chunk := list(islice(rows, chunk_size)):
+        _import_chunk(db, merchant_id, chunk, images, report)
+    return report
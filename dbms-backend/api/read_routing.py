@@ -0,0 +1,135 @@
+import logging
+import random
+import threading
+import time
+
+from fastapi import Request
+from jose import JWTError, jwt
+
+from api.auth_lib import ALGORITHM, SECRET_KEY
+from api.database import (
+    async_session_local,
+    replica_async_sessions,
+    replica_sessions,
+    session_local,
+)
+from config.database_config import REPLICA_MAX_LAG_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Returned after a successful write; clients may echo it back on reads
+WRITE_TOKEN_HEADER = "X-Write-Token"
+READ_AFTER_HEADER = "X-Read-After"
+WRITE_TOKEN_COOKIE = "rw_token"
+
+UNSAFE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+
+class WriteRegistry:
+    """
+    Last write time per authenticated subject, so that a user's reads go to
+    the primary until replicas have had time to catch up
+    """
+
+    def __init__(self, window_seconds: int, max_entries: int = 100_000):
+        self.window = window_seconds
+        self.max_entries = max_entries
+        self._last_write: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def note_write(self, subject: str, at: float) -> None:
+        with self._lock:
+            self._last_write[subject] = at
+            if len(self._last_write) > self.max_entries:
+                self._prune(at)
+
+    def wrote_recently(self, subject: str, now: float) -> bool:
+        last = self._last_write.get(subject)
+        return last is not None and now - last < self.window
+
+    def _prune(self, now: float) -> None:
+        cutoff = now - self.window
+        self._last_write = {
+            subject: at for subject, at in self._last_write.items() if at >= cutoff
+        }
+
+
+write_registry = WriteRegistry(REPLICA_MAX_LAG_SECONDS)
+
+
+def bearer_subject(request: Request) -> str | None:
+    auth = request.headers.get("Authorization", "")
+    if not auth.startswith("Bearer "):
+        return None
+    try:
+        payload = jwt.decode(auth[7:], SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    return payload.get("sub")
+
+
+def _client_token(request: Request) -> float | None:
+    token = request.headers.get(READ_AFTER_HEADER) or request.cookies.get(
+        WRITE_TOKEN_COOKIE
+    )
+    try:
+        return int(token) / 1000 if token else None
+    except ValueError:
+        return None
+
+
+def needs_primary(request: Request) -> bool:
+    """
+    True if this request must read its own recent writes from the primary
+    """
+    now = time.time()
+    token = _client_token(request)
+    if token is not None and now - token < REPLICA_MAX_LAG_SECONDS:
+        return True
+    subject = bearer_subject(request)
+    return subject is not None and write_registry.wrote_recently(subject, now)
+
+
+async def read_your_writes_middleware(request: Request, call_next):
+    """
+    Stamp successful writes with a token and remember the writer
+    """
+    response = await call_next(request)
+    if request.method in UNSAFE_METHODS and response.status_code < 400:
+        now = time.time()
+        token = str(int(now * 1000))
+        subject = bearer_subject(request)
+        if subject:
+            write_registry.note_write(subject, now)
+        response.headers[WRITE_TOKEN_HEADER] = token
+        response.set_cookie(
+            WRITE_TOKEN_COOKIE,
+            token,
+            max_age=REPLICA_MAX_LAG_SECONDS,
+            httponly=True,
+            samesite="lax",
+        )
+    return response
+
+
+def read_session_factory(request: Request | None = None):
+    if not replica_sessions or (request is not None and needs_primary(request)):
+        return session_local
+    return random.choice(replica_sessions)
+
+
+def get_read_db(request: Request):
+    """
+    Session for read-only handlers: a replica unless the caller wrote recently
+    """
+    with read_session_factory(request)() as db:
+        yield db
+
+
+async def get_async_read_db(request: Request):
+    if not replica_async_sessions or needs_primary(request):
+        factory = async_session_local
+    else:
+        factory = random.choice(replica_async_sessions)
+    async with factory() as db:
+        yield db
@@ -0,0 +1,209 @@
+import logging
+from datetime import datetime
+from decimal import Decimal
+
+from fastapi import HTTPException
+from sqlalchemy import Engine, delete, func, insert, literal, select, update
+from sqlalchemy.orm import Session
+
+from api.database import upsert_increment
+from api.models import RewardBalance, RewardPoints, RewardStatus
+
+logger = logging.getLogger(__name__)
+
+# 1 point = ₹0.1
+POINT_VALUE = Decimal("0.1")
+# Lots locked and consumed per round trip while redeeming
+REDEEM_BATCH_SIZE = 50
+
+
+def points_value(points: int) -> Decimal:
+    return points * POINT_VALUE
+
+
+def reward_balance(db: Session, user_id: int) -> int:
+    """
+    Unredeemed points of a user, from a single primary-key lookup
+    """
+    points = db.scalar(
+        select(RewardBalance.points).where(RewardBalance.user_id == user_id)
+    )
+    return points or 0
+
+
+def earned_lots(db: Session, user_id: int) -> list[RewardPoints]:
+    """
+    The user's unredeemed lots, oldest first
+    """
+    return list(
+        db.scalars(
+            select(RewardPoints)
+            .where(
+                RewardPoints.user_id == user_id,
+                RewardPoints.status == RewardStatus.earned,
+            )
+            .order_by(RewardPoints.reward_id)
+        )
+    )
+
+
+def _adjust_balance(db: Session, user_id: int, points: int, at: datetime) -> None:
+    upsert_increment(
+        db,
+        RewardBalance,
+        keys={"user_id": user_id},
+        deltas={"points": points},
+        values={"updated_at": at},
+    )
+
+
+def earn_points(
+    db: Session,
+    user_id: int,
+    points: int,
+    transaction_id: int,
+    at: datetime | None = None,
+) -> RewardPoints | None:
+    """
+    Add a lot of `points` and raise the user's balance by the same amount
+    """
+    if points <= 0:
+        return None
+    at = at or datetime.now()
+    lot = RewardPoints(
+        transaction_id=transaction_id,
+        user_id=user_id,
+        points=points,
+        status=RewardStatus.earned,
+        created_at=at,
+    )
+    db.add(lot)
+    _adjust_balance(db, user_id, points, at)
+    return lot
+
+
+def redeem_points(
+    db: Session, user_id: int, points: int, at: datetime | None = None
+) -> int:
+    """
+    Take `points` off the user's balance and consume that many points from
+    the oldest lots. Only the lots needed are read and locked; a lot used in
+    part keeps its place in line with the rest, and the used part is kept
+    as a redeemed row. Returns the points left.
+
+    Raises 400 if `points` isn't positive or the balance is too low. Runs
+    in the caller's transaction.
+    """
+    if points <= 0:
+        raise HTTPException(
+            status_code=400, detail="Points to redeem must be greater than 0"
+        )
+    at = at or datetime.now()
+    result = db.execute(
+        update(RewardBalance)
+        .where(RewardBalance.user_id == user_id, RewardBalance.points >= points)
+        .values(points=RewardBalance.points - points, updated_at=at)
+    )
+    if result.rowcount != 1:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Insufficient reward points. Available: {reward_balance(db, user_id)}",
+        )
+
+    to_redeem = points
+    last_id = 0
+    while to_redeem > 0:
+        lots = db.scalars(
+            select(RewardPoints)
+            .where(
+                RewardPoints.user_id == user_id,
+                RewardPoints.status == RewardStatus.earned,
+                RewardPoints.reward_id > last_id,
+            )
+            .order_by(RewardPoints.reward_id)
+            .limit(min(to_redeem, REDEEM_BATCH_SIZE))
+            .with_for_update()
+        ).all()
+        if not lots:
+            # The balance promised more points than the lots hold
+            raise HTTPException(
+                status_code=409,
+                detail="Reward points are out of sync. Please try again later.",
+            )
+
+        for lot in lots:
+            last_id = lot.reward_id
+            if lot.points <= to_redeem:
+                lot.status = RewardStatus.redeemed
+                to_redeem -= lot.points
+            else:
+                lot.points -= to_redeem
+                db.add(
+                    RewardPoints(
+                        transaction_id=lot.transaction_id,
+                        user_id=user_id,
+                        points=to_redeem,
+                        status=RewardStatus.redeemed,
+                        created_at=at,
+                    )
+                )
+                to_redeem = 0
+            if to_redeem == 0:
+                break
+        db.flush()
+
+    return reward_balance(db, user_id)
+
+
+def rebuild_reward_balances(db: Session, user_id: int | None = None) -> int:
+    """
+    Recompute balances from the earned lots, replacing the stored rows.
+    Returns the number of balances written; the caller commits.
+    """
+    totals = (
+        select(RewardPoints.user_id, func.sum(RewardPoints.points))
+        .where(RewardPoints.status == RewardStatus.earned)
+        .group_by(RewardPoints.user_id)
+    )
+    clear = delete(RewardBalance)
+    if user_id is not None:
+        totals = totals.where(RewardPoints.user_id == user_id)
+        clear = clear.where(RewardBalance.user_id == user_id)
+    db.execute(clear)
+
+    now = datetime.now()
+    rows = [
+        {"user_id": owner, "points": points, "updated_at": now}
+        for owner, points in db.execute(totals)
+    ]
+    if rows:
+        db.execute(insert(RewardBalance), rows)
+    return len(rows)
+
+
+def ensure_reward_balances(engine: Engine) -> None:
+    """
+    Write the balance of users whose earned lots predate reward_balances,
+    for users that have no balance row
+    """
+    has_balance = select(RewardBalance.user_id).where(
+        RewardBalance.user_id == RewardPoints.user_id
+    )
+    opening = (
+        select(
+            RewardPoints.user_id,
+            func.sum(RewardPoints.points),
+            literal(datetime.now(), RewardBalance.updated_at.type).label("updated_at"),
+        )
+        .where(RewardPoints.status == RewardStatus.earned, ~has_balance.exists())
+        .group_by(RewardPoints.user_id)
+    )
+    try:
+        with engine.begin() as conn:
+            conn.execute(
+                insert(RewardBalance).from_select(
+                    ["user_id", "points", "updated_at"], opening
+                )
+            )
+    except Exception as e:
+        logger.warning(f"Could not write the opening reward balances: {e}")
@@ -0,0 +1,262 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import delete, distinct, func, insert, literal, select, union_all
+from sqlalchemy.orm import Session
+
+from api.database import insert_ignore, upsert_increment
+from api.log_partitions import live_logs
+from api.models import (
+    ActiveUserMark,
+    DailyStats,
+    HourlyStats,
+    Logs,
+    Order,
+    Transactions,
+    TransactionType,
+    UserRole,
+    Users,
+    UserStatus,
+)
+
+ROLLUPS = {"hour": HourlyStats, "day": DailyStats}
+
+COUNTERS = (
+    "signups",
+    "logins",
+    "orders",
+    "gmv",
+    "top_ups",
+    "top_up_amount",
+    "refunds",
+    "refund_amount",
+    "active_users",
+)
+
+# Log actions counted as logins when rebuilding from history
+LOGIN_ACTIONS = ("user_login", "admin_login", "merchant_login")
+
+
+def bucket_start(at: datetime, period: str) -> datetime:
+    at = at.replace(minute=0, second=0, microsecond=0)
+    return at.replace(hour=0) if period == "day" else at
+
+
+def record_activity(
+    db: Session, user_id: int | None = None, at: datetime | None = None, **deltas
+) -> None:
+    """
+    Add `deltas` to the hourly and daily buckets containing `at` and count
+    `user_id` as active in both, once per bucket. Runs in the caller's
+    transaction, so the rollups commit or roll back with the write itself.
+    """
+    at = at or datetime.now()
+    deltas = {
+        name: Decimal(str(value)) if isinstance(value, float) else value
+        for name, value in deltas.items()
+        if value
+    }
+    for period, model in ROLLUPS.items():
+        start = bucket_start(at, period)
+        counts = dict(deltas)
+        if user_id is not None and insert_ignore(
+            db,
+            ActiveUserMark,
+            {"period": period, "bucket_start": start, "user_id": user_id},
+        ):
+            counts["active_users"] = 1
+        if counts:
+            upsert_increment(db, model, keys={"bucket_start": start}, deltas=counts)
+
+
+def record_signup(db: Session, user_id: int) -> None:
+    record_activity(db, user_id, signups=1)
+
+
+def record_login(db: Session, user_id: int) -> None:
+    record_activity(db, user_id, logins=1)
+
+
+def record_order(db: Session, user_id: int, amount, at: datetime | None = None) -> None:
+    record_activity(db, user_id, at, orders=1, gmv=amount)
+
+
+def record_top_up(db: Session, user_id: int, amount) -> None:
+    record_activity(db, user_id, top_ups=1, top_up_amount=amount)
+
+
+def record_refund(db: Session, user_id: int, amount) -> None:
+    record_activity(db, user_id, refunds=1, refund_amount=amount)
+
+
+def load_admin_stats(db: Session, days: int = 30, hours: int = 48) -> dict:
+    """
+    Dashboard totals and recent buckets, read from the rollups only
+    """
+    totals = db.execute(
+        select(
+            func.coalesce(func.sum(DailyStats.signups), 0),
+            func.coalesce(func.sum(DailyStats.orders), 0),
+            func.coalesce(func.sum(DailyStats.gmv), 0),
+        )
+    ).one()
+    active_merchants = db.scalar(
+        select(func.count(Users.user_id)).where(
+            Users.role == UserRole.merchant, Users.status == UserStatus.active
+        )
+    )
+
+    now = datetime.now()
+    daily = db.scalars(
+        select(DailyStats)
+        .where(
+            DailyStats.bucket_start
+            >= bucket_start(now, "day") - timedelta(days=days - 1)
+        )
+        .order_by(DailyStats.bucket_start)
+    ).all()
+    hourly = db.scalars(
+        select(HourlyStats)
+        .where(
+            HourlyStats.bucket_start
+            >= bucket_start(now, "hour") - timedelta(hours=hours - 1)
+        )
+        .order_by(HourlyStats.bucket_start)
+    ).all()
+
+    return {
+        "total_users": totals[0],
+        "total_orders": totals[1],
+        "total_revenue": float(totals[2]),
+        "active_merchants": active_merchants or 0,
+        "daily": daily,
+        "hourly": hourly,
+    }
+
+
+def _truncate(dialect: str, column, period: str):
+    if dialect == "postgresql":
+        return func.date_trunc(period, column)
+    fmt = "%Y-%m-%d %H:00:00" if period == "hour" else "%Y-%m-%d 00:00:00"
+    if dialect == "mysql":
+        return func.date_format(column, fmt)
+    return func.strftime(fmt, column)
+
+
+def _as_datetime(value) -> datetime:
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+
+def _history_sources(dialect: str, period: str, logs) -> dict:
+    """
+    Per-bucket aggregates of `period` from users, `logs`, orders and
+    transactions, keyed by the counters each query fills in
+    """
+
+    def grouped(column, *aggregates, where=()):
+        bucket = _truncate(dialect, column, period).label("bucket")
+        return (
+            select(bucket, *aggregates)
+            .where(column.is_not(None), *where)
+            .group_by(bucket)
+        )
+
+    def transactions_of(kind: TransactionType):
+        return grouped(
+            Transactions.created_at,
+            func.count(Transactions.transaction_id),
+            func.coalesce(func.sum(Transactions.amount), 0),
+            where=(Transactions.transaction_type == kind,),
+        )
+
+    sources = {
+        ("signups",): grouped(Users.created_at, func.count(Users.user_id)),
+        ("logins",): grouped(
+            logs.c.created_at,
+            func.count(logs.c.log_id),
+            where=(logs.c.action.in_(LOGIN_ACTIONS),),
+        ),
+        ("orders", "gmv"): grouped(
+            Order.created_at,
+            func.count(Order.order_id),
+            func.coalesce(func.sum(Order.total_amount), 0),
+        ),
+        ("top_ups", "top_up_amount"): transactions_of(TransactionType.top_up),
+        ("refunds", "refund_amount"): transactions_of(TransactionType.refund),
+    }
+
+    activity = union_all(
+        select(logs.c.user_id, logs.c.created_at.label("at")),
+        select(Order.user_id, Order.created_at.label("at")),
+    ).subquery()
+    sources[("active_users",)] = grouped(
+        activity.c.at, func.count(distinct(activity.c.user_id))
+    )
+
+    return sources
+
+
+def rebuild_rollups(db: Session) -> int:
+    """
+    Recompute the hourly and daily rollups from history and re-mark the
+    users active in the current buckets. Logins of archived months are no
+    longer in the database and count as zero. Returns the number of buckets
+    written; the caller commits.
+    """
+    dialect = db.get_bind().dialect.name
+    logs = live_logs(db)
+    written = 0
+    now = datetime.now()
+
+    for period, model in ROLLUPS.items():
+        buckets: dict[datetime, dict] = {}
+        for names, stmt in _history_sources(dialect, period, logs).items():
+            for row in db.execute(stmt):
+                counters = buckets.setdefault(
+                    _as_datetime(row.bucket), dict.fromkeys(COUNTERS, 0)
+                )
+                counters.update(zip(names, row[1:], strict=True))
+
+        db.execute(delete(model))
+        if buckets:
+            db.execute(
+                insert(model),
+                [{"bucket_start": key, **values} for key, values in buckets.items()],
+            )
+        written += len(buckets)
+
+        current = bucket_start(now, period)
+        db.execute(delete(ActiveUserMark).where(ActiveUserMark.period == period))
+        active_now = union_all(
+            select(Logs.user_id).where(Logs.created_at >= current),
+            select(Order.user_id).where(Order.created_at >= current),
+        ).subquery()
+        db.execute(
+            insert(ActiveUserMark).from_select(
+                ["period", "bucket_start", "user_id"],
+                select(
+                    literal(period),
+                    literal(current, ActiveUserMark.bucket_start.type),
+                    active_now.c.user_id,
+                ).distinct(),
+            )
+        )
+
+    return written
+
+
+def prune_active_marks(db: Session, now: datetime | None = None) -> int:
+    """
+    Drop the per-user markers of closed buckets; they are only needed to
+    deduplicate within the bucket that is still filling up
+    """
+    now = now or datetime.now()
+    pruned = 0
+    for period in ROLLUPS:
+        pruned += db.execute(
+            delete(ActiveUserMark).where(
+                ActiveUserMark.period == period,
+                ActiveUserMark.bucket_start < bucket_start(now, period),
+            )
+        ).rowcount
+    return pruned
@@ -1,14 +1,25 @@
 from datetime import datetime
-from decimal import Decimal
 from sqlalchemy import func
 
 from fastapi import APIRouter, Body, Depends, File, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
+from api.audit_log import audit_log
 from api.auth_lib import get_current_user
 from api.database import get_db
-from api.file_upload import delete_file, save_profile_image
-from api.models import Account, Logs, RewardPoints, RewardStatus, Transactions, Users
+from api.file_upload import (
+    add_file_references,
+    delete_file,
+    release_file_references,
+    save_profile_image,
+)
+from api.idempotency import idempotency_key
+from api.ledger import account_balance, account_responses, credit
+from api.models import Account, Logs, Transactions, Users
+from api.principal_cache import principal_cache
+from api.rewards import earned_lots, points_value, redeem_points, reward_balance
+from api.rollups import record_top_up
 from api.schemas import (
     AccountCreate,
     AccountResponse,
@@ -58,11 +69,16 @@ def create_account(account: AccountCreate, user_id: int, db: Session = Depends(g
 @router.get("/user/{user_id}", response_model=list[AccountResponse])
 def get_user_accounts(user_id: int, db: Session = Depends(get_db)):
     accounts = db.query(Account).filter(Account.user_id == user_id).all()
-    return accounts
+    return account_responses(db, accounts)
 
 
 @router.post("/{account_id}/top-up", response_model=TransactionResponse)
-def top_up_account(account_id: int, amount: float, db: Session = Depends(get_db)):
+def top_up_account(
+    account_id: int,
+    amount: float,
+    db: Session = Depends(get_db),
+    _idempotency=Depends(idempotency_key),
+):
     # Check if account exists
     account = db.query(Account).filter(Account.account_id == account_id).first()
     if not account:
@@ -78,18 +94,19 @@ def top_up_account(account_id: int, amount: float, db: Session = Depends(get_db)
     )
 
     db.add(transaction)
+    db.flush()
 
     # Update account balance
-    account.balance += amount
+    credit(db, account_id, amount, TransactionType.top_up, transaction.transaction_id)
 
     # Log transaction
-    log = Logs(
-        user_id=account.user_id,
-        action="account_top_up",
-        description=f"Account {account_id} topped up with {amount}",
-        created_at=datetime.now(),
+    audit_log.record(
+        account.user_id,
+        "account_top_up",
+        f"Account {account_id} topped up with {amount}",
+        db=db,
     )
-    db.add(log)
+    record_top_up(db, account.user_id, amount)
 
     db.commit()
     db.refresh(transaction)
@@ -111,7 +128,7 @@ def get_profile(
         "role": current_user.role,
         "status": current_user.status,
         "created_at": current_user.created_at,
-        "accounts": accounts,
+        "accounts": account_responses(db, accounts),
     }
 
 
@@ -128,16 +145,14 @@ def update_profile(
 
         db.commit()
         db.refresh(current_user)
+        principal_cache.invalidate_user(current_user.user_id)
 
         # Log the profile update
-        log = Logs(
-            user_id=current_user.user_id,
-            action="profile_update",
-            description=f"User {current_user.user_id} updated profile information",
-            created_at=datetime.now(),
+        audit_log.record(
+            current_user.user_id,
+            "profile_update",
+            f"User {current_user.user_id} updated profile information",
         )
-        db.add(log)
-        db.commit()
 
         # Load related accounts
         accounts = db.query(Account).filter(
@@ -146,7 +161,7 @@ def update_profile(
 
         # Return Pydantic model directly from ORM object
         return UserProfileResponse.from_orm(current_user).copy(
-            update={"accounts": accounts}
+            update={"accounts": account_responses(db, accounts)}
         )
 
     except Exception as e:
@@ -160,6 +175,7 @@ def add_funds(
     payment_method: str = Body(...),
     current_user: Users = Depends(get_current_user),
     db: Session = Depends(get_db),
+    _idempotency=Depends(idempotency_key),
 ):
     try:
         # Get user's account
@@ -178,25 +194,32 @@ def add_funds(
             created_at=datetime.now(),
         )
         db.add(transaction)
+        db.flush()
 
         # Update account balance
-        account.balance += amount
+        credit(
+            db,
+            account.account_id,
+            amount,
+            TransactionType.top_up,
+            transaction.transaction_id,
+        )
+        new_balance = account_balance(db, account.account_id)
 
         # Log transaction
-        log = Logs(
-            user_id=current_user.user_id,
-            action="wallet_top_up",
-            description=f"Added ₹{amount} to wallet via {payment_method}",
-            created_at=datetime.now(),
+        audit_log.record(
+            current_user.user_id,
+            "wallet_top_up",
+            f"Added ₹{amount} to wallet via {payment_method}",
+            db=db,
         )
-        db.add(log)
+        record_top_up(db, current_user.user_id, amount)
 
         db.commit()
-        db.refresh(account)
 
         return {
             "message": "Funds added successfully",
-            "new_balance": float(account.balance),
+            "new_balance": float(new_balance),
         }
     except Exception as e:
         db.rollback()
@@ -209,16 +232,8 @@ def get_rewards(
 ):
     try:
         # Get user's reward points
-        rewards = (
-            db.query(RewardPoints)
-            .filter(
-                RewardPoints.user_id == current_user.user_id,
-                RewardPoints.status == RewardStatus.earned,
-            )
-            .all()
-        )
-
-        total_points = sum(reward.points for reward in rewards)
+        total_points = reward_balance(db, current_user.user_id)
+        rewards = earned_lots(db, current_user.user_id) if total_points else []
 
         return {
             "total_points": total_points,
@@ -243,27 +258,8 @@ def redeem_rewards_path(
     db: Session = Depends(get_db),
 ):
     try:
-        # Get user's reward points
-        available_rewards = (
-            db.query(RewardPoints)
-            .filter(
-                RewardPoints.user_id == current_user.user_id,
-                RewardPoints.status == RewardStatus.earned,
-            )
-            .all()
-        )
-
-        total_points = sum(reward.points for reward in available_rewards)
-
-        if points > total_points:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Insufficient reward points. Available: {total_points}",
-            )
-
         # Calculate reward value (1 point = ₹0.1)
-        # Convert to Decimal to match the account.balance type
-        reward_value = Decimal(str(points * 0.1))
+        reward_value = points_value(points)
 
         # Get user's account
         account = (
@@ -272,33 +268,8 @@ def redeem_rewards_path(
         if not account:
             raise HTTPException(status_code=404, detail="Account not found")
 
-        # Update account balance
-        account.balance += reward_value
-
-        # Update reward points status
-        points_to_redeem = points
-        for reward in available_rewards:
-            if points_to_redeem <= 0:
-                break
-
-            if reward.points <= points_to_redeem:
-                reward.status = RewardStatus.redeemed
-                points_to_redeem -= reward.points
-            else:
-                # Split the reward point record
-                remaining_points = reward.points - points_to_redeem
-                reward.points = points_to_redeem
-                reward.status = RewardStatus.redeemed
-
-                new_reward = RewardPoints(
-                    transaction_id=reward.transaction_id,
-                    user_id=reward.user_id,
-                    points=remaining_points,
-                    status=RewardStatus.earned,
-                    created_at=datetime.now(),
-                )
-                db.add(new_reward)
-                points_to_redeem = 0
+        # Use up the oldest reward lots first
+        remaining_points = redeem_points(db, current_user.user_id, points)
 
         # Create transaction for reward redemption
         transaction = Transactions(
@@ -309,6 +280,17 @@ def redeem_rewards_path(
             created_at=datetime.now(),
         )
         db.add(transaction)
+        db.flush()
+
+        # Update account balance
+        credit(
+            db,
+            account.account_id,
+            reward_value,
+            TransactionType.reward_redemption,
+            transaction.transaction_id,
+        )
+        new_balance = account_balance(db, account.account_id)
 
         # Log transaction
         log = Logs(
@@ -323,10 +305,11 @@ def redeem_rewards_path(
 
         return {
             "message": f"Successfully redeemed {points} points for ₹{float(reward_value)}",
-            "new_balance": float(account.balance),
-            "remaining_points": total_points - points,
+            "new_balance": float(new_balance),
+            "remaining_points": remaining_points,
         }
     except HTTPException as he:
+        db.rollback()
         raise he
     except Exception as e:
         db.rollback()
@@ -334,28 +317,36 @@ def redeem_rewards_path(
 
 
 @router.post("/upload-profile-image")
-def upload_profile_image(
+async def upload_profile_image(
     file: UploadFile = File(...),
     current_user: Users = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    try:
-        # Validate file type
-        if not file.content_type.startswith("image/"):
-            raise HTTPException(status_code=400, detail="File must be an image")
+    # Validate file type
+    if not file.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="File must be an image")
+
+    # Stream the new image into the file store; the database work runs in a
+    # worker thread
+    image_url = await save_profile_image(file)
+    return await run_in_threadpool(_set_profile_image, db, current_user, image_url)
 
-        # Delete old image if exists
-        if current_user.profile_image:
-            old_image_path = current_user.profile_image
-            delete_file(old_image_path)
 
-        # Save the new profile image
-        image_url = save_profile_image(file, current_user.user_id)
+def _set_profile_image(db: Session, current_user: Users, image_url: str) -> dict:
+    try:
+        # Move the reference from the old image to the new one
+        add_file_references(db, [image_url])
+        unreferenced = release_file_references(db, [current_user.profile_image])
 
         # Update user profile in database
         current_user.profile_image = image_url
         db.commit()
         db.refresh(current_user)
+        principal_cache.invalidate_user(current_user.user_id)
+
+        # Delete an old image outside the file store
+        for path in unreferenced:
+            delete_file(path)
 
         # Log the profile image update
         log = Logs(
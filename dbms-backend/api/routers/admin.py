@@ -1,10 +1,11 @@
 import logging
 from datetime import datetime, timedelta
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import text
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Response
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
+from api.audit_log import audit_log
 from api.auth_lib import (
     create_access_token,
     get_current_admin_user,
@@ -12,7 +13,31 @@ from api.auth_lib import (
     verify_password,
 )
 from api.database import get_db
-from api.models import Account, AccountType, Logs, Order, UserRole, Users, UserStatus
+from api.export import ExportFormat, export_response
+from api.image_variants import image_pool
+from api.ledger import account_balance
+from api.log_partitions import live_logs, query_logs
+from api.models import (
+    Account,
+    AccountType,
+    Logs,
+    Order,
+    Transactions,
+    UserRole,
+    Users,
+    UserStatus,
+)
+from api.pagination import (
+    PageParams,
+    build_page,
+    keyset_paginate,
+    page_params,
+    set_next_cursor,
+)
+from api.password_pool import password_pool
+from api.principal_cache import principal_cache
+from api.read_routing import get_read_db
+from api.rollups import load_admin_stats, record_login, record_signup
 from api.schemas import AdminStats, Token, UserCreate, UserLogin
 
 logger = logging.getLogger(__name__)
@@ -22,32 +47,30 @@ router = APIRouter(prefix="/api/admin", tags=["Admin"])
 
 @router.get("/logs")
 def get_logs(
-    db: Session = Depends(get_db), _admin_user=Depends(get_current_admin_user)
+    page: PageParams = Depends(page_params),
+    db: Session = Depends(get_read_db),
+    _admin_user=Depends(get_current_admin_user),
 ):
     """Get all logs for admin dashboard - public endpoint for testing"""
     try:
-        # Fetch logs with user names
-        query = text("""
-            SELECT l.log_id, l.user_id, u.full_name, l.action, l.description, l.created_at
-            FROM logs l
-            JOIN users u ON l.user_id = u.user_id
-            ORDER BY l.created_at DESC
-        """)
-        result = db.execute(query).fetchall()
+        # Fetch a page of logs with user names
+        result = query_logs(db, page)
 
         logs = [
             {
-                "log_id": row[0],
-                "user_id": row[1],
-                "user_name": row[2],
-                "action": row[3],
-                "description": row[4],
-                "created_at": row[5],
+                "log_id": row["log_id"],
+                "user_id": row["user_id"],
+                "user_name": row["user_name"],
+                "action": row["action"],
+                "description": row["description"],
+                "created_at": row["created_at"],
             }
-            for row in result
+            for row in result.items
         ]
 
-        return {"logs": logs}
+        return {"logs": logs, "next_cursor": result.next_cursor}
+    except HTTPException as he:
+        raise he
     except Exception as e:
         logger.info(f"Error fetching logs: {str(e)}")
         raise HTTPException(
@@ -58,41 +81,38 @@ def get_logs(
 
 @router.get("/stats", response_model=AdminStats)
 def get_api_admin_stats(
-    db: Session = Depends(get_db),
+    days: int = Query(30, ge=1, le=366),
+    hours: int = Query(48, ge=1, le=24 * 14),
+    db: Session = Depends(get_read_db),
     _current_admin: Users = Depends(get_current_admin_user),
 ):
-    """Get all logs for admin dashboard - protected endpoint"""
+    """Dashboard totals plus daily and hourly buckets, served from the rollups"""
     try:
-        # current_admin is already validated
-        query = text("""
-            SELECT l.log_id, l.user_id, u.full_name, l.action, l.description, l.created_at
-            FROM logs l
-            JOIN users u ON l.user_id = u.user_id
-            ORDER BY l.created_at DESC
-        """)
-        result = db.execute(query).fetchall()
-
-        logs = [
-            {
-                "log_id": row[0],
-                "user_id": row[1],
-                "user_name": row[2],
-                "action": row[3],
-                "description": row[4],
-                "created_at": row[5],
-            }
-            for row in result
-        ]
-
-        return {"logs": logs}
+        return load_admin_stats(db, days=days, hours=hours)
     except Exception as e:
-        logger.info(f"Error fetching logs: {str(e)}")
+        logger.info(f"Error fetching stats: {str(e)}")
         raise HTTPException(
             status_code=500,
-            detail=f"Error fetching logs: {str(e)}",
+            detail=f"Error fetching stats: {str(e)}",
         ) from e
 
 
+@router.get("/metrics/password-pool")
+def get_password_pool_metrics(
+    _current_admin: Users = Depends(get_current_admin_user),
+):
+    """Queue depth, throughput and rejections of the password hashing pool"""
+    return password_pool.stats()
+
+
+@router.get("/metrics/image-pool")
+def get_image_pool_metrics(
+    _current_admin: Users = Depends(get_current_admin_user),
+):
+    """Queue depth, throughput and rejections of the image variant pool"""
+    return image_pool.stats()
+
+
 # Admin specific endpoints
 @router.post("/signup", response_model=Token)
 def admin_signup(user: UserCreate, db: Session = Depends(get_db)):
@@ -137,6 +157,7 @@ def admin_signup(user: UserCreate, db: Session = Depends(get_db)):
         created_at=datetime.now(),
     )
     db.add(account)
+    record_signup(db, db_user.user_id)
 
     db.commit()
 
@@ -181,16 +202,12 @@ def admin_login(user_data: UserLogin, db: Session = Depends(get_db)):
     # Create access token
     access_token = create_access_token(data={"sub": users.email})
 
-    # Log admin login
-    log = Logs(
-        user_id=users.user_id,
-        action="admin_login",
-        description=f"Admin {users.email} logged in",
-        created_at=datetime.now(),
-    )
-    db.add(log)
+    record_login(db, users.user_id)
     db.commit()
 
+    # Log admin login
+    audit_log.record(users.user_id, "admin_login", f"Admin {users.email} logged in")
+
     # Get user's account
     account = db.query(Account).filter(Account.user_id == users.user_id).first()
 
@@ -204,27 +221,64 @@ def admin_login(user_data: UserLogin, db: Session = Depends(get_db)):
         "name": users.full_name,
         "account": {
             "id": account.account_id if account else None,
-            "balance": float(account.balance) if account else 0.0,
+            "balance": (
+                float(account_balance(db, account.account_id)) if account else 0.0
+            ),
         },
     }
 
 
+@router.put("/users/{user_id}/status")
+def update_user_status(
+    user_id: int,
+    status: UserStatus = Body(..., embed=True),
+    current_admin: Users = Depends(get_current_admin_user),
+    db: Session = Depends(get_db),
+):
+    """Block or unblock a user; blocked users are rejected immediately"""
+    user = db.query(Users).filter(Users.user_id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    user.status = status
+    audit_log.record(
+        current_admin.user_id,
+        "user_status_update",
+        f"User {user.email} status set to {status.value}",
+        db=db,
+    )
+    db.commit()
+
+    if status == UserStatus.blocked:
+        principal_cache.revoke_user(user_id)
+    else:
+        principal_cache.restore_user(user_id)
+        principal_cache.invalidate_user(user_id)
+
+    return {"user_id": user_id, "status": status.value}
+
+
 @router.get("/orders")
 def get_admin_orders(
-    db: Session = Depends(get_db), _admin_user=Depends(get_current_admin_user)
+    response: Response,
+    page: PageParams = Depends(page_params),
+    db: Session = Depends(get_read_db),
+    _admin_user=Depends(get_current_admin_user),
 ):
     """Get all orders for admin dashboard"""
     try:
         # Join with users to get user details
-        orders_with_users = (
-            db.query(Order, Users.full_name.label("user_name"))
-            .join(Users, Order.user_id == Users.user_id)
-            .order_by(Order.created_at.desc())
-            .all()
+        query = db.query(Order, Users.full_name.label("user_name")).join(
+            Users, Order.user_id == Users.user_id
+        )
+        query = keyset_paginate(query, Order.created_at, Order.order_id, page)
+        orders_page = build_page(
+            query.all(), page, key=lambda row: (row[0].created_at, row[0].order_id)
         )
+        set_next_cursor(response, orders_page)
 
         result = []
-        for order_data, user_name in orders_with_users:
+        for order_data, user_name in orders_page.items:
             result.append(
                 {
                     "order_id": order_data.order_id,
@@ -238,6 +292,8 @@ def get_admin_orders(
             )
 
         return result
+    except HTTPException as he:
+        raise he
     except Exception as e:
         logger.info(f"Error in admin orders API: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e)) from e
@@ -247,54 +303,158 @@ def get_admin_orders(
 def get_admin_logs(
     action: str = None,
     date: str = None,
+    page: PageParams = Depends(page_params),
     _admin_user=Depends(get_current_admin_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     """Get filtered logs for admin dashboard"""
     try:
-        # Build query for logs
-        query = (
-            db.query(
-                Logs,
-                Users.full_name.label("user_name"),
-                Users.email.label("user_email"),
-                Users.role.label("user_role"),
-            )
-            .join(Users, Logs.user_id == Users.user_id)
-            .order_by(Logs.created_at.desc())
-        )
-
-        # Apply filters if provided
-        if action:
-            query = query.filter(Logs.action == action)
-
+        start = end = None
         if date:
             # Filter for specific date
-            date_obj = datetime.strptime(date, "%Y-%m-%d")
-            next_day = date_obj + timedelta(days=1)
-            query = query.filter(
-                Logs.created_at >= date_obj, Logs.created_at < next_day
-            )
-
-        # Execute query and format results
-        log_results = query.all()
-        logs = []
+            start = datetime.strptime(date, "%Y-%m-%d")
+            end = start + timedelta(days=1)
 
-        for log, user_name, user_email, user_role in log_results:
-            logs.append(
-                {
-                    "log_id": log.log_id,
-                    "user_id": log.user_id,
-                    "user_name": user_name,
-                    "user_email": user_email,
-                    "user_role": user_role.value if user_role else None,
-                    "action": log.action,
-                    "description": log.description,
-                    "created_at": log.created_at,
-                }
-            )
+        # Reads archived months only when the page reaches back into them
+        log_page = query_logs(db, page, action=action, start=start, end=end)
+        logs = [
+            {
+                "log_id": row["log_id"],
+                "user_id": row["user_id"],
+                "user_name": row["user_name"],
+                "user_email": row["user_email"],
+                "user_role": row["user_role"],
+                "action": row["action"],
+                "description": row["description"],
+                "created_at": row["created_at"],
+            }
+            for row in log_page.items
+        ]
 
-        return {"logs": logs}
+        return {"logs": logs, "next_cursor": log_page.next_cursor}
+    except HTTPException as he:
+        raise he
     except Exception as e:
         logger.info(f"Error in admin logs API: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e)) from e
+
+
+def _log_filters(stmt, logs, action: str | None, date: str | None):
+    if action:
+        stmt = stmt.where(logs.c.action == action)
+    if date:
+        date_obj = datetime.strptime(date, "%Y-%m-%d")
+        next_day = date_obj + timedelta(days=1)
+        stmt = stmt.where(logs.c.created_at >= date_obj, logs.c.created_at < next_day)
+    return stmt
+
+
+@router.get("/export/logs")
+def export_logs(
+    format: ExportFormat = ExportFormat.ndjson,
+    action: str | None = None,
+    date: str | None = None,
+    _admin_user=Depends(get_current_admin_user),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Stream all logs still in the database, rotated months included, as
+    NDJSON or CSV. Archived months are not included; they are in the
+    gzipped files under LOGS_ARCHIVE_DIR.
+    """
+    columns = [
+        "log_id",
+        "user_id",
+        "user_name",
+        "user_email",
+        "action",
+        "description",
+        "created_at",
+    ]
+    logs = live_logs(db)
+    stmt = (
+        select(
+            logs.c.log_id,
+            logs.c.user_id,
+            Users.full_name,
+            Users.email,
+            logs.c.action,
+            logs.c.description,
+            logs.c.created_at,
+        )
+        .join(Users, logs.c.user_id == Users.user_id)
+        .order_by(logs.c.log_id)
+    )
+    try:
+        stmt = _log_filters(stmt, logs, action, date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail="date must be YYYY-MM-DD") from e
+    return export_response(stmt, columns, format, "logs")
+
+
+@router.get("/export/orders")
+def export_orders(
+    format: ExportFormat = ExportFormat.ndjson,
+    _admin_user=Depends(get_current_admin_user),
+):
+    """Stream all orders as NDJSON or CSV"""
+    columns = [
+        "order_id",
+        "user_id",
+        "user_name",
+        "total_amount",
+        "status",
+        "payment_method",
+        "wallet_amount",
+        "reward_discount",
+        "created_at",
+        "updated_at",
+    ]
+    stmt = (
+        select(
+            Order.order_id,
+            Order.user_id,
+            Users.full_name,
+            Order.total_amount,
+            Order.status,
+            Order.payment_method,
+            Order.wallet_amount,
+            Order.reward_discount,
+            Order.created_at,
+            Order.updated_at,
+        )
+        .join(Users, Order.user_id == Users.user_id)
+        .order_by(Order.order_id)
+    )
+    return export_response(stmt, columns, format, "orders")
+
+
+@router.get("/export/transactions")
+def export_transactions(
+    format: ExportFormat = ExportFormat.ndjson,
+    _admin_user=Depends(get_current_admin_user),
+):
+    """Stream all transactions as NDJSON or CSV"""
+    columns = [
+        "transaction_id",
+        "account_id",
+        "user_id",
+        "amount",
+        "transaction_type",
+        "status",
+        "created_at",
+    ]
+    stmt = (
+        select(
+            Transactions.transaction_id,
+            Transactions.account_id,
+            Account.user_id,
+            Transactions.amount,
+            Transactions.transaction_type,
+            Transactions.status,
+            Transactions.created_at,
+        )
+        .join(Account, Transactions.account_id == Account.account_id)
+        .order_by(Transactions.transaction_id)
+    )
+    return export_response(stmt, columns, format, "transactions")
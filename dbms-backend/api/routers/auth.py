@@ -4,9 +4,11 @@ from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
+from api.audit_log import audit_log
 from api.auth_lib import create_access_token, get_password_hash, verify_password
 from api.database import get_db
 from api.models import Account, AccountType, Logs, Users, UserStatus
+from api.rollups import record_login, record_signup
 from api.schemas import Token, UserCreate, UserLogin
 
 logger = logging.getLogger(__name__)
@@ -60,6 +62,7 @@ def signup(user: UserCreate, db: Session = Depends(get_db)):
             created_at=datetime.now(),
         )
         db.add(log)
+        record_signup(db, db_user.user_id)
 
         # Commit all changes
         db.commit()
@@ -69,6 +72,9 @@ def signup(user: UserCreate, db: Session = Depends(get_db)):
 
         return {"access_token": access_token, "token_type": "bearer"}
 
+    except HTTPException:
+        db.rollback()
+        raise
     except Exception as e:
         # Rollback on error
         db.rollback()
@@ -99,16 +105,12 @@ def login(user_data: UserLogin, db: Session = Depends(get_db)):
         # Create access token
         access_token = create_access_token(data={"sub": users.email})
 
-        # Log login
-        log = Logs(
-            user_id=users.user_id,
-            action="user_login",
-            description=f"User {users.email} logged in",
-            created_at=datetime.now(),
-        )
-        db.add(log)
+        record_login(db, users.user_id)
         db.commit()
 
+        # Log login
+        audit_log.record(users.user_id, "user_login", f"User {users.email} logged in")
+
         # Get user's account
         db.query(Account).filter(Account.user_id == users.user_id).first()
 
@@ -117,6 +119,8 @@ def login(user_data: UserLogin, db: Session = Depends(get_db)):
             access_token=access_token, token_type="bearer", user_id=users.user_id
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.info(f"Login error: {str(e)}")
         raise HTTPException(
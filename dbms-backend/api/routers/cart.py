@@ -3,11 +3,15 @@ import logging
 from datetime import datetime
 
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from api.audit_log import audit_log
 from api.auth_lib import get_current_user
-from api.database import get_db
-from api.models import Cart, CartItem, Logs, Product, Users
+from api.cart_view import CartView, load_cart_view, load_cart_view_async
+from api.database import get_async_db, get_db
+from api.models import Cart, CartItem, Product, Users
 from api.schemas import CartItemCreate, CartResponse
 
 logger = logging.getLogger(__name__)
@@ -22,41 +26,40 @@ def add_to_cart(
 ):
     try:
         # Get or create cart
-        cart = db.query(Cart).filter(Cart.user_id == current_user.user_id).first()
-        if not cart:
+        view = load_cart_view(db, current_user.user_id)
+        if view:
+            cart_id = view.cart_id
+        else:
             cart = Cart(
                 user_id=current_user.user_id,
                 created_at=datetime.now(),
                 updated_at=datetime.now(),
             )
             db.add(cart)
-            db.commit()
-            db.refresh(cart)
+            db.flush()
+            cart_id = cart.cart_id
 
         # Check product exists and has stock
-        product = (
-            db.query(Product).filter(Product.product_id == item.product_id).first()
-        )
+        product = db.get(Product, item.product_id)
         if not product:
             raise HTTPException(status_code=404, detail="Product not found")
         if product.stock < item.quantity:
             raise HTTPException(status_code=400, detail="Not enough stock")
 
         # Add or update cart item
-        cart_item = (
-            db.query(CartItem)
-            .filter(
-                CartItem.cart_id == cart.cart_id, CartItem.product_id == item.product_id
+        line = view.line(item.product_id) if view else None
+        if line:
+            db.execute(
+                update(CartItem)
+                .where(CartItem.cart_item_id == line.cart_item_id)
+                .values(
+                    quantity=CartItem.quantity + item.quantity,
+                    updated_at=datetime.now(),
+                )
             )
-            .first()
-        )
-
-        if cart_item:
-            cart_item.quantity += item.quantity
-            cart_item.updated_at = datetime.now()
         else:
             cart_item = CartItem(
-                cart_id=cart.cart_id,
+                cart_id=cart_id,
                 product_id=item.product_id,
                 quantity=item.quantity,
                 created_at=datetime.now(),
@@ -66,71 +69,26 @@ def add_to_cart(
 
         db.commit()
 
-        # Calculate total and get updated cart items
-        cart_items = db.query(CartItem).filter(CartItem.cart_id == cart.cart_id).all()
-        total = 0
-        items = []
-
-        for cart_item in cart_items:
-            product = (
-                db.query(Product)
-                .filter(Product.product_id == cart_item.product_id)
-                .first()
-            )
-            if product:
-                total += cart_item.quantity * product.price
-                items.append(
-                    {
-                        "product_id": cart_item.product_id,
-                        "quantity": cart_item.quantity,
-                        "price": product.price,
-                        "name": product.name,
-                        "image_url": product.image_url,
-                    }
-                )
-
         # Log cart update
-        log = Logs(
-            user_id=current_user.user_id,
-            action="cart_update",
-            description=f"User {current_user.user_id} added product {item.product_id} to cart",
-            created_at=datetime.now(),
+        audit_log.record(
+            current_user.user_id,
+            "cart_update",
+            f"User {current_user.user_id} added product {item.product_id} to cart",
         )
-        db.add(log)
-        db.commit()
 
-        return {"cart_id": cart.cart_id, "items": items, "total_amount": total}
+        return load_cart_view(db, current_user.user_id).to_response()
+    except HTTPException as he:
+        db.rollback()
+        raise he
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e)) from e
 
 
 @router.get("/user/{user_id}", response_model=CartResponse)
-def get_cart(user_id: int, db: Session = Depends(get_db)):
-    cart = db.query(Cart).filter(Cart.user_id == user_id).first()
-    if not cart:
-        return {"cart_id": 0, "items": [], "total_amount": 0}
-
-    cart_items = db.query(CartItem).filter(CartItem.cart_id == cart.cart_id).all()
-    total = 0
-    items = []
-
-    for item in cart_items:
-        product = (
-            db.query(Product).filter(Product.product_id == item.product_id).first()
-        )
-        if product:
-            total += item.quantity * product.price
-            items.append(
-                {
-                    "product_id": item.product_id,
-                    "quantity": item.quantity,
-                    "price": product.price,
-                    "name": product.name,
-                }
-            )
-
-    return {"cart_id": cart.cart_id, "items": items, "total_amount": total}
+async def get_cart(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    view = await load_cart_view_async(db, user_id) or CartView.empty(user_id)
+    return view.to_response()
 
 
 @router.delete("/product/{product_id}")
@@ -156,17 +114,14 @@ def remove_from_cart(
             raise HTTPException(status_code=404, detail="Item not found in cart")
 
         db.delete(cart_item)
+        db.commit()
 
         # Log cart update
-        log = Logs(
-            user_id=current_user.user_id,
-            action="cart_updated",
-            description=f"User {current_user.user_id} removed product {product_id} from cart",
-            created_at=datetime.now(),
+        audit_log.record(
+            current_user.user_id,
+            "cart_updated",
+            f"User {current_user.user_id} removed product {product_id} from cart",
         )
-        db.add(log)
-
-        db.commit()
         return {"message": "Item removed from cart successfully"}
     except Exception as e:
         db.rollback()
@@ -178,9 +133,9 @@ def get_current_user_cart(
     current_user: Users = Depends(get_current_user), db: Session = Depends(get_db)
 ):
     try:
-        # Get user's cart
-        cart = db.query(Cart).filter(Cart.user_id == current_user.user_id).first()
-        if not cart:
+        # Get user's cart with product details
+        view = load_cart_view(db, current_user.user_id)
+        if not view:
             return {
                 "cart_id": 0,
                 "user_id": current_user.user_id,
@@ -190,41 +145,7 @@ def get_current_user_cart(
                 "updated_at": datetime.now(),
             }
 
-        # Get cart items with product details
-        cart_items = db.query(CartItem).filter(CartItem.cart_id == cart.cart_id).all()
-        items = []
-        total = 0
-
-        for item in cart_items:
-            product = (
-                db.query(Product).filter(Product.product_id == item.product_id).first()
-            )
-            if product:
-                total += item.quantity * product.price
-                items.append(
-                    {
-                        "cart_item_id": item.cart_item_id,
-                        "cart_id": item.cart_id,
-                        "product_id": item.product_id,
-                        "quantity": item.quantity,
-                        "user_id": current_user.user_id,
-                        "created_at": item.created_at,
-                        "updated_at": item.updated_at,
-                        "name": product.name,
-                        "price": product.price,
-                        "image_url": product.image_url,
-                        "category": product.business_category,
-                    }
-                )
-
-        return {
-            "cart_id": cart.cart_id,
-            "user_id": current_user.user_id,
-            "items": items,
-            "total_amount": total,
-            "created_at": cart.created_at,
-            "updated_at": cart.updated_at,
-        }
+        return view.to_response()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) from e
 
@@ -238,76 +159,42 @@ def update_cart_item(
 ):
     try:
         # Get user's cart
-        cart = db.query(Cart).filter(Cart.user_id == current_user.user_id).first()
-        if not cart:
+        view = load_cart_view(db, current_user.user_id)
+        if not view:
             raise HTTPException(status_code=404, detail="Cart not found")
 
         # Check product exists and has stock
-        product = db.query(Product).filter(Product.product_id == product_id).first()
+        product = db.get(Product, product_id)
         if not product:
             raise HTTPException(status_code=404, detail="Product not found")
         if product.stock < quantity:
             raise HTTPException(status_code=400, detail="Not enough stock")
 
         # Update cart item
-        cart_item = (
-            db.query(CartItem)
-            .filter(CartItem.cart_id == cart.cart_id, CartItem.product_id == product_id)
-            .first()
-        )
-
-        if not cart_item:
+        line = view.line(product_id)
+        if not line:
             raise HTTPException(status_code=404, detail="Item not found in cart")
 
-        cart_item.quantity = quantity
-        cart_item.updated_at = datetime.now()
-
-        # Log cart update
-        log = Logs(
-            user_id=current_user.user_id,
-            action="cart_update",
-            description=f"User {current_user.user_id} updated quantity of product {product_id} to {quantity}",
-            created_at=datetime.now(),
+        db.execute(
+            update(CartItem)
+            .where(CartItem.cart_item_id == line.cart_item_id)
+            .values(quantity=quantity, updated_at=datetime.now())
         )
-        db.add(log)
 
         db.commit()
 
-        # Get updated cart items
-        cart_items = db.query(CartItem).filter(CartItem.cart_id == cart.cart_id).all()
-        total = 0
-        items = []
-
-        for item in cart_items:
-            product = (
-                db.query(Product).filter(Product.product_id == item.product_id).first()
-            )
-            if product:
-                total += item.quantity * product.price
-                items.append(
-                    {
-                        "cart_item_id": item.cart_item_id,
-                        "cart_id": item.cart_id,
-                        "product_id": item.product_id,
-                        "quantity": item.quantity,
-                        "user_id": current_user.user_id,
-                        "created_at": item.created_at,
-                        "updated_at": item.updated_at,
-                        "name": product.name,
-                        "price": product.price,
-                        "image_url": product.image_url,
-                        "category": product.business_category,
-                    }
-                )
+        # Log cart update
+        audit_log.record(
+            current_user.user_id,
+            "cart_update",
+            f"User {current_user.user_id} updated quantity of product {product_id} to {quantity}",
+        )
 
-        return {
-            "cart_id": cart.cart_id,
-            "user_id": current_user.user_id,
-            "items": items,
-            "total_amount": total,
-            "created_at": cart.created_at,
-            "updated_at": cart.updated_at,
-        }
+        # Get updated cart items
+        return load_cart_view(db, current_user.user_id).to_response()
+    except HTTPException as he:
+        db.rollback()
+        raise he
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e)) from e
@@ -1,11 +1,20 @@
 from datetime import datetime
-from decimal import Decimal
 
 from fastapi import APIRouter, Body, Depends, HTTPException
+from sqlalchemy import case, insert, select, update
 from sqlalchemy.orm import Session
 
 from api.auth_lib import get_current_user
+from api.catalog_cache import invalidate_products
 from api.database import get_db
+from api.idempotency import idempotency_key
+from api.ledger import account_balance, debit
+from api.merchant_stats import (
+    order_placed,
+    product_status_changed,
+    stock_status,
+    stock_status_expression,
+)
 from api.models import (
     Account,
     Cart,
@@ -15,13 +24,13 @@ from api.models import (
     OrderItem,
     OrderStatus,
     Product,
-    RewardPoints,
-    RewardStatus,
     Transactions,
     TransactionStatus,
     TransactionType,
     Users,
 )
+from api.rewards import earn_points, points_value, redeem_points, reward_balance
+from api.rollups import record_order
 from api.schemas import OrderResponse
 
 router = APIRouter(prefix="/api/checkout", tags=["Checkout"])
@@ -36,6 +45,7 @@ def process_checkout(
     order_date: str | None = Body(None),
     current_user: Users = Depends(get_current_user),
     db: Session = Depends(get_db),
+    _idempotency=Depends(idempotency_key),
 ):
     try:
         # Get user's cart(Finds the cart belonging to the logged-in user.)
@@ -48,28 +58,44 @@ def process_checkout(
         if not cart_items:
             raise HTTPException(status_code=400, detail="Cart is empty")
 
+        quantities: dict[int, int] = {}
+        for item in cart_items:
+            quantities[item.product_id] = (
+                quantities.get(item.product_id, 0) + item.quantity
+            )
+
+        # Load and lock every product in one query; ordered by id so two
+        # checkouts sharing products always lock them in the same order
+        products = {
+            product.product_id: product
+            for product in db.scalars(
+                select(Product)
+                .where(Product.product_id.in_(quantities))
+                .order_by(Product.product_id)
+                .with_for_update()
+            )
+        }
+
         # Calculate total and check stock
         total = 0.0
         order_items = []
 
-        for item in cart_items:
-            product = (
-                db.query(Product).filter(Product.product_id == item.product_id).first()
-            )
+        for product_id, quantity in quantities.items():
+            product = products.get(product_id)
             if not product:
                 raise HTTPException(
-                    status_code=404, detail=f"Product {item.product_id} not found"
+                    status_code=404, detail=f"Product {product_id} not found"
                 )
-            if product.stock < item.quantity:
+            if product.stock < quantity:
                 raise HTTPException(
                     status_code=400,
                     detail=f"Not enough stock for product {product.name}",
                 )
             # Convert Decimal to float for calculations
             item_price = float(product.price)
-            item_total = item_price * item.quantity
+            item_total = item_price * quantity
             total += item_total
-            order_items.append((product, item.quantity))
+            order_items.append((product, quantity))
 
         # Get user's account(Retrieves the user’s wallet/account info)
         account = (
@@ -82,16 +108,7 @@ def process_checkout(
         reward_discount = 0.0
         if use_rewards and reward_points:
             # Get user's available reward points
-            available_rewards = (
-                db.query(RewardPoints)
-                .filter(
-                    RewardPoints.user_id == current_user.user_id,
-                    RewardPoints.status == RewardStatus.earned,
-                )
-                .all()
-            )
-
-            total_points = sum(reward.points for reward in available_rewards)
+            total_points = reward_balance(db, current_user.user_id)
             if reward_points > total_points:
                 raise HTTPException(
                     status_code=400,
@@ -99,15 +116,15 @@ def process_checkout(
                 )
 
             # Calculate reward value (1 point = ₹0.1)
-            reward_discount = float(reward_points) * 0.1
+            reward_discount = float(points_value(reward_points))
 
         # Calculate wallet amount to use
         wallet_amount = 0.0
         if use_wallet:
-            if account.balance > 0:
+            available = account_balance(db, account.account_id)
+            if available > 0:
                 # Convert Decimal to float for calculations
-                account_balance = float(account.balance)
-                wallet_amount = min(total, account_balance)
+                wallet_amount = min(total, float(available))
             else:
                 raise HTTPException(
                     status_code=400, detail="Insufficient wallet balance"
@@ -147,51 +164,64 @@ def process_checkout(
             updated_at=created_at,
         )
         db.add(db_order)
-        db.commit()
-        db.refresh(db_order)
+        db.flush()  # Flush to get the order ID
 
-        # Create order items and update stock
-        for product, quantity in order_items:
-            order_item = OrderItem(
-                order_id=db_order.order_id,
-                product_id=product.product_id,
-                quantity=quantity,
-                price_at_time=float(product.price),
-                created_at=created_at,
+        # Create all order items in one statement
+        db.execute(
+            insert(OrderItem).values(
+                [
+                    {
+                        "order_id": db_order.order_id,
+                        "product_id": product.product_id,
+                        "quantity": quantity,
+                        "price_at_time": product.price,
+                        "created_at": created_at,
+                    }
+                    for product, quantity in order_items
+                ]
             )
-            db.add(order_item)
-            product.stock -= quantity
-            product.updated_at = created_at
+        )
 
-        # Update account balance if using wallet
-        if wallet_amount > 0:
-            account.balance -= Decimal(str(wallet_amount))
+        # Update stock of all products in one statement. The stock check is
+        # repeated in the WHERE clause, so a concurrent checkout can never
+        # drive stock below zero even where rows can't be locked.
+        wanted = case(quantities, value=Product.product_id)
+        result = db.execute(
+            update(Product)
+            .where(Product.product_id.in_(quantities), Product.stock >= wanted)
+            # status first: MySQL evaluates SET left to right
+            .ordered_values(
+                (Product.status, stock_status_expression(Product.stock - wanted)),
+                (Product.stock, Product.stock - wanted),
+                (Product.updated_at, created_at),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != len(quantities):
+            raise HTTPException(
+                status_code=409,
+                detail="Stock changed during checkout. Please try again.",
+            )
+
+        for product, quantity in order_items:
+            product_status_changed(
+                db,
+                product.merchant_id,
+                product.status,
+                stock_status(product.stock - quantity, product.status),
+            )
+        order_placed(
+            db,
+            (
+                (product.merchant_id, quantity, product.price * quantity)
+                for product, quantity in order_items
+            ),
+        )
+        record_order(db, current_user.user_id, total, created_at)
 
-        # Process reward points redemption if used
+        # Process reward points redemption if used, oldest lots first
         if use_rewards and reward_points:
-            points_to_redeem = reward_points
-            for reward in available_rewards:
-                if points_to_redeem <= 0:
-                    break
-
-                if reward.points <= points_to_redeem:
-                    reward.status = RewardStatus.redeemed
-                    points_to_redeem -= reward.points
-                else:
-                    # Split the reward point record
-                    remaining_points = reward.points - points_to_redeem
-                    reward.points = points_to_redeem
-                    reward.status = RewardStatus.redeemed
-
-                    new_reward = RewardPoints(
-                        transaction_id=db_order.order_id,
-                        user_id=reward.user_id,
-                        points=remaining_points,
-                        status=RewardStatus.earned,
-                        created_at=created_at,
-                    )
-                    db.add(new_reward)
-                    points_to_redeem = 0
+            redeem_points(db, current_user.user_id, reward_points, created_at)
 
         # Create transaction for the purchase
         transaction = Transactions(
@@ -203,29 +233,37 @@ def process_checkout(
         )
         db.add(transaction)
         db.flush()  # Flush to get the transaction ID
-        db.commit()
-        db.refresh(transaction)
+
+        # Take the wallet part from the ledger, rechecked under the account lock
+        if wallet_amount > 0:
+            debit(
+                db,
+                account.account_id,
+                wallet_amount,
+                TransactionType.purchase,
+                transaction.transaction_id,
+            )
 
         # Add reward points (5% of total amount) AFTER transaction creation
         earned_points = 0
         if payment_method != "cod":
             earned_points = int(total * 0.05)  # 5% of order total
             if earned_points > 0:
-                reward = RewardPoints(
-                    transaction_id=transaction.transaction_id,  # Use transaction ID
-                    user_id=current_user.user_id,
-                    points=earned_points,
-                    status=RewardStatus.earned,
-                    created_at=created_at,
+                earn_points(
+                    db,
+                    current_user.user_id,
+                    earned_points,
+                    transaction.transaction_id,  # Use transaction ID
+                    created_at,
                 )
-                db.add(reward)
-                db.commit()
 
                 # Automatically convert reward points to wallet balance
                 # convert_reward_points_to_wallet(current_user.user_id, earned_points, db)
 
         # Clear cart
-        db.query(CartItem).filter(CartItem.cart_id == cart.cart_id).delete()
+        db.query(CartItem).filter(CartItem.cart_id == cart.cart_id).delete(
+            synchronize_session=False
+        )
 
         # Log order
         log = Logs(
@@ -236,7 +274,10 @@ def process_checkout(
         )
         db.add(log)
 
+        # Single commit: the order, stock, payment and rewards land together
+        categories = {product.business_category for product, _ in order_items}
         db.commit()
+        invalidate_products(*categories, categories_changed=False)
 
         # Get order items with product details
         items = []
@@ -1,10 +1,22 @@
 import logging
 from datetime import datetime
 
-from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, UploadFile
-from sqlalchemy import func, text
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    File,
+    Form,
+    HTTPException,
+    Request,
+    Response,
+    UploadFile,
+)
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 
+from api.audit_log import audit_log
 from api.auth_lib import (
     create_access_token,
     get_current_merchant_user,
@@ -12,10 +24,48 @@ from api.auth_lib import (
     get_password_hash,
     verify_password,
 )
+from api.catalog_cache import invalidate_products
 from api.database import get_db
-from api.file_upload import delete_file, save_uploaded_file
-from api.models import Logs, Merchants, Product, ProductStatus, UserRole, Users
-from api.schemas import ProductResponse, Token, UserCreate, UserLogin, UserStatus
+from api.file_upload import (
+    add_file_references,
+    delete_file,
+    release_file_references,
+)
+from api.image_variants import save_product_image
+from api.inventory import INVENTORY_MAX_UPDATES, apply_stock_updates
+from api.merchant_stats import (
+    load_merchant_stats,
+    product_created,
+    product_deleted,
+    product_status_changed,
+    stock_status,
+)
+from api.models import Merchants, Product, ProductStatus, UserRole, Users
+from api.pagination import (
+    PageParams,
+    build_page,
+    keyset_paginate,
+    page_params,
+    set_next_cursor,
+)
+from api.product_import import (
+    ImageArchive,
+    ImportFormat,
+    detect_format,
+    import_products,
+    read_rows,
+)
+from api.rollups import record_login, record_signup
+from api.schemas import (
+    ProductBulkUpdateResponse,
+    ProductImportResponse,
+    ProductResponse,
+    ProductStockUpdate,
+    Token,
+    UserCreate,
+    UserLogin,
+    UserStatus,
+)
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/merchant", tags=["Merchant"])
@@ -58,6 +108,7 @@ def merchant_signup(user: UserCreate, db: Session = Depends(get_db)):
             updated_at=datetime.now(),
         )
         db.add(merchant)
+        record_signup(db, db_user.user_id)
         db.commit()
         db.refresh(db_user)
 
@@ -88,9 +139,18 @@ def merchant_login(user_data: UserLogin, db: Session = Depends(get_db)):
                 detail="Incorrect email or password",
             )
         access_token = create_access_token(data={"sub": users.email})
+
+        record_login(db, users.user_id)
+        db.commit()
+        audit_log.record(
+            users.user_id, "merchant_login", f"Merchant {users.email} logged in"
+        )
+
         return Token(
             access_token=access_token, token_type="bearer", user_id=users.user_id
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.info(f"Error during merchant login: {e}")
         raise HTTPException(
@@ -102,7 +162,10 @@ def merchant_login(user_data: UserLogin, db: Session = Depends(get_db)):
 
 @router.get("/product/all", response_model=list[ProductResponse])
 def get_merchant_products(
-    current_user: Users = Depends(get_current_user), db: Session = Depends(get_db)
+    response: Response,
+    page: PageParams = Depends(page_params),
+    current_user: Users = Depends(get_current_user),
+    db: Session = Depends(get_db),
 ):
     if current_user.role != UserRole.merchant:
         raise HTTPException(
@@ -110,14 +173,17 @@ def get_merchant_products(
             detail="Only merchants can access their products",
         )
 
-    products = (
-        db.query(Product).filter(Product.merchant_id == current_user.user_id).all()
+    query = db.query(Product).filter(Product.merchant_id == current_user.user_id)
+    query = keyset_paginate(query, Product.created_at, Product.product_id, page)
+    products = build_page(
+        query.all(), page, key=lambda p: (p.created_at, p.product_id)
     )
-    return products
+    set_next_cursor(response, products)
+    return products.items
 
 
 @router.post("/product/upload-image")
-def upload_product_image(
+async def upload_product_image(
     file: UploadFile = File(...),
     _current_user: Users = Depends(get_current_merchant_user),
 ):
@@ -127,15 +193,17 @@ def upload_product_image(
             raise HTTPException(status_code=400, detail="File must be an image")
 
         # Save the file
-        image_url = save_uploaded_file(file)
+        image_url = await save_product_image(file)
 
         return {"image_url": image_url}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) from e
 
 
 @router.post("/product", response_model=ProductResponse)
-def create_merchant_product(
+async def create_merchant_product(
     name: str = Form(...),
     description: str = Form(...),
     price: float = Form(...),
@@ -146,6 +214,34 @@ def create_merchant_product(
     current_user: Users = Depends(get_current_merchant_user),
     db: Session = Depends(get_db),
 ):
+    # Store the image and its variants first; the database work runs in
+    # a worker thread. If it fails the unreferenced image is swept later.
+    image_url = await save_product_image(image)
+    return await run_in_threadpool(
+        _create_merchant_product,
+        db,
+        current_user,
+        name,
+        description,
+        price,
+        mrp,
+        stock,
+        business_category,
+        image_url,
+    )
+
+
+def _create_merchant_product(
+    db: Session,
+    current_user: Users,
+    name: str,
+    description: str,
+    price: float,
+    mrp: float,
+    stock: int,
+    business_category: str,
+    image_url: str,
+) -> Product:
     try:
         # Get merchant
         merchant = (
@@ -184,9 +280,6 @@ def create_merchant_product(
         except Exception as e:
             logger.info(f"Error resetting sequence: {e}")
 
-        # Save the image
-        image_url = save_uploaded_file(image)
-
         # Create product with current timestamp
         current_time = datetime.now()
         product = Product(
@@ -204,20 +297,102 @@ def create_merchant_product(
         )
 
         db.add(product)
+        db.flush()
+        product_created(db, product)
+        add_file_references(db, [image_url])
         db.commit()
         db.refresh(product)
+        invalidate_products(business_category)
 
         return product
     except Exception as e:
-        # If there was an error, try to delete the uploaded file if it exists
-        if "image_url" in locals():
-            delete_file(image_url)
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e)) from e
 
 
+@router.post("/product/import", response_model=ProductImportResponse)
+def import_merchant_products(
+    file: UploadFile = File(...),
+    images: UploadFile | None = File(None),
+    format: ImportFormat | None = None,
+    current_user: Users = Depends(get_current_merchant_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Create products from a CSV or JSONL file with the ProductImportRow
+    fields, plus an optional zip of the images the rows name. Uploads are
+    spooled to disk and read row by row; valid rows are inserted in chunks
+    and the rest come back in the error report.
+    """
+    merchant = (
+        db.query(Merchants).filter(Merchants.user_id == current_user.user_id).first()
+    )
+    if not merchant:
+        raise HTTPException(status_code=404, detail="Merchant profile not found")
+
+    fmt = format or detect_format(file.filename)
+    archive = ImageArchive(images.file) if images is not None else None
+    rows = read_rows(file.file, fmt)
+    try:
+        report = import_products(db, merchant.merchant_id, rows, archive)
+    finally:
+        # Detach the reader from the upload before FastAPI closes it
+        rows.close()
+        if archive is not None:
+            archive.close()
+
+    if report.categories:
+        invalidate_products(*report.categories)
+    audit_log.record(
+        current_user.user_id,
+        "product_import",
+        f"Imported {report.imported} products, {report.failed} rows failed",
+    )
+    return report.response()
+
+
+@router.post("/product/bulk-update", response_model=ProductBulkUpdateResponse)
+def bulk_update_merchant_products(
+    updates: list[ProductStockUpdate] = Body(...),
+    current_user: Users = Depends(get_current_merchant_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Set stock, price and/or mrp of many products at once, for inventory
+    sync. Ids that aren't the merchant's are skipped and listed in
+    not_found.
+    """
+    if len(updates) > INVENTORY_MAX_UPDATES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {INVENTORY_MAX_UPDATES} products per request",
+        )
+    merchant = (
+        db.query(Merchants).filter(Merchants.user_id == current_user.user_id).first()
+    )
+    if not merchant:
+        raise HTTPException(status_code=404, detail="Merchant profile not found")
+
+    try:
+        updated, not_found, categories = apply_stock_updates(
+            db, merchant.merchant_id, updates
+        )
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e)) from e
+
+    if categories:
+        invalidate_products(*categories, categories_changed=False)
+    audit_log.record(
+        current_user.user_id,
+        "product_bulk_update",
+        f"Updated stock/prices of {updated} products",
+    )
+    return ProductBulkUpdateResponse(updated=updated, not_found=not_found)
+
+
 @router.put("/product/{product_id}", response_model=ProductResponse)
-def update_merchant_product(
+async def update_merchant_product(
     product_id: int,
     request: Request,
     name: str | None = Form(None),
@@ -230,6 +405,57 @@ def update_merchant_product(
     current_user: Users = Depends(get_current_merchant_user),
     db: Session = Depends(get_db),
 ):
+    # Determine if this is a JSON request or a form request
+    content_type = request.headers.get("Content-Type", "")
+    is_json = "application/json" in content_type
+
+    # If this is a JSON request, parse the JSON body
+    if is_json:
+        try:
+            json_data = await request.json()
+            name = json_data.get("name", name)
+            description = json_data.get("description", description)
+            price = json_data.get("price", price)
+            mrp = json_data.get("mrp", mrp)
+            stock = json_data.get("stock", stock)
+            business_category = json_data.get("business_category", business_category)
+            # Note: JSON requests can't handle file uploads, so image remains None
+        except Exception as e:
+            # If JSON parsing fails, continue with form data
+            logger.info(f"Error parsing JSON: {e}")
+
+    # Store a new image and its variants first; the database work runs in
+    # a worker thread
+    image_url = None
+    if image is not None and image.filename:
+        image_url = await save_product_image(image)
+    return await run_in_threadpool(
+        _update_merchant_product,
+        db,
+        current_user,
+        product_id,
+        name=name,
+        description=description,
+        price=price,
+        mrp=mrp,
+        stock=stock,
+        business_category=business_category,
+        image_url=image_url,
+    )
+
+
+def _update_merchant_product(
+    db: Session,
+    current_user: Users,
+    product_id: int,
+    name: str | None,
+    description: str | None,
+    price: float | None,
+    mrp: float | None,
+    stock: int | None,
+    business_category: str | None,
+    image_url: str | None,
+) -> Product:
     try:
         # Get merchant
         merchant = (
@@ -252,27 +478,8 @@ def update_merchant_product(
         if not product:
             raise HTTPException(status_code=404, detail="Product not found")
 
-        # Determine if this is a JSON request or a form request
-        content_type = request.headers.get("Content-Type", "")
-        is_json = "application/json" in content_type
-
-        # If this is a JSON request, parse the JSON body
-        if is_json:
-            try:
-                json_data = request.json()
-                name = json_data.get("name", name)
-                description = json_data.get("description", description)
-                price = json_data.get("price", price)
-                mrp = json_data.get("mrp", mrp)
-                stock = json_data.get("stock", stock)
-                business_category = json_data.get(
-                    "business_category", business_category
-                )
-                # Note: JSON requests can't handle file uploads, so image remains None
-            except Exception as e:
-                # If JSON parsing fails, continue with form data
-                logger.info(f"Error parsing JSON: {e}")
-                pass
+        previous_category = product.business_category
+        previous_status = product.status
 
         # Update fields if provided
         if name is not None:
@@ -285,17 +492,17 @@ def update_merchant_product(
             product.mrp = mrp
         if stock is not None:
             product.stock = stock
+            product.status = stock_status(stock, product.status)
         if business_category is not None:
             product.business_category = business_category
 
-        # Handle image update
-        if image is not None and image.filename:
-            # Delete old image if exists
-            if product.image_url:
-                delete_file(product.image_url)
-
-            # Save new image
-            product.image_url = save_uploaded_file(image)
+        # Handle image update; an old file outside the store goes once the
+        # new one is committed
+        unreferenced = []
+        if image_url is not None:
+            add_file_references(db, [image_url])
+            unreferenced = release_file_references(db, [product.image_url])
+            product.image_url = image_url
 
         # Update timestamp
         product.updated_at = datetime.now()
@@ -304,18 +511,25 @@ def update_merchant_product(
         if not product.created_at:
             product.created_at = datetime.now()
 
+        product_status_changed(
+            db, product.merchant_id, previous_status, product.status
+        )
         db.commit()
         db.refresh(product)
+        for path in unreferenced:
+            delete_file(path)
+        invalidate_products(
+            previous_category,
+            product.business_category,
+            categories_changed=previous_category != product.business_category,
+        )
 
         # Add a log entry for this update
-        log = Logs(
-            user_id=current_user.user_id,
-            action="product_update",
-            description=f"Updated product {product.name} (ID: {product.product_id})",
-            created_at=datetime.now(),
+        audit_log.record(
+            current_user.user_id,
+            "product_update",
+            f"Updated product {product.name} (ID: {product.product_id})",
         )
-        db.add(log)
-        db.commit()
 
         return product
     except Exception as e:
@@ -330,7 +544,7 @@ def delete_product(
     db: Session = Depends(get_db),
 ):
     # Get merchant record
-    if current_user.role != "merchant":
+    if current_user.role != UserRole.merchant:
         raise HTTPException(
             status_code=403,
             detail="Only merchants can delete products",
@@ -354,13 +568,17 @@ def delete_product(
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
 
-    # Delete product image if exists
-    if product.image_url:
-        delete_file(product.image_url)
-
     # Delete product
+    category = product.business_category
+    unreferenced = release_file_references(db, [product.image_url])
+    product_deleted(db, product)
     db.delete(product)
     db.commit()
+
+    # Delete a product image outside the file store
+    for path in unreferenced:
+        delete_file(path)
+    invalidate_products(category)
     return {"message": "Product deleted successfully"}
 
 # Merchant Product Management
@@ -452,35 +670,12 @@ def get_merchant_stats(
     db: Session = Depends(get_db),
 ):
     try:
-        # Get merchant profile
-        merchant = (
-            db.query(Merchants)
-            .filter(Merchants.user_id == current_user.user_id)
-            .first()
-        )
-        if not merchant:
+        stats = load_merchant_stats(db, current_user.user_id)
+        if stats is None:
             raise HTTPException(status_code=404, detail="Merchant profile not found")
-
-        # Get total products count
-        total_products = (
-            db.query(func.count(Product.product_id))
-            .filter(Product.merchant_id == merchant.merchant_id)
-            .scalar()
-            or 0
-        )
-
-        # Get active listings (products with status = active)
-        active_listings = (
-            db.query(func.count(Product.product_id))
-            .filter(
-                Product.merchant_id == merchant.merchant_id,
-                Product.status == ProductStatus.active,
-            )
-            .scalar()
-            or 0
-        )
-
-        return {"total_products": total_products, "active_listings": active_listings}
+        return stats
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) from e
 
@@ -1,11 +1,16 @@
-from datetime import datetime, timedelta
+from datetime import datetime
 from decimal import Decimal
 
-from fastapi import APIRouter, Body, Depends, HTTPException
+from fastapi import APIRouter, Body, Depends, HTTPException, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from api.auth_lib import get_current_user
+from api.catalog_cache import invalidate_products
 from api.database import get_db
+from api.idempotency import idempotency_key
+from api.ledger import account_balance, credit, debit
+from api.merchant_stats import order_cancelled
 from api.models import (
     Account,
     Cart,
@@ -22,6 +27,22 @@ from api.models import (
     TransactionType,
     Users,
 )
+from api.order_history import (
+    load_order,
+    load_order_history,
+    load_order_history_async,
+    load_purchase_rewards,
+    order_items_response,
+    order_response,
+)
+from api.pagination import (
+    PageParams,
+    page_params,
+    set_next_cursor,
+)
+from api.read_routing import get_async_read_db, get_read_db
+from api.rewards import points_value, redeem_points, reward_balance
+from api.rollups import record_refund
 from api.schemas import OrderResponse
 
 router = APIRouter(prefix="/api/order", tags=["Order"])
@@ -35,6 +56,7 @@ def create_order(
     reward_points: int | None = Body(None),
     current_user: Users = Depends(get_current_user),
     db: Session = Depends(get_db),
+    _idempotency=Depends(idempotency_key),
 ):
     try:
         # Get cart
@@ -72,15 +94,7 @@ def create_order(
         # Apply rewards if requested
         reward_discount = 0
         if use_rewards and reward_points:
-            available_rewards = (
-                db.query(RewardPoints)
-                .filter(
-                    RewardPoints.user_id == current_user.user_id,
-                    RewardPoints.status == RewardStatus.earned,
-                )
-                .all()
-            )
-            total_points = sum(reward.points for reward in available_rewards)
+            total_points = reward_balance(db, current_user.user_id)
 
             if reward_points > total_points:
                 raise HTTPException(
@@ -88,7 +102,7 @@ def create_order(
                     detail=f"Insufficient reward points. Available: {total_points}",
                 )
 
-            reward_discount = float(reward_points * 0.1)
+            reward_discount = float(points_value(reward_points))
             total -= reward_discount
 
         # Get user's account
@@ -102,13 +116,10 @@ def create_order(
         wallet_amount = 0
         remaining_amount = total
         if use_wallet:
-            wallet_amount = min(account.balance, total)
+            wallet_amount = min(float(account_balance(db, account.account_id)), total)
             remaining_amount = total - wallet_amount
 
             if wallet_amount > 0:
-                # Deduct from wallet
-                account.balance -= wallet_amount
-
                 # Create wallet transaction
                 wallet_transaction = Transactions(
                     account_id=account.account_id,
@@ -118,6 +129,16 @@ def create_order(
                     created_at=datetime.now(),
                 )
                 db.add(wallet_transaction)
+                db.flush()
+
+                # Deduct from wallet
+                debit(
+                    db,
+                    account.account_id,
+                    wallet_amount,
+                    TransactionType.purchase,
+                    wallet_transaction.transaction_id,
+                )
 
         # Handle remaining amount with other payment method if needed
         if remaining_amount > 0 and payment_method not in ["card", "upi"]:
@@ -167,9 +188,6 @@ def create_order(
             # Calculate reward value (1 point = ₹0.1)
             reward_value = float(earned_points * 0.1)
 
-            # Add to account balance
-            account.balance += reward_value
-
             # Update reward points status to redeemed
             reward.status = RewardStatus.redeemed
 
@@ -182,6 +200,16 @@ def create_order(
                 created_at=datetime.now(),
             )
             db.add(auto_redeem_transaction)
+            db.flush()
+
+            # Add to account balance
+            credit(
+                db,
+                account.account_id,
+                reward_value,
+                TransactionType.reward_redemption,
+                auto_redeem_transaction.transaction_id,
+            )
 
             # Log automatic redemption
             auto_redeem_log = Logs(
@@ -192,31 +220,9 @@ def create_order(
             )
             db.add(auto_redeem_log)
 
-        # Process reward points redemption if used
+        # Process reward points redemption if used, oldest lots first
         if use_rewards and reward_points:
-            points_to_redeem = reward_points
-            for reward in available_rewards:
-                if points_to_redeem <= 0:
-                    break
-
-                if reward.points <= points_to_redeem:
-                    reward.status = RewardStatus.redeemed
-                    points_to_redeem -= reward.points
-                else:
-                    # Split the reward point record
-                    remaining_points = reward.points - points_to_redeem
-                    reward.points = points_to_redeem
-                    reward.status = RewardStatus.redeemed
-
-                    new_reward = RewardPoints(
-                        transaction_id=reward.transaction_id,
-                        user_id=reward.user_id,
-                        points=remaining_points,
-                        status=RewardStatus.earned,
-                        created_at=datetime.now(),
-                    )
-                    db.add(new_reward)
-                    points_to_redeem = 0
+            redeem_points(db, current_user.user_id, reward_points)
 
         # Clear cart
         db.query(CartItem).filter(CartItem.cart_id == cart.cart_id).delete()
@@ -230,7 +236,9 @@ def create_order(
         )
         db.add(log)
 
+        categories = {product.business_category for product, _ in order_items}
         db.commit()
+        invalidate_products(*categories, categories_changed=False)
 
         # Get order items with product details
         items = []
@@ -271,262 +279,87 @@ def create_order(
         raise HTTPException(status_code=500, detail=str(e)) from e
 
 
-@router.get("/user/{user_id}", response_model=list[OrderResponse])
-def get_user_orders(user_id: int, db: Session = Depends(get_db)):
-    orders = db.query(Order).filter(Order.user_id == user_id).all()
-    return orders
-
-
-@router.get("/{order_id}", response_model=OrderResponse)
-def get_order_details(
-    order_id: int,
-    current_user: Users = Depends(get_current_user),
-    db: Session = Depends(get_db),
-):
-    try:
-        # Get order
-        order = (
-            db.query(Order)
-            .filter(Order.order_id == order_id, Order.user_id == current_user.user_id)
-            .first()
-        )
-
-        if not order:
-            raise HTTPException(status_code=404, detail="Order not found")
-
-        # Get order items
-        order_items = db.query(OrderItem).filter(OrderItem.order_id == order_id).all()
-
-        # Get product details for each item
-        items = []
-        for item in order_items:
-            product = (
-                db.query(Product).filter(Product.product_id == item.product_id).first()
-            )
-            if product:
-                items.append(
-                    {
-                        "order_item_id": item.order_item_id,
-                        "order_id": item.order_id,
-                        "product_id": item.product_id,
-                        "quantity": item.quantity,
-                        "price_at_time": float(item.price_at_time),
-                        "created_at": item.created_at,
-                        "name": product.name,
-                        "image_url": product.image_url,
-                    }
-                )
-
-        # Get reward points earned for this order
-        reward_points_earned = 0
-        reward_points_transaction = (
-            db.query(RewardPoints)
-            .filter(
-                RewardPoints.transaction_id == order_id,
-                RewardPoints.user_id == current_user.user_id,
-            )
-            .first()
-        )
-
-        if reward_points_transaction:
-            reward_points_earned = reward_points_transaction.points
-
-        return {
-            "order_id": order.order_id,
-            "user_id": order.user_id,
-            "account_id": order.account_id,
-            "status": order.status,
-            "total_amount": float(order.total_amount),
-            "created_at": order.created_at,
-            "updated_at": order.updated_at,
-            "items": items,
-            "reward_points_earned": reward_points_earned,
-            "payment_method": order.payment_method,
-            "wallet_amount": float(order.wallet_amount) if order.wallet_amount else 0.0,
-            "reward_discount": float(order.reward_discount)
-            if order.reward_discount
-            else 0.0,
-        }
-    except HTTPException as he:
-        raise he
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) from e
-
-
-@router.get("", response_model=list[OrderResponse])
-def get_all_orders(
-    current_user: Users = Depends(get_current_user),
-    db: Session = Depends(get_db),
+@router.get("/user/current", response_model=list[OrderResponse])
+def get_current_user_orders(
+    current_user: Users = Depends(get_current_user), db: Session = Depends(get_read_db)
 ):
     try:
-        # Get all orders for current user
-        orders = (
-            db.query(Order)
-            .filter(Order.user_id == current_user.user_id)
-            .order_by(Order.created_at.desc())
-            .all()
-        )
+        # Get all orders for the current user
+        orders = load_order_history(db, current_user.user_id)
 
-        all_order_data = []
+        # Reward points are looked up via the purchase transaction of each order
+        points_by_order = load_purchase_rewards(db, orders)
 
+        result = []
         for order in orders:
-            # Get order items
-            order_items = (
-                db.query(OrderItem).filter(OrderItem.order_id == order.order_id).all()
-            )
-
-            # Get product details for each item
-            items = []
-            for item in order_items:
-                product = (
-                    db.query(Product)
-                    .filter(Product.product_id == item.product_id)
-                    .first()
-                )
-                if product:
-                    items.append(
-                        {
-                            "order_item_id": item.order_item_id,
-                            "order_id": item.order_id,
-                            "product_id": item.product_id,
-                            "quantity": item.quantity,
-                            "price_at_time": float(item.price_at_time),
-                            "created_at": item.created_at,
-                            "name": product.name,
-                            "image_url": product.image_url,
-                        }
-                    )
-
-            # Get reward points earned for this order
-            reward_points_earned = 0
-            reward_points_transaction = (
-                db.query(RewardPoints)
-                .filter(
-                    RewardPoints.transaction_id == order.order_id,
-                    RewardPoints.user_id == current_user.user_id,
-                )
-                .first()
-            )
-
-            if reward_points_transaction:
-                reward_points_earned = reward_points_transaction.points
-
-            # Append order response
-            all_order_data.append(
+            reward_points_earned = points_by_order.get(order.order_id, 0)
+            result.append(
                 {
                     "order_id": order.order_id,
                     "user_id": order.user_id,
                     "account_id": order.account_id,
+                    "reward_discount": reward_points_earned * 0.1,
+                    "wallet_amount": float(order.wallet_amount)
+                    if order.wallet_amount
+                    else 0.0,
                     "status": order.status,
                     "total_amount": float(order.total_amount),
                     "created_at": order.created_at,
                     "updated_at": order.updated_at,
-                    "items": items,
+                    "items": order_items_response(order),
                     "reward_points_earned": reward_points_earned,
-                    "payment_method": order.payment_method,
-                    "wallet_amount": float(order.wallet_amount)
-                    if order.wallet_amount
-                    else 0.0,
-                    "reward_discount": float(order.reward_discount)
-                    if order.reward_discount
-                    else 0.0,
+                    # "payment_method": order.payment_method
                 }
             )
 
-        return all_order_data
-
+        return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) from e
 
 
-@router.get("/user/current", response_model=list[OrderResponse])
-def get_current_user_orders(
-    current_user: Users = Depends(get_current_user), db: Session = Depends(get_db)
+@router.get("/user/{user_id}", response_model=list[OrderResponse])
+async def get_user_orders(
+    user_id: int,
+    response: Response,
+    page: PageParams = Depends(page_params),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    orders = await load_order_history_async(db, user_id, page)
+    set_next_cursor(response, orders)
+    return [order_response(order) for order in orders.items]
+
+
+@router.get("/{order_id}", response_model=OrderResponse)
+def get_order_details(
+    order_id: int,
+    current_user: Users = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
 ):
     try:
-        # Get all orders for the current user
-        orders = db.query(Order).filter(Order.user_id == current_user.user_id).all()
+        # Get order with items, products and reward points
+        order = load_order(db, order_id, current_user.user_id)
 
-        # Get order items for each order
-        result = []
-        for order in orders:
-            order_items = (
-                db.query(OrderItem).filter(OrderItem.order_id == order.order_id).all()
-            )
+        if not order:
+            raise HTTPException(status_code=404, detail="Order not found")
 
-            # Get product details for each item
-            items = []
-            for item in order_items:
-                product = (
-                    db.query(Product)
-                    .filter(Product.product_id == item.product_id)
-                    .first()
-                )
-                if product:
-                    items.append(
-                        {
-                            "order_item_id": item.order_item_id,
-                            "order_id": item.order_id,
-                            "product_id": item.product_id,
-                            "quantity": item.quantity,
-                            "price_at_time": float(item.price_at_time),
-                            "created_at": item.created_at,
-                            "name": product.name,
-                            "image_url": product.image_url,
-                        }
-                    )
-
-            # Get reward points earned for this order
-            # First find the transaction associated with this order
-            transaction = (
-                db.query(Transactions)
-                .filter(
-                    Transactions.account_id == order.account_id,
-                    Transactions.transaction_type == TransactionType.purchase,
-                    Transactions.created_at.between(
-                        order.created_at - timedelta(seconds=10),
-                        order.created_at + timedelta(seconds=10),
-                    ),
-                )
-                .first()
-            )
+        return order_response(order)
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e)) from e
 
-            reward_points_earned = 0
-            if transaction:
-                # Then get reward points using the correct transaction ID
-                reward = (
-                    db.query(RewardPoints)
-                    .filter(
-                        RewardPoints.transaction_id == transaction.transaction_id,
-                        RewardPoints.user_id == current_user.user_id,
-                        RewardPoints.status == RewardStatus.earned,
-                    )
-                    .first()
-                )
 
-                reward_points_earned = reward.points if reward else 0
-                reward_discount = reward_points_earned * 0.1
+@router.get("", response_model=list[OrderResponse])
+def get_all_orders(
+    current_user: Users = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    try:
+        # Get all orders for current user
+        orders = load_order_history(db, current_user.user_id)
 
-            result.append(
-                {
-                    "order_id": order.order_id,
-                    "user_id": order.user_id,
-                    "account_id": order.account_id,
-                    "reward_discount": reward_discount,
-                    "wallet_amount": float(order.wallet_amount)
-                    if order.wallet_amount
-                    else 0.0,
-                    "status": order.status,
-                    "total_amount": float(order.total_amount),
-                    "created_at": order.created_at,
-                    "updated_at": order.updated_at,
-                    "items": items,
-                    "reward_points_earned": reward_points_earned,
-                    # "payment_method": order.payment_method
-                }
-            )
+        return [order_response(order) for order in orders]
 
-        return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) from e
 
@@ -557,6 +390,7 @@ def cancel_order(
 
         # Update order status to cancelled
         order.status = OrderStatus.cancelled
+        order_cancelled(db, order)
 
         # Get user account to refund
         account = (
@@ -565,28 +399,44 @@ def cancel_order(
         if not account:
             raise HTTPException(status_code=404, detail="Account not found")
 
-        # Refund the amount to wallet
-        refund_amount = float(order.total_amount)
-        account.balance += Decimal(str(refund_amount))
-
         # Create refund transaction
+        refund_amount = float(order.total_amount)
         refund_transaction = Transactions(
             account_id=account.account_id,
             transaction_type=TransactionType.refund,
             amount=Decimal(str(refund_amount)),
             status=TransactionStatus.completed,
+            created_at=datetime.now(),
         )
         db.add(refund_transaction)
+        db.flush()
+
+        # Refund the amount to wallet
+        credit(
+            db,
+            account.account_id,
+            refund_amount,
+            TransactionType.refund,
+            refund_transaction.transaction_id,
+        )
+        record_refund(db, current_user.user_id, refund_amount)
 
         # Log the cancellation
         log_entry = Logs(
             user_id=current_user.user_id,
             action="order_cancelled",
             description=f"Order {order_id} cancelled. Amount ₹{refund_amount} refunded to wallet.",
+            created_at=datetime.now(),
         )
         db.add(log_entry)
 
+        categories = {
+            item.product.business_category
+            for item in order.items
+            if item.product is not None
+        }
         db.commit()
+        invalidate_products(*categories, categories_changed=False)
 
         return {
             "success": True,
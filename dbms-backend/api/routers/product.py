@@ -1,16 +1,44 @@
 import base64
 import logging
-import os
-import shutil
 from datetime import datetime
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    HTTPException,
+    Query,
+    Response,
+    UploadFile,
+)
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from api.auth_lib import get_current_user
+from api.catalog_cache import (
+    active_products_statement,
+    categories,
+    category_products,
+    featured_products,
+    invalidate_products,
+    product_page,
+)
 from api.database import get_db
-from api.models import Merchants, Product, ProductStatus, Users
+from api.file_upload import MAX_PRODUCT_IMAGE_BYTES, delete_file, save_upload
+from api.image_variants import generate_variants
+from api.merchant_stats import product_created
+from api.models import Merchants, Product, Users
+from api.pagination import (
+    PageParams,
+    build_page,
+    keyset_paginate,
+    page_params,
+    set_next_cursor,
+)
+from api.read_routing import get_async_read_db
 from api.schemas import ProductCreate, ProductResponse
+from api.search_index import search_products
 
 logger = logging.getLogger(__name__)
 
@@ -46,22 +74,29 @@ def create_product(
 
         # Save product
         db.add(db_product)
+        db.flush()
+        product_created(db, db_product)
         db.commit()
         db.refresh(db_product)
 
         # Handle image upload if provided
         if product.image_url:
+            image_url = f"/uploads/{db_product.product_id}.jpg"
             try:
                 image_data = base64.b64decode(product.image_url.split(",")[1])
                 image_path = f"uploads/{db_product.product_id}.jpg"
                 with open(image_path, "wb") as f:
                     f.write(image_data)
-                db_product.image_url = f"/uploads/{db_product.product_id}.jpg"
+                # Only point at the file once its variants exist
+                generate_variants(image_url)
+                db_product.image_url = image_url
                 db.commit()
             except Exception as e:
                 # Log the error but don't fail the product creation
                 logger.info(f"Error saving image: {str(e)}")
+                delete_file(image_url)
 
+        invalidate_products(db_product.business_category)
         return db_product
     except HTTPException as he:
         raise he
@@ -71,13 +106,25 @@ def create_product(
 
 
 @router.get("/merchant/{merchant_id}", response_model=list[ProductResponse])
-def get_merchant_products(merchant_id: int, db: Session = Depends(get_db)):
-    products = db.query(Product).filter(Product.merchant_id == merchant_id).all()
-    return products
+async def get_merchant_products(
+    merchant_id: int,
+    response: Response,
+    page: PageParams = Depends(page_params),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    stmt = select(Product).where(Product.merchant_id == merchant_id)
+    stmt = keyset_paginate(stmt, Product.created_at, Product.product_id, page)
+    products = build_page(
+        (await db.execute(stmt)).scalars(),
+        page,
+        key=lambda p: (p.created_at, p.product_id),
+    )
+    set_next_cursor(response, products)
+    return products.items
 
 
 @router.post("/upload-image")
-def upload_product_image(
+async def upload_product_image(
     file: UploadFile = File(...), current_user: Users = Depends(get_current_user)
 ):
     if current_user.role != "merchant":
@@ -86,58 +133,37 @@ def upload_product_image(
             detail="Only merchants can upload product images",
         )
 
-    # Create uploads directory if it doesn't exist
-    os.makedirs("uploads", exist_ok=True)
-
     # Generate unique filename
     file_extension = file.filename.split(".")[-1]
     filename = (
         f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{current_user.id}.{file_extension}"
     )
-    file_path = os.path.join("uploads", filename)
 
     # Save the file
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    await save_upload(file, "uploads", filename, MAX_PRODUCT_IMAGE_BYTES)
 
     # Return the URL for the uploaded image
     return {"url": f"/uploads/{filename}"}
 
 
 @router.get("/featured", response_model=list[ProductResponse])
-def get_featured_products(db: Session = Depends(get_db)):
-    return (
-        get_active_products_query(db)
-        .filter(Product.price < Product.mrp, Product.stock > 0)
-        .order_by(Product.mrp - Product.price)
-        .limit(10)
-        .all()
-    )
-
+async def get_featured_products():
+    return await featured_products()
 
 
 @router.get("/category/{category}", response_model=list[ProductResponse])
-def get_products_by_category(category: str, db: Session = Depends(get_db)):
+async def get_products_by_category(category: str):
     try:
-        products = (
-            db.query(Product)
-            .filter(
-                Product.business_category == category,
-                Product.status == ProductStatus.active,
-            )
-            .all()
-        )
-        return products
+        return await category_products(category)
     except Exception as e:
         logger.info(f"Error fetching products by category: {e}")
         raise HTTPException(status_code=500, detail="Error fetching products") from e
 
 
 @router.get("/categories", response_model=list[str])
-def get_categories(db: Session = Depends(get_db)):
+async def get_categories():
     try:
-        categories = db.query(Product.business_category).distinct().all()
-        return [category[0] for category in categories if category[0]]
+        return await categories()
     except Exception as e:
         logger.info(f"Error fetching categories: {e}")
         raise HTTPException(status_code=500, detail="Error fetching categories") from e
@@ -145,26 +171,40 @@ def get_categories(db: Session = Depends(get_db)):
 
 # Public product endpoints
 @router.get("", response_model=list[ProductResponse])
-def get_all_products(db: Session = Depends(get_db)):
+async def get_all_products(
+    response: Response,
+    page: PageParams = Depends(page_params),
+):
     try:
-        products = (
-            db.query(Product).filter(Product.status == ProductStatus.active).all()
-        )
-        return products
+        products = await product_page(page)
+        set_next_cursor(response, products)
+        return products.items
+    except HTTPException as he:
+        raise he
     except Exception as e:
         logger.info(f"Error fetching products: {e}")
         raise HTTPException(status_code=500, detail="Error fetching products") from e
 
 
+@router.get("/search", response_model=list[ProductResponse])
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=1000),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """Full-text search over name, description and category, best match first"""
+    try:
+        return await search_products(db, q, limit, offset)
+    except Exception as e:
+        logger.info(f"Error searching products: {e}")
+        raise HTTPException(status_code=500, detail="Error searching products") from e
+
+
 @router.get("/{product_id}", response_model=ProductResponse)
-def get_product(product_id: int, db: Session = Depends(get_db)):
-    product = (
-        db.query(Product)
-        .filter(
-            Product.product_id == product_id, Product.status == ProductStatus.active
-        )
-        .first()
-    )
+async def get_product(product_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    stmt = active_products_statement().where(Product.product_id == product_id)
+    product = (await db.execute(stmt)).scalars().first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     return product
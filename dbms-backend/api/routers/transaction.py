@@ -1,10 +1,17 @@
 from datetime import datetime
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 
 from api.database import get_db
 from api.models import Account, Logs, Transactions, TransactionStatus
+from api.pagination import (
+    PageParams,
+    build_page,
+    keyset_paginate,
+    page_params,
+    set_next_cursor,
+)
 from api.schemas import TransactionCreate, TransactionResponse
 
 router = APIRouter(prefix="/api/transaction", tags=["Transaction"])
@@ -53,8 +60,18 @@ def create_transaction(transaction: TransactionCreate, db: Session = Depends(get
 
 
 @router.get("/account/{account_id}", response_model=list[TransactionResponse])
-def fetch_transactions(account_id: int, db: Session = Depends(get_db)):
-    transactions = (
-        db.query(Transactions).filter(Transactions.account_id == account_id).all()
+def fetch_transactions(
+    account_id: int,
+    response: Response,
+    page: PageParams = Depends(page_params),
+    db: Session = Depends(get_db),
+):
+    query = db.query(Transactions).filter(Transactions.account_id == account_id)
+    query = keyset_paginate(
+        query, Transactions.created_at, Transactions.transaction_id, page
     )
-    return transactions
+    transactions = build_page(
+        query.all(), page, key=lambda t: (t.created_at, t.transaction_id)
+    )
+    set_next_cursor(response, transactions)
+    return transactions.items
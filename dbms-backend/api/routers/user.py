@@ -1,9 +1,13 @@
+from datetime import datetime
+
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
 from api.auth_lib import get_current_user, get_password_hash, verify_password
 from api.database import get_db
+from api.ledger import account_balance, account_responses
 from api.models import Account, Users
+from api.principal_cache import principal_cache
 from api.schemas import PasswordUpdate, UserProfileResponse
 
 router = APIRouter(prefix="/api/user", tags=["User"])
@@ -26,7 +30,7 @@ def get_user_profile(user_id: int, db: Session = Depends(get_db)):
         "role": user.role,
         "status": user.status,
         "created_at": user.created_at,
-        "accounts": accounts,
+        "accounts": account_responses(db, accounts),
     }
 
 
@@ -48,7 +52,9 @@ def get_current_user_info(
             "status": current_user.status,
             "account": {
                 "id": account.account_id if account else None,
-                "balance": float(account.balance) if account else 0.0,
+                "balance": (
+                    float(account_balance(db, account.account_id)) if account else 0.0
+                ),
             },
         }
     except Exception as e:
@@ -57,7 +63,10 @@ def get_current_user_info(
 
 @router.get("/balance", response_model=dict)
 def get_user_balance(
-    current_user: Users = Depends(get_current_user), db: Session = Depends(get_db)):
+    at: datetime | None = None,
+    current_user: Users = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
     try:
         # Get user's account
         account = (
@@ -66,7 +75,8 @@ def get_user_balance(
         if not account:
             raise HTTPException(status_code=404, detail="Account not found")
 
-        return {"balance": float(account.balance)}
+        # With `at`, the balance as it stood at that time
+        return {"balance": float(account_balance(db, account.account_id, at))}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) from e
 
@@ -87,4 +97,5 @@ def change_password(
 
     current_user.password_hash = get_password_hash(password_update.new_password)
     db.commit()
+    principal_cache.invalidate_user(current_user.user_id)
     return {"message": "Password updated successfully"}
@@ -3,7 +3,13 @@ from sqlalchemy.orm import Session
 from decimal import Decimal
 
 from api.database import get_db
-from api.models import Account, Transaction  # adjust import to match your models
+from api.ledger import debit
+from api.models import (
+    Account,
+    Transactions,
+    TransactionStatus,
+    TransactionType,
+)
 from datetime import datetime
 
 router = APIRouter(prefix="/api/process-withdrawal", tags=["Withdrawal"])
@@ -16,34 +22,37 @@ def process_withdrawal(account_id: int, amount: float, db: Session = Depends(get
         if not account:
             raise HTTPException(status_code=404, detail="Account not found")
 
-        # 2. Check if balance is enough
-        if Decimal(account.balance) < Decimal(amount):
-            raise HTTPException(status_code=400, detail="Insufficient balance")
-
-        # 3. Deduct amount
-        account.balance = Decimal(account.balance) - Decimal(amount)
-
-        # 4. Record the withdrawal in transactions table
-        withdrawal = Transaction(
+        # 2. Record the withdrawal in transactions table
+        withdrawal = Transactions(
             account_id=account.account_id,
-            type="withdrawal",
+            transaction_type=TransactionType.withdrawal,
+            status=TransactionStatus.completed,
             amount=Decimal(amount),
             created_at=datetime.now()
         )
         db.add(withdrawal)
+        db.flush()
+
+        # 3. Deduct amount; fails if the balance is not enough
+        new_balance = debit(
+            db,
+            account.account_id,
+            amount,
+            TransactionType.withdrawal,
+            withdrawal.transaction_id,
+        )
 
-        # 5. Commit changes
+        # 4. Commit changes
         db.commit()
-        db.refresh(account)  # get updated balance from DB
 
         return {
             "message": "Withdrawal processed successfully",
             "account_id": account.account_id,
-            "new_balance": float(account.balance)
+            "new_balance": float(new_balance)
         }
 
     except HTTPException:
-        # Don't roll back here because HTTPException means controlled error
+        db.rollback()
         raise
     except Exception as e:
         db.rollback()
@@ -1,7 +1,18 @@
 from datetime import datetime
+from decimal import Decimal
+
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    EmailStr,
+    Field,
+    computed_field,
+    field_validator,
+    model_validator,
+)
 
-from pydantic import BaseModel, ConfigDict, EmailStr
-
+from api.file_upload import is_stored_file
+from api.image_variants import variant_urls
 from api.models import (
     AccountType,
     OrderStatus,
@@ -79,6 +90,18 @@ class ProductCreate(BaseModel):
     business_category: str
 
 
+# Resized copies of an uploaded image (see api/image_variants.py)
+class ImageVariant(BaseModel):
+    webp: str
+    jpeg: str
+
+
+class ImageVariants(BaseModel):
+    thumbnail: ImageVariant
+    card: ImageVariant
+    full: ImageVariant
+
+
 class ProductResponse(BaseModel):
     product_id: int
     name: str
@@ -94,6 +117,64 @@ class ProductResponse(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
+    @computed_field
+    @property
+    def image_variants(self) -> ImageVariants | None:
+        urls = variant_urls(self.image_url)
+        return ImageVariants.model_validate(urls) if urls else None
+
+
+# One row of a bulk product import; `image` names a file in the image archive
+class ProductImportRow(BaseModel):
+    name: str = Field(min_length=1, max_length=100)
+    description: str
+    price: Decimal = Field(gt=0, max_digits=10, decimal_places=2)
+    mrp: Decimal = Field(gt=0, max_digits=10, decimal_places=2)
+    stock: int = Field(ge=0)
+    business_category: str = Field(min_length=1, max_length=50)
+    image: str | None = None
+    image_url: str | None = Field(None, max_length=255)
+
+    @field_validator("image_url")
+    @classmethod
+    def external_or_stored(cls, image_url: str | None) -> str | None:
+        if image_url is None or image_url.startswith(("http://", "https://")):
+            return image_url
+        if is_stored_file(image_url):
+            return image_url
+        raise ValueError("must be an http(s) URL or the path of an uploaded image")
+
+    @model_validator(mode="after")
+    def needs_image(self):
+        if not self.image and not self.image_url:
+            raise ValueError("image or image_url is required")
+        return self
+
+
+class ProductImportError(BaseModel):
+    row: int
+    error: str
+
+
+class ProductImportResponse(BaseModel):
+    imported: int
+    failed: int
+    errors: list[ProductImportError]
+    errors_truncated: bool
+
+
+# One product of a bulk inventory sync; fields left out keep their value
+class ProductStockUpdate(BaseModel):
+    product_id: int
+    stock: int | None = Field(None, ge=0)
+    price: Decimal | None = Field(None, gt=0, max_digits=10, decimal_places=2)
+    mrp: Decimal | None = Field(None, gt=0, max_digits=10, decimal_places=2)
+
+
+class ProductBulkUpdateResponse(BaseModel):
+    updated: int
+    not_found: list[int]
+
 
 # Cart Schemas
 class CartItemCreate(BaseModel):
@@ -132,11 +213,28 @@ class OrderResponse(BaseModel):
 
 
 # Admin Stats Schema
+class StatsBucket(BaseModel):
+    bucket_start: datetime
+    signups: int
+    logins: int
+    orders: int
+    gmv: float
+    top_ups: int
+    top_up_amount: float
+    refunds: int
+    refund_amount: float
+    active_users: int
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class AdminStats(BaseModel):
     total_users: int
     total_orders: int
     total_revenue: float
     active_merchants: int
+    daily: list[StatsBucket] = []
+    hourly: list[StatsBucket] = []
 
 
 # User Profile Response Schema
@@ -159,7 +257,6 @@ class UserUpdate(BaseModel):
     full_name: str | None = None
     email: EmailStr | None = None
     phone: str | None = None
-    profile_image: str | None = None
 
 # Password Update Schema
 class PasswordUpdate(BaseModel):
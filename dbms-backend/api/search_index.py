@@ -0,0 +1,156 @@
+import logging
+import re
+
+from sqlalchemy import column, func, literal_column, select, table, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.models import Product, ProductStatus
+
+logger = logging.getLogger(__name__)
+
+# bm25 weights of name, description and business_category on SQLite;
+# Postgres ranks by the A/B/C labels of the generated column instead
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+CATEGORY_WEIGHT = 5.0
+
+# SQLite: external-content FTS5 table over products, kept in sync by triggers
+# that only fire when an indexed column changes
+SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        name, description, business_category,
+        content='products', content_rowid='product_id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name, description, business_category)
+        VALUES (new.product_id, new.name, new.description, new.business_category);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description, business_category)
+        VALUES ('delete', old.product_id, old.name, old.description, old.business_category);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_au
+    AFTER UPDATE OF name, description, business_category ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description, business_category)
+        VALUES ('delete', old.product_id, old.name, old.description, old.business_category);
+        INSERT INTO products_fts(rowid, name, description, business_category)
+        VALUES (new.product_id, new.name, new.description, new.business_category);
+    END
+    """,
+]
+
+# Postgres: generated, weighted tsvector column with a GIN index.
+# Same DDL as sql_implementation/08_product_search.sql.
+POSTGRES_DDL = [
+    """
+    ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(business_category, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'C')
+    ) STORED
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_products_search_vector
+    ON products USING GIN (search_vector)
+    """,
+]
+
+products_fts = table("products_fts", column("rowid"))
+
+
+def ensure_search_index(engine: Engine) -> None:
+    """
+    Create the full-text index if it does not exist yet and backfill it
+    """
+    dialect = engine.dialect.name
+    try:
+        with engine.begin() as conn:
+            if dialect == "sqlite":
+                created = not _sqlite_index_exists(conn)
+                for ddl in SQLITE_DDL:
+                    conn.execute(text(ddl))
+                if created:
+                    rebuild_search_index(conn)
+            elif dialect == "postgresql":
+                for ddl in POSTGRES_DDL:
+                    conn.execute(text(ddl))
+    except Exception as e:
+        logger.warning(f"Could not create the product search index: {e}")
+
+
+def rebuild_search_index(conn: Connection) -> None:
+    """
+    Re-index every product. Only needed on SQLite; the Postgres column is
+    maintained by the database itself.
+    """
+    if conn.dialect.name == "sqlite":
+        conn.execute(text("INSERT INTO products_fts(products_fts) VALUES ('rebuild')"))
+
+
+def _sqlite_index_exists(conn: Connection) -> bool:
+    return (
+        conn.execute(
+            text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'"
+            )
+        ).first()
+        is not None
+    )
+
+
+def search_terms(query: str) -> list[str]:
+    """
+    Split user input into plain word tokens, so no query syntax reaches
+    FTS5 or to_tsquery
+    """
+    return re.findall(r"\w+", query.lower())[:16]
+
+
+def search_statement(dialect: str, terms: list[str], limit: int, offset: int):
+    """
+    Active products matching every term (the last one as a prefix),
+    best match first
+    """
+    stmt = select(Product).where(Product.status == ProductStatus.active)
+
+    if dialect == "postgresql":
+        tsquery = func.to_tsquery(
+            "english", " & ".join(terms[:-1] + [f"{terms[-1]}:*"])
+        )
+        vector = literal_column("products.search_vector")
+        ranking = func.ts_rank_cd(vector, tsquery).desc()
+        stmt = stmt.where(vector.op("@@")(tsquery))
+    else:
+        match = " ".join([f'"{t}"' for t in terms[:-1]] + [f'"{terms[-1]}"*'])
+        # bm25 is lower for better matches
+        ranking = func.bm25(
+            literal_column("products_fts"),
+            NAME_WEIGHT,
+            DESCRIPTION_WEIGHT,
+            CATEGORY_WEIGHT,
+        )
+        stmt = stmt.join(
+            products_fts, products_fts.c.rowid == Product.product_id
+        ).where(literal_column("products_fts").op("MATCH")(match))
+
+    return stmt.order_by(ranking, Product.product_id).limit(limit).offset(offset)
+
+
+async def search_products(
+    db: AsyncSession, query: str, limit: int, offset: int = 0
+) -> list[Product]:
+    terms = search_terms(query)
+    if not terms:
+        return []
+    stmt = search_statement(db.bind.dialect.name, terms, limit, offset)
+    return list((await db.execute(stmt)).scalars())
@@ -1,9 +1,10 @@
 from datetime import datetime
-from decimal import Decimal
 
 from sqlalchemy.orm import Session
 
-from api.models import Account, Logs, RewardPoints, RewardStatus
+from api.ledger import credit
+from api.models import Account, Logs, TransactionType
+from api.rewards import points_value, redeem_points
 
 
 def convert_reward_points_to_wallet(
@@ -17,8 +18,7 @@ def convert_reward_points_to_wallet(
         return 0.0
 
     # Calculate reward value (1 point = ₹0.1)
-    # Convert to Decimal to match the account.balance type
-    reward_value = Decimal(str(earned_points * 0.1))
+    reward_value = points_value(earned_points)
 
     # Get user's account
     account = db.query(Account).filter(Account.user_id == user_id).first()
@@ -26,22 +26,10 @@ def convert_reward_points_to_wallet(
         return 0.0
 
     # Update account balance
-    account.balance += reward_value
-
-    # Update reward status to redeemed
-    reward = (
-        db.query(RewardPoints)
-        .filter(
-            RewardPoints.user_id == user_id,
-            RewardPoints.points == earned_points,
-            RewardPoints.status == RewardStatus.earned,
-        )
-        .order_by(RewardPoints.created_at.desc())
-        .first()
-    )
+    credit(db, account.account_id, reward_value, TransactionType.reward_redemption)
 
-    if reward:
-        reward.status = RewardStatus.redeemed
+    # Use up the oldest reward lots first
+    redeem_points(db, user_id, earned_points)
 
     # Log transaction
     log = Logs(
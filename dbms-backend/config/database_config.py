@@ -0,0 +1,100 @@
+import os
+
+from dotenv import load_dotenv
+from sqlalchemy.engine import make_url
+
+load_dotenv()
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///test.db")
+
+# Read replicas, comma separated. Reads fall back to the primary when empty.
+REPLICA_URLS = [
+    url.strip()
+    for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",")
+    if url.strip()
+]
+# How long after a write a user's reads stay pinned to the primary
+REPLICA_MAX_LAG_SECONDS = _env_int("REPLICA_MAX_LAG_SECONDS", 10)
+
+# Connection pool
+POOL_SIZE = _env_int("DB_POOL_SIZE", 5)
+POOL_MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", 10)
+POOL_TIMEOUT = _env_int("DB_POOL_TIMEOUT", 30)
+POOL_RECYCLE = _env_int("DB_POOL_RECYCLE", 3600)
+# Pinging costs a round trip on every checkout; recycling usually suffices
+POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", False)
+
+# SQLite pragmas, applied to every new connection
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": _env_int("SQLITE_MMAP_SIZE", 256 * 1024 * 1024),
+    # Negative values are KiB rather than pages
+    "cache_size": _env_int("SQLITE_CACHE_SIZE", -64000),
+    "busy_timeout": _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000),
+}
+
+# Postgres server-side session options
+PG_STATEMENT_TIMEOUT_MS = _env_int("DB_STATEMENT_TIMEOUT_MS", 30000)
+PG_APPLICATION_NAME = os.getenv("DB_APPLICATION_NAME", "dbms-ewallet")
+
+
+def is_sqlite(url) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def engine_options(url, is_async: bool = False) -> dict:
+    """
+    Keyword arguments for create_engine / create_async_engine for `url`
+    """
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    options = {
+        "pool_pre_ping": POOL_PRE_PING,
+        "pool_recycle": POOL_RECYCLE,
+    }
+
+    # In-memory SQLite uses a single-connection pool without these settings
+    if not (backend == "sqlite" and parsed.database in (None, "", ":memory:")):
+        options.update(
+            pool_size=POOL_SIZE,
+            max_overflow=POOL_MAX_OVERFLOW,
+            pool_timeout=POOL_TIMEOUT,
+        )
+
+    if backend == "postgresql":
+        if is_async:
+            options["connect_args"] = {
+                "server_settings": {
+                    "statement_timeout": str(PG_STATEMENT_TIMEOUT_MS),
+                    "application_name": PG_APPLICATION_NAME,
+                }
+            }
+        else:
+            options["connect_args"] = {
+                "options": f"-c statement_timeout={PG_STATEMENT_TIMEOUT_MS}",
+                "application_name": PG_APPLICATION_NAME,
+            }
+
+    return options
+
+
+def apply_sqlite_pragmas(dbapi_connection, _connection_record=None) -> None:
+    """
+    `connect` event listener setting the tuned pragmas on a SQLite connection
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
@@ -0,0 +1,88 @@
+import argparse
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from api.file_upload import (
+    PROFILE_UPLOAD_DIR,
+    VARIANTS_DIR,
+    get_full_path,
+    variant_directory,
+)
+from api.image_variants import render_variants
+from config.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+# Not product images, or variants themselves
+SKIPPED_DIRS = {os.path.normpath(VARIANTS_DIR), os.path.normpath(PROFILE_UPLOAD_DIR)}
+
+
+def image_urls(directories: list[str]):
+    for directory in directories:
+        for root, subdirs, files in os.walk(directory):
+            subdirs[:] = sorted(
+                d
+                for d in subdirs
+                if os.path.normpath(os.path.join(root, d)) not in SKIPPED_DIRS
+            )
+            for name in sorted(files):
+                # Skip temporary files of uploads in progress
+                if name.startswith("."):
+                    continue
+                if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                    yield "/" + os.path.join(root, name).replace(os.sep, "/")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Render the thumbnail, card and full variants of product "
+        "images uploaded before variants existed. Run from the project root."
+    )
+    parser.add_argument(
+        "directories",
+        nargs="*",
+        default=["uploads"],
+        help="Directories to scan (default: uploads, except its variants and "
+        "profiles directories)",
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--force", action="store_true", help="Render images that have variants too"
+    )
+    args = parser.parse_args()
+
+    rendered = skipped = failed = 0
+    with ProcessPoolExecutor(
+        max_workers=args.workers, mp_context=multiprocessing.get_context("spawn")
+    ) as pool:
+        futures = {
+            pool.submit(
+                render_variants,
+                get_full_path(url),
+                get_full_path(variant_directory(url)),
+                args.force,
+            ): url
+            for url in image_urls(args.directories)
+        }
+        for future in as_completed(futures):
+            try:
+                if future.result():
+                    rendered += 1
+                else:
+                    skipped += 1
+            except Exception as e:
+                failed += 1
+                logger.warning(f"{futures[future]}: {e}")
+
+    logger.info(
+        f"Rendered variants of {rendered} image(s), {skipped} already had them, "
+        f"{failed} failed"
+    )
+
+
+if __name__ == "__main__":
+    setup_logging()
+    main()
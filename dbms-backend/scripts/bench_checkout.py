@@ -0,0 +1,179 @@
+import argparse
+import logging
+import sys
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import func, select
+
+from api.database import engine, session_local
+from api.models import (
+    Account,
+    AccountType,
+    Base,
+    Cart,
+    CartItem,
+    Merchants,
+    OrderItem,
+    Product,
+    ProductStatus,
+    UserRole,
+    Users,
+    UserStatus,
+)
+from api.routers.checkout import process_checkout
+from config.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+def setup(customers: int, stock: int, quantity: int) -> tuple[int, list[int]]:
+    """
+    One product with `stock` units and `customers` users, each with that
+    product in their cart. Returns the product id and the user ids.
+    """
+    tag = uuid.uuid4().hex[:8]
+    now = datetime.now()
+    with session_local() as db:
+        owner = Users(
+            email=f"bench-merchant-{tag}@example.com",
+            full_name="Bench Merchant",
+            password_hash="-",
+            role=UserRole.merchant,
+            status=UserStatus.active,
+            created_at=now,
+        )
+        db.add(owner)
+        db.flush()
+        merchant = Merchants(
+            user_id=owner.user_id,
+            business_name=f"Bench {tag}",
+            business_category="Bench",
+            name="Bench Merchant",
+            email=owner.email,
+            contact="0000000000",
+            created_at=now,
+            updated_at=now,
+        )
+        db.add(merchant)
+        db.flush()
+        product = Product(
+            merchant_id=merchant.merchant_id,
+            name=f"Bench product {tag}",
+            description="Checkout benchmark",
+            price=10,
+            mrp=10,
+            stock=stock,
+            business_category="Bench",
+            image_url="",
+            status=ProductStatus.active,
+            created_at=now,
+            updated_at=now,
+        )
+        db.add(product)
+
+        users = [
+            Users(
+                email=f"bench-{tag}-{i}@example.com",
+                full_name=f"Bench Customer {i}",
+                password_hash="-",
+                role=UserRole.customer,
+                status=UserStatus.active,
+                created_at=now,
+            )
+            for i in range(customers)
+        ]
+        db.add_all(users)
+        db.flush()
+
+        carts = [Cart(user_id=u.user_id, created_at=now, updated_at=now) for u in users]
+        db.add_all(carts)
+        db.add_all(
+            Account(
+                user_id=u.user_id,
+                account_type=AccountType.user,
+                balance=0,
+                created_at=now,
+            )
+            for u in users
+        )
+        db.flush()
+        db.add_all(
+            CartItem(
+                cart_id=cart.cart_id,
+                product_id=product.product_id,
+                quantity=quantity,
+                created_at=now,
+                updated_at=now,
+            )
+            for cart in carts
+        )
+        db.commit()
+        return product.product_id, [u.user_id for u in users]
+
+
+def checkout(user_id: int) -> int:
+    with session_local() as db:
+        user = db.get(Users, user_id)
+        try:
+            process_checkout(
+                payment_method="upi",
+                use_wallet=False,
+                use_rewards=False,
+                reward_points=None,
+                order_date=None,
+                current_user=user,
+                db=db,
+            )
+            return 200
+        except HTTPException as e:
+            return e.status_code
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run concurrent checkouts against one product and check "
+        "that none oversell. Writes to DATABASE_URL; use a scratch database."
+    )
+    parser.add_argument("--customers", type=int, default=200)
+    parser.add_argument("--stock", type=int, default=100)
+    parser.add_argument("--quantity", type=int, default=1, help="Units per order")
+    parser.add_argument("--workers", type=int, default=16)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    product_id, user_ids = setup(args.customers, args.stock, args.quantity)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        statuses = Counter(pool.map(checkout, user_ids))
+    elapsed = time.perf_counter() - started
+
+    with session_local() as db:
+        stock = db.scalar(select(Product.stock).where(Product.product_id == product_id))
+        sold = db.scalar(
+            select(func.coalesce(func.sum(OrderItem.quantity), 0)).where(
+                OrderItem.product_id == product_id
+            )
+        )
+
+    orders = statuses[200]
+    logger.info(f"Statuses: {dict(statuses)}")
+    logger.info(
+        f"{orders} orders in {elapsed:.2f}s ({orders / elapsed:.1f} orders/s, "
+        f"{len(user_ids) / elapsed:.1f} checkouts/s)"
+    )
+    logger.info(f"Stock {args.stock} -> {stock}, units sold {sold}")
+
+    if stock < 0 or sold > args.stock or stock + sold != args.stock:
+        logger.error("Oversold or lost stock updates")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    setup_logging()
+    main()
@@ -0,0 +1,127 @@
+import argparse
+import logging
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import select
+
+from api.database import engine, session_local
+from api.merchant_stats import add_sales, merge_merchant_stats_shards
+from api.models import Base, Merchants, MerchantStats, UserRole, Users, UserStatus
+from config.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+def setup() -> int:
+    tag = uuid.uuid4().hex[:8]
+    now = datetime.now()
+    with session_local() as db:
+        owner = Users(
+            email=f"bench-merchant-{tag}@example.com",
+            full_name="Bench Merchant",
+            password_hash="-",
+            role=UserRole.merchant,
+            status=UserStatus.active,
+            created_at=now,
+        )
+        db.add(owner)
+        db.flush()
+        merchant = Merchants(
+            user_id=owner.user_id,
+            business_name=f"Bench {tag}",
+            business_category="Bench",
+            name="Bench Merchant",
+            email=owner.email,
+            contact="0000000000",
+            created_at=now,
+            updated_at=now,
+        )
+        db.add(merchant)
+        db.commit()
+        return merchant.merchant_id
+
+
+def sale(merchant_id: int, shards: int, hold: float) -> bool:
+    """
+    One order's counter update, holding the row lock for `hold` seconds as
+    the rest of a checkout transaction would
+    """
+    try:
+        with session_local() as db:
+            add_sales(
+                db,
+                merchant_id,
+                shards,
+                units_sold=1,
+                order_count=1,
+                revenue=Decimal("10.00"),
+            )
+            time.sleep(hold)
+            db.commit()
+        return True
+    except Exception as e:
+        logger.debug(f"Sale failed: {e}")
+        return False
+
+
+def run(merchant_id: int, shards: int, orders: int, workers: int, hold: float):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(
+            pool.map(lambda _: sale(merchant_id, shards, hold), range(orders))
+        )
+    elapsed = time.perf_counter() - started
+    return results.count(True), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare order throughput on one merchant's stats with one "
+        "row against N shards. Writes to DATABASE_URL; use a scratch Postgres "
+        "or MySQL database (SQLite locks the whole file, so shards can't help)."
+    )
+    parser.add_argument("--shards", type=int, default=8)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument(
+        "--hold-ms",
+        type=float,
+        default=5,
+        help="Time each transaction keeps its lock before committing",
+    )
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    merchant_id = setup()
+    hold = args.hold_ms / 1000
+
+    expected = 0
+    for shards in (1, args.shards):
+        done, elapsed = run(merchant_id, shards, args.orders, args.workers, hold)
+        expected += done
+        logger.info(
+            f"{shards} shard(s): {done}/{args.orders} orders in {elapsed:.2f}s "
+            f"({done / elapsed:.1f} orders/s)"
+        )
+
+    with session_local() as db:
+        merge_merchant_stats_shards(db, idle_seconds=0)
+        counted = db.scalar(
+            select(MerchantStats.order_count).where(
+                MerchantStats.merchant_id == merchant_id
+            )
+        )
+    logger.info(f"Orders counted after merging: {counted} (expected {expected})")
+    if counted != expected:
+        logger.error("Lost counter updates")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    setup_logging()
+    main()
@@ -0,0 +1,46 @@
+import argparse
+import logging
+
+from api.database import engine, session_local
+from api.ledger import (
+    LEDGER_SNAPSHOT_MIN_ENTRIES,
+    compact_ledger,
+    ensure_opening_snapshots,
+)
+from api.models import BalanceSnapshot, LedgerEntry
+from config.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write wallet balance snapshots for accounts with new ledger "
+        "entries. The API does this itself unless LEDGER_COMPACT_INTERVAL_SECONDS=0."
+    )
+    parser.add_argument(
+        "--init",
+        action="store_true",
+        help="First carry existing account balances into opening snapshots",
+    )
+    parser.add_argument(
+        "--min-entries",
+        type=int,
+        default=LEDGER_SNAPSHOT_MIN_ENTRIES,
+        help="New entries an account needs to be snapshotted",
+    )
+    args = parser.parse_args()
+
+    LedgerEntry.__table__.create(bind=engine, checkfirst=True)
+    BalanceSnapshot.__table__.create(bind=engine, checkfirst=True)
+    if args.init:
+        ensure_opening_snapshots(engine)
+
+    with session_local() as db:
+        written = compact_ledger(db, min_entries=args.min_entries)
+    logger.info(f"Wrote {written} balance snapshot(s)")
+
+
+if __name__ == "__main__":
+    setup_logging()
+    main()
@@ -0,0 +1,37 @@
+import argparse
+import logging
+
+from api.database import engine, session_local
+from api.merchant_stats import (
+    MERCHANT_STATS_MERGE_IDLE_SECONDS,
+    merge_merchant_stats_shards,
+)
+from api.models import MerchantStatsShard
+from config.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Merge the sharded sales counters of merchants whose sales "
+        "have quietened down back into merchant_stats (run every few minutes "
+        "from cron when MERCHANT_STATS_SHARDS > 1)."
+    )
+    parser.add_argument(
+        "--idle-seconds",
+        type=int,
+        default=MERCHANT_STATS_MERGE_IDLE_SECONDS,
+        help="Only merge merchants without sales for this long; 0 merges all",
+    )
+    args = parser.parse_args()
+
+    MerchantStatsShard.__table__.create(bind=engine, checkfirst=True)
+    with session_local() as db:
+        merged = merge_merchant_stats_shards(db, idle_seconds=args.idle_seconds)
+    logger.info(f"Merged the stats shards of {merged} merchant(s)")
+
+
+if __name__ == "__main__":
+    setup_logging()
+    main()
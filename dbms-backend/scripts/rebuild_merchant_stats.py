@@ -0,0 +1,32 @@
+import argparse
+import logging
+
+from api.database import engine, session_local
+from api.merchant_stats import rebuild_merchant_stats
+from api.models import MerchantStats, MerchantStatsShard
+from config.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Recompute the merchant_stats counters from products and "
+        "orders. Run after deploying, or whenever the counters drift."
+    )
+    parser.add_argument(
+        "--merchant-id", type=int, help="Only rebuild this merchant's counters"
+    )
+    args = parser.parse_args()
+
+    MerchantStats.__table__.create(bind=engine, checkfirst=True)
+    MerchantStatsShard.__table__.create(bind=engine, checkfirst=True)
+    with session_local() as db:
+        rebuilt = rebuild_merchant_stats(db, args.merchant_id)
+        db.commit()
+    logger.info(f"Rebuilt stats for {rebuilt} merchant(s)")
+
+
+if __name__ == "__main__":
+    setup_logging()
+    main()
@@ -0,0 +1,32 @@
+import argparse
+import logging
+
+from api.database import engine, session_local
+from api.models import RewardBalance, RewardPoints
+from api.rewards import rebuild_reward_balances
+from config.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Recompute the reward_balances table from the earned reward "
+        "lots. Run after deploying, or whenever the balances drift."
+    )
+    parser.add_argument("--user-id", type=int, help="Only rebuild this user's balance")
+    args = parser.parse_args()
+
+    RewardBalance.__table__.create(bind=engine, checkfirst=True)
+    for index in RewardPoints.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+    with session_local() as db:
+        rebuilt = rebuild_reward_balances(db, args.user_id)
+        db.commit()
+    logger.info(f"Rebuilt {rebuilt} reward balance(s)")
+
+
+if __name__ == "__main__":
+    setup_logging()
+    main()
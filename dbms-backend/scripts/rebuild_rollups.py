@@ -0,0 +1,41 @@
+import argparse
+import logging
+
+from api.database import engine, session_local
+from api.models import ActiveUserMark, DailyStats, HourlyStats
+from api.rollups import prune_active_marks, rebuild_rollups
+from config.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Recompute the admin dashboard rollups from users, logs, "
+        "orders and transactions."
+    )
+    parser.add_argument(
+        "--prune",
+        action="store_true",
+        help="Only drop active-user markers of closed buckets (cron friendly)",
+    )
+    args = parser.parse_args()
+
+    for model in (HourlyStats, DailyStats, ActiveUserMark):
+        model.__table__.create(bind=engine, checkfirst=True)
+
+    with session_local() as db:
+        if args.prune:
+            pruned = prune_active_marks(db)
+            db.commit()
+            logger.info(f"Pruned {pruned} active-user marker(s)")
+            return
+
+        written = rebuild_rollups(db)
+        db.commit()
+    logger.info(f"Rebuilt {written} rollup bucket(s)")
+
+
+if __name__ == "__main__":
+    setup_logging()
+    main()
@@ -0,0 +1,47 @@
+import argparse
+import logging
+
+from api.database import engine
+from api.log_partitions import archive_logs, partition_postgres_logs, rotate_logs
+from config.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Rotate the logs table into monthly partitions and archive "
+        "months past the retention period (run daily from cron)."
+    )
+    parser.add_argument(
+        "--init",
+        action="store_true",
+        help="Postgres: convert an existing logs table to a partitioned one first",
+    )
+    parser.add_argument(
+        "--no-archive",
+        action="store_true",
+        help="Only rotate; keep every month in the database",
+    )
+    args = parser.parse_args()
+
+    if args.init and engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            if partition_postgres_logs(conn):
+                logger.info("Converted logs to a partitioned table")
+
+    with engine.begin() as conn:
+        rotated = rotate_logs(conn)
+    logger.info(f"Rotated {rotated} month(s)")
+
+    if not args.no_archive:
+        with engine.begin() as conn:
+            archived = archive_logs(conn)
+        for path in archived:
+            logger.info(f"Archived {path}")
+        logger.info(f"Archived {len(archived)} month(s)")
+
+
+if __name__ == "__main__":
+    setup_logging()
+    main()
@@ -0,0 +1,26 @@
+import argparse
+import logging
+
+from api.database import engine, session_local
+from api.idempotency import sweep_idempotency_keys
+from api.models import IdempotencyKey
+from config.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    argparse.ArgumentParser(
+        description="Delete idempotency keys past their TTL (run hourly from cron)."
+    ).parse_args()
+
+    IdempotencyKey.__table__.create(bind=engine, checkfirst=True)
+    with session_local() as db:
+        swept = sweep_idempotency_keys(db)
+        db.commit()
+    logger.info(f"Deleted {swept} expired idempotency key(s)")
+
+
+if __name__ == "__main__":
+    setup_logging()
+    main()
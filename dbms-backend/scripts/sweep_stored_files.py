@@ -0,0 +1,46 @@
+import argparse
+import logging
+
+from api.database import engine, session_local
+from api.file_upload import (
+    STORED_FILE_GRACE_SECONDS,
+    rebuild_file_references,
+    sweep_stored_files,
+)
+from api.models import StoredFile
+from config.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Delete uploaded files in the file store that no product "
+        "or profile has referenced for a while (run daily from cron)."
+    )
+    parser.add_argument(
+        "--grace-seconds",
+        type=int,
+        default=STORED_FILE_GRACE_SECONDS,
+        help="Keep unreferenced files this long after their last upload or use",
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Recount references from products and users first, fixing drift",
+    )
+    args = parser.parse_args()
+
+    StoredFile.__table__.create(bind=engine, checkfirst=True)
+    with session_local() as db:
+        if args.rebuild:
+            fixed = rebuild_file_references(db)
+            db.commit()
+            logger.info(f"Fixed the reference count of {fixed} stored file(s)")
+        swept = sweep_stored_files(db, grace_seconds=args.grace_seconds)
+    logger.info(f"Deleted {swept} unreferenced stored file(s)")
+
+
+if __name__ == "__main__":
+    setup_logging()
+    main()
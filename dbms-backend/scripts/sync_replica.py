@@ -0,0 +1,61 @@
+import argparse
+import logging
+import sqlite3
+import time
+
+from sqlalchemy.engine import make_url
+
+from config.database_config import DATABASE_URL, REPLICA_URLS
+from config.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+def sqlite_path(url: str) -> str:
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite" or not parsed.database:
+        raise ValueError(f"Not a file-backed SQLite URL: {url}")
+    return parsed.database
+
+
+def sync_once(primary: str, replica: str) -> None:
+    """
+    Copy a consistent snapshot of the primary onto the replica file
+    """
+    source = sqlite3.connect(primary)
+    target = sqlite3.connect(replica)
+    try:
+        with target:
+            source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Periodically copy the SQLite primary onto its replicas. "
+        "Postgres replicas should use streaming replication instead."
+    )
+    parser.add_argument("--interval", type=float, default=5.0)
+    parser.add_argument("--once", action="store_true")
+    args = parser.parse_args()
+
+    primary = sqlite_path(DATABASE_URL)
+    replicas = [sqlite_path(url) for url in REPLICA_URLS]
+    if not replicas:
+        logger.info("DATABASE_REPLICA_URLS is not set, nothing to sync")
+        return
+
+    while True:
+        for replica in replicas:
+            sync_once(primary, replica)
+            logger.info(f"Synced {primary} -> {replica}")
+        if args.once:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    setup_logging()
+    main()
@@ -73,6 +73,7 @@ BEGIN
     DROP FUNCTION IF EXISTS search_users(VARCHAR);
     DROP FUNCTION IF EXISTS search_products(VARCHAR);
     DROP FUNCTION IF EXISTS get_user_activity_report(INTEGER);
+    DROP FUNCTION IF EXISTS create_logs_partitions(INTEGER);
     
     -- Drop tables in correct order
     DROP TABLE IF EXISTS order_items;
@@ -123,5 +124,11 @@ END$$;
 -- Create admin functions
 \i '07_admin_functions.sql'
 
+-- Create the full-text search index
+\i '08_product_search.sql'
+
+-- Partition logs by month
+\i '09_logs_partitioning.sql'
+
 -- Verify successful migration
-SELECT 'Migration completed successfully!' AS status; 
\ No newline at end of file
+SELECT 'Migration completed successfully!' AS status; 
\ No newline at end of file
@@ -0,0 +1,48 @@
+-- ======================================================================
+-- Full-Text Product Search
+-- ======================================================================
+
+-- Weighted search document, maintained by Postgres on every insert/update:
+-- name (A) ranks above business_category (B) above description (C)
+ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector
+GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(business_category, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(description, '')), 'C')
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_products_search_vector
+ON products USING GIN (search_vector);
+
+-- Replaces the ILIKE scan from 07_admin_functions.sql with an index lookup,
+-- best match first
+CREATE OR REPLACE FUNCTION search_products(
+    p_search_term VARCHAR(100)
+) RETURNS TABLE (
+    product_id INTEGER,
+    merchant_id INTEGER,
+    merchant_name VARCHAR(100),
+    name VARCHAR(100),
+    price DECIMAL(10,2),
+    stock INTEGER,
+    business_category VARCHAR(50),
+    status product_status
+) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT 
+        p.product_id,
+        p.merchant_id,
+        m.business_name,
+        p.name,
+        p.price,
+        p.stock,
+        p.business_category,
+        p.status
+    FROM products p
+    JOIN merchants m ON p.merchant_id = m.merchant_id
+    WHERE p.search_vector @@ websearch_to_tsquery('english', p_search_term)
+    ORDER BY ts_rank_cd(p.search_vector, websearch_to_tsquery('english', p_search_term)) DESC,
+             p.product_id;
+END;
+$$ LANGUAGE plpgsql;
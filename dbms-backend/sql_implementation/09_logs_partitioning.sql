@@ -0,0 +1,80 @@
+-- ======================================================================
+-- Monthly Partitioning of Logs
+-- ======================================================================
+
+-- Rebuild logs as a table partitioned by month of created_at, keeping ids
+-- and rows. The primary key must include the partition key. Skipped when
+-- logs is already partitioned.
+DO $$
+DECLARE
+    v_month DATE;
+    v_last DATE := date_trunc('month', CURRENT_DATE + INTERVAL '2 months');
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('logs')
+    ) THEN
+        RETURN;
+    END IF;
+
+    DROP INDEX IF EXISTS idx_logs_created_at;
+    ALTER TABLE logs RENAME TO logs_unpartitioned;
+    ALTER TABLE logs_unpartitioned RENAME CONSTRAINT logs_pkey TO logs_unpartitioned_pkey;
+
+    CREATE TABLE logs (
+        log_id INTEGER NOT NULL DEFAULT nextval('logs_log_id_seq'),
+        user_id INTEGER REFERENCES users(user_id),
+        action VARCHAR(100) NOT NULL,
+        description TEXT NOT NULL,
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (log_id, created_at)
+    ) PARTITION BY RANGE (created_at);
+    ALTER SEQUENCE logs_log_id_seq OWNED BY logs.log_id;
+
+    -- Catches rows outside every monthly partition
+    CREATE TABLE logs_default PARTITION OF logs DEFAULT;
+
+    SELECT date_trunc('month', coalesce(min(created_at), CURRENT_DATE))
+    INTO v_month FROM logs_unpartitioned;
+    WHILE v_month <= v_last LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF logs FOR VALUES FROM (%L) TO (%L)',
+            'logs_' || to_char(v_month, 'YYYY_MM'),
+            v_month,
+            v_month + INTERVAL '1 month'
+        );
+        v_month := v_month + INTERVAL '1 month';
+    END LOOP;
+
+    -- Created on every partition; serves the newest-first admin log pages
+    CREATE INDEX idx_logs_created_at ON logs (created_at, log_id);
+
+    INSERT INTO logs (log_id, user_id, action, description, created_at)
+    SELECT log_id, user_id, action, description, created_at
+    FROM logs_unpartitioned;
+    DROP TABLE logs_unpartitioned;
+END$$;
+
+-- Create the partitions for the current and the next p_months_ahead months.
+-- scripts/rotate_logs.py does the same; run either daily.
+CREATE OR REPLACE FUNCTION create_logs_partitions(
+    p_months_ahead INTEGER DEFAULT 2
+) RETURNS INTEGER AS $$
+DECLARE
+    v_month DATE := date_trunc('month', CURRENT_DATE);
+    v_created INTEGER := 0;
+BEGIN
+    FOR i IN 0..p_months_ahead LOOP
+        IF to_regclass('logs_' || to_char(v_month, 'YYYY_MM')) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF logs FOR VALUES FROM (%L) TO (%L)',
+                'logs_' || to_char(v_month, 'YYYY_MM'),
+                v_month,
+                v_month + INTERVAL '1 month'
+            );
+            v_created := v_created + 1;
+        END IF;
+        v_month := v_month + INTERVAL '1 month';
+    END LOOP;
+    RETURN v_created;
+END;
+$$ LANGUAGE plpgsql;